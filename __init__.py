@@ -1,6 +1,15 @@
+import collections
+import contextlib
+import functools
+import hashlib
 import os
+import shutil
+import sys
+import tempfile
+import threading
 import time
 import bpy
+import numpy
 
 from bpy.props import (IntProperty,
                        BoolProperty,
@@ -12,6 +21,32 @@ from bpy.types import (Operator,
                        PropertyGroup,
                        UIList)
 
+from bpy.app.handlers import persistent
+
+from . import atlas
+from . import contact_sheet
+from . import coordinator
+from . import delivery
+from . import derivatives
+from . import encoder
+from . import fingerprint
+from . import history
+from . import journal
+from . import manifest
+from . import metrics
+from . import planner
+from . import pool
+from . import progress
+from . import regions
+from . import rules
+from . import scene_cache
+from . import shards
+from . import spec
+from . import store
+from . import tiers
+from . import timeline
+from . import visibility
+
 bl_info = {
     "name": "Render-Farm",
     "author": "Kev Mayo",
@@ -28,7 +63,7 @@ bl_info = {
 def hide_object(ob):
     ob.hide_render = True
     ob.hide_viewport = True
-    children = ob.children
+    children = visibility.get_descendants(ob)
     # print("\nHIDE : ", ob.name, len(children))
     for child in children:
         child.hide_render = True
@@ -38,7 +73,7 @@ def hide_object(ob):
 def show_object(ob):
     ob.hide_render = False
     ob.hide_viewport = False
-    children = ob.children
+    children = visibility.get_descendants(ob)
     # print("\nSHOW : ", ob.name, len(children))
     for child in children:
         child.hide_render = False
@@ -51,18 +86,807 @@ def hide_objects():
 
 
 def _get_cameras(self):
-    return get_cameras()
+    return get_cameras(self)
+
 
+def get_cameras(scene=None):
+    scene = scene or bpy.context.scene
+    cache = scene_cache.cache
+    names = cache.get_cameras(scene.name, len(scene.objects))
+    if names is not None:
+        cameras = [bpy.data.objects.get(name) for name in names]
+        if None not in cameras:
+            return cameras
 
-def get_cameras():
     cameras = []
-    scene = bpy.context.scene
     for ob in scene.objects:
         if ob.type == 'CAMERA':
             cameras.append(ob)
+    cache.set_cameras(scene.name, len(scene.objects), [cam.name for cam in cameras])
     return cameras
 
 
+@persistent
+def scene_cache_update(scene, depsgraph=None):
+    """Mark the camera and material caches dirty when the depsgraph reports a change to them"""
+    if depsgraph is None:
+        scene_cache.cache.invalidate()
+        return
+    for update in depsgraph.updates:
+        data = update.id
+        if isinstance(data, bpy.types.Material):
+            scene_cache.cache.materials_dirty()
+        elif isinstance(data, bpy.types.Collection) or (isinstance(data, bpy.types.Object) and data.type == 'CAMERA'):
+            scene_cache.cache.cameras_dirty()
+
+
+@persistent
+def scene_cache_reset(*args):
+    scene_cache.cache.invalidate()
+    subscribe_renames()
+
+
+# owner of the message bus subscriptions, they are dropped when a file is loaded
+_msgbus_owner = object()
+
+
+def subscribe_renames():
+    """Mark the material lists dirty when any material is renamed, the depsgraph does not report it"""
+    bpy.msgbus.clear_by_owner(_msgbus_owner)
+    bpy.msgbus.subscribe_rna(key=(bpy.types.Material, "name"), owner=_msgbus_owner, args=(),
+                             notify=scene_cache.cache.materials_dirty)
+
+
+def add_objects(scene, objects):
+    """Add objects to the render list in one batch, skipping those already in it"""
+    present = set(item.name for item in scene.render_farm_objects)
+    added = 0
+    for obj in objects:
+        if obj.name in present:
+            continue
+        item = scene.render_farm_objects.add()
+        item.id = len(scene.render_farm_objects)
+        item.name = obj.name
+        item.object = obj
+        present.add(obj.name)
+        added += 1
+    if added:
+        scene.render_farm_objects_index = (len(scene.render_farm_objects) - 1)
+    return added
+
+
+def add_materials(scene, materials):
+    """Add materials to the render list in one batch, skipping those already in it"""
+    present = set(item.name for item in scene.render_farm_materials)
+    added = 0
+    for mat in materials:
+        if mat.name in present:
+            continue
+        item = scene.render_farm_materials.add()
+        item.id = len(scene.render_farm_materials)
+        item.material = mat
+        item.name = mat.name
+        present.add(mat.name)
+        added += 1
+    if added:
+        scene.render_farm_materials_index = (len(scene.render_farm_materials) - 1)
+    return added
+
+
+def import_manifest(scene, path):
+    """Add the objects and materials of a manifest file to the render lists.
+
+    Names are resolved through dict indexes of the file's objects and
+    materials and the scene's cameras. Cameras are only checked, every camera
+    of the scene is rendered. Returns the number of objects and materials
+    added and the names not found per axis.
+    """
+    data = manifest.load(path)
+    objects, missing_objects = manifest.resolve(data.objects, {ob.name: ob for ob in bpy.data.objects})
+    materials, missing_materials = manifest.resolve(data.materials, {mat.name: mat for mat in bpy.data.materials})
+    cameras, missing_cameras = manifest.resolve(data.cameras, {cam.name: cam for cam in get_cameras(scene)})
+    return {
+        'objects': add_objects(scene, objects),
+        'materials': add_materials(scene, materials),
+        'missing': {'object': missing_objects, 'material': missing_materials, 'camera': missing_cameras},
+    }
+
+
+def get_render_path(path, material_name, object_name, camera_name):
+    return os.path.join(path, material_name + "_" + object_name + "_" + camera_name)
+
+
+@functools.lru_cache(maxsize=1)
+def load_rules(path, mtime):
+    return rules.load(path)
+
+
+def get_rules(scene):
+    """Rules of the scene's rules file, None without one"""
+    path = scene.render_farm_settings.rules
+    if not path:
+        return None
+    path = bpy.path.abspath(path)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError as e:
+        raise rules.RulesError("Cannot read rules %s : %s" % (path, e))
+    return load_rules(path, mtime)
+
+
+def cancel_on_rules_error(execute):
+    """Report a bad rules file from an operator instead of raising"""
+    @functools.wraps(execute)
+    def wrapper(self, context):
+        try:
+            return execute(self, context)
+        except rules.RulesError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+    return wrapper
+
+
+def get_plan(scene, preview=False):
+    """Plan of the final run, previews include the objects and materials left out of it"""
+    objects = [r_ob.object.name for r_ob in scene.render_farm_objects if preview or r_ob.final]
+    materials = [r_mat.material.name for r_mat in scene.render_farm_materials if preview or r_mat.final]
+    cameras = [cam.name for cam in get_cameras()]
+    cost_model = planner.COST_MODELS[scene.render_farm_settings.order]
+
+    data = get_rules(scene)
+    if data is None:
+        return planner.Plan(objects, materials, cameras, cost_model)
+    collections = {name: [ob.name for ob in bpy.data.collections[name].all_objects]
+                   for name in rules.collection_names(data) if name in bpy.data.collections}
+    return rules.plan(data, objects, materials, cameras, cost_model, collections)
+
+
+def get_jobs(scene, path, preview=False):
+    ext = scene.render.file_extension
+    jobs = []
+    for job in get_plan(scene, preview):
+        filepath = get_render_path(path, job.material, job.object, job.camera)
+        jobs.append(dict(job._asdict(), filepath=filepath, output=filepath + ext))
+    return jobs
+
+
+def assign_material(obj, mat):
+    if obj.data.materials:
+        obj.data.materials[0] = mat
+    else:
+        obj.data.materials.append(mat)
+
+
+def read_pixels(filepath):
+    """Image as an (height, width, 4) float32 array, bottom row first, and whether it is float"""
+    image = bpy.data.images.load(filepath, check_existing=False)
+    try:
+        width, height = image.size
+        pixels = numpy.empty(width * height * 4, dtype=numpy.float32)
+        image.pixels.foreach_get(pixels)
+        is_float = image.is_float
+    finally:
+        bpy.data.images.remove(image)
+    return pixels.reshape(height, width, 4), is_float
+
+
+def load_pixels(filepath):
+    """Rendered image as an (height, width, 4) uint8 array, top row first"""
+    pixels = read_pixels(filepath)[0]
+    return (numpy.flipud(pixels) * 255 + 0.5).astype(numpy.uint8)
+
+
+def stitch_regions(scene, parts, output):
+    """Stack the rendered bands of a split job into its output, in the scene's file format"""
+    tiles = []
+    is_float = False
+    for part in parts:
+        pixels, is_float = read_pixels(part['output'])
+        tiles.append((part, pixels))
+    height = parts[0]['region'][4]
+    width = tiles[0][1].shape[1]
+    pixels = regions.stitch(tiles, width, height)
+
+    # saved as is, the bands already went through the view transform when rendered
+    image = bpy.data.images.new("render_farm_stitch", width, height, alpha=True, float_buffer=is_float)
+    tmp = output + '.part'
+    try:
+        image.pixels.foreach_set(pixels.ravel())
+        image.filepath_raw = tmp
+        image.file_format = scene.render.image_settings.file_format
+        image.save()
+    finally:
+        bpy.data.images.remove(image)
+    # replaced, not written through, the output could still be a link shared with other variations
+    os.replace(tmp, output)
+    for part in parts:
+        os.remove(part['output'])
+
+
+class RenderRun:
+    """Jobs of one run, and what is done with each of them once rendered"""
+
+    def __init__(self, operator, scene, local=True, preview=False, jobs=None):
+        settings = scene.render_farm_settings
+        self.scene = scene
+        self.fingerprint = history.fingerprint(get_render_settings(scene))
+        # set export options
+        scene.render.image_settings.color_mode = 'RGBA'
+
+        self.path = bpy.path.abspath(scene.render_farm_savePath.path)
+        if preview:
+            self.path = tiers.preview_dir(self.path)
+        if self.path:
+            os.makedirs(self.path, exist_ok=True)
+        self.journal = journal.Journal(self.path)
+        self.metrics = metrics.MetricsLog(self.path)
+
+        # renders in this process are written raw and encoded in the background
+        self.encoder = None
+        image_settings = scene.render.image_settings
+        self.file_format = image_settings.file_format
+        if local and settings.async_encode and (self.file_format != 'PNG' or image_settings.color_depth != '8'):
+            # the encoder only writes 8 bit PNG, anything else keeps Blender's own writer
+            operator.report({'WARNING'}, 'Background encoding writes 8 bit PNG only, writing %s %s bit directly' % (
+                self.file_format, image_settings.color_depth))
+        elif local and settings.async_encode:
+            formats = ('PNG', 'WEBP') if settings.webp else ('PNG',)
+            if settings.webp and not encoder.webp_available():
+                operator.report({'WARNING'}, 'WebP needs Pillow, writing PNG only')
+                formats = ('PNG',)
+            self.encoder = encoder.EncoderPool(self.path, formats,
+                                               png_level=settings.png_compression,
+                                               on_done=self.finished)
+
+        self.all_jobs = get_jobs(scene, self.path, preview) if jobs is None else list(jobs)
+        if not preview and settings.final_approved:
+            self.all_jobs = tiers.approved(self.all_jobs, tiers.preview_dir(self.path))
+            operator.report({'INFO'}, 'Final : %d variations approved in the preview' % len(self.all_jobs))
+        if self.encoder is not None:
+            for job in self.all_jobs:
+                job['output'] = self.encoder.output_path(job, 'PNG')
+        self.jobs = self.all_jobs
+        if settings.only_changed:
+            set_fingerprints(scene, self.all_jobs)
+        if settings.resume or settings.only_changed:
+            self.jobs = self.journal.pending(self.all_jobs)
+            operator.report({'INFO'}, 'Resuming : %d of %d already done and unchanged' % (
+                len(self.all_jobs) - len(self.jobs), len(self.all_jobs)))
+
+        # workers take the longest jobs first, the slowest are split into bands, last in the queue
+        self.costs = get_costs(scene, self.path)
+        if not local and settings.longest_first and self.costs:
+            self.jobs = history.longest_first(self.jobs, self.costs)
+        # outputs about to be written must not be links into the store, split jobs included
+        self.store = None
+        if settings.dedupe:
+            self.store = store.Store(self.path)
+            self.store.release(job['output'] for job in self.jobs)
+
+        self.tracker = None
+        self.stitching = []
+        if not local and settings.regions > 1 and settings.split_jobs:
+            self.tracker = regions.Tracker()
+            self.jobs = self.split_slowest(scene, self.jobs, settings.split_jobs, settings.regions)
+
+        self.sheet = None
+        if settings.contact_sheet or preview:
+            self.sheet = get_contact_sheet(scene, self.path, self.all_jobs)
+
+        # renders are recorded once their derivatives are written
+        self.derivatives = None
+        if settings.derivatives and not preview:
+            formats = [f for f in ('PNG', 'WEBP') if f in settings.derivative_formats]
+            if 'WEBP' in formats and not encoder.webp_available():
+                operator.report({'WARNING'}, 'WebP needs Pillow, deriving PNG only')
+                formats = ['PNG']
+            try:
+                self.derivatives = derivatives.DerivativePool(
+                    self.path, derivatives.parse_sizes(settings.derivative_sizes), formats or ['PNG'],
+                    trim_alpha=settings.trim_alpha, margin=settings.trim_margin,
+                    png_level=settings.png_compression)
+            except ValueError as e:
+                operator.report({'WARNING'}, '%s, rendering without derivatives' % e)
+        self.packager = None
+        if settings.package and not preview:
+            uploader = None
+            if settings.upload_url:
+                try:
+                    uploader = delivery.S3Uploader(settings.upload_url)
+                except ValueError as e:
+                    operator.report({'WARNING'}, '%s, packaging without upload' % e)
+            self.packager = delivery.Packager(self.path, settings.package_format.lower(),
+                                              settings.package_size << 20, uploader)
+
+        self.landed = []
+        self.lock = threading.Lock()
+        # called with (job, elapsed) once a job is recorded, from any thread
+        self.on_finished = None
+
+        # last, close() puts the user's format back
+        if self.encoder is not None:
+            scene.render.image_settings.file_format = 'TARGA_RAW'
+
+    def split_slowest(self, scene, jobs, count, bands):
+        """Jobs with the count slowest predicted, or the last ones without history, split"""
+        if self.costs:
+            heavy = history.longest_first(jobs, self.costs)[:count]
+        else:
+            heavy = jobs[-count:]
+        heavy_keys = {journal.job_key(job) for job in heavy}
+
+        os.makedirs(os.path.join(self.path, regions.REGIONS_DIR), exist_ok=True)
+        height = scene.render.resolution_y * scene.render.resolution_percentage // 100
+        ext = scene.render.file_extension
+        split = [job for job in jobs if journal.job_key(job) not in heavy_keys]
+        for job in heavy:
+            split += regions.split(job, bands, height, self.path, ext)
+        return split
+
+    def render(self, renderer, job):
+        """Render a job in this process, returns the render time"""
+        if self.encoder is None:
+            elapsed = renderer.render(job)
+            self.finished(job, elapsed, renderer.phases)
+            return elapsed
+        raw = self.encoder.raw_path(job)
+        elapsed = renderer.render(dict(job, output=raw))
+        self.encoder.submit(job, raw, elapsed, dict(renderer.phases))
+        return elapsed
+
+    def finished(self, job, elapsed, phases=None, worker=None):
+        """Record a finished job, safe to call from any thread"""
+        if 'region' in job:
+            with self.lock:
+                parts = self.tracker.add(dict(job, elapsed=elapsed, phases=phases or {}))
+                if parts is not None:
+                    self.stitching.append(parts)
+            return
+        if self.derivatives is not None and os.path.exists(job['output']):
+            self.derivatives.submit(job, lambda derived: self.record(
+                dict(job, derivatives=derived), elapsed, phases, worker))
+            return
+        self.record(job, elapsed, phases, worker)
+
+    def record(self, job, elapsed, phases=None, worker=None):
+        with self.lock:
+            if self.store is not None and os.path.exists(job['output']):
+                self.store.add(job)
+            record = self.journal.append(job, elapsed)
+            if phases:
+                self.metrics.append(job, phases, worker, record['size'], self.fingerprint)
+            if self.packager is not None and record['size'] is not None:
+                self.packager.add(self.outputs(job), record)
+            self.landed.append(job)
+            if self.on_finished is not None:
+                self.on_finished(job, elapsed)
+
+    def outputs(self, job):
+        """Files written for a job"""
+        paths = [job['output']]
+        if self.encoder is not None and 'WEBP' in self.encoder.formats:
+            paths.append(self.encoder.output_path(job, 'WEBP'))
+        paths += [f['path'] for f in (job.get('derivatives') or {}).get('files', ())]
+        return [path for path in paths if os.path.exists(path)]
+
+    def update(self):
+        """Process landed jobs, bpy is used so only call from the main thread"""
+        stitching, self.stitching = self.stitching, []
+        for parts in stitching:
+            start = time.perf_counter()
+            job = regions.parent(parts[0])
+            del job['elapsed'], job['phases']
+            stitch_regions(self.scene, parts, job['output'])
+            phases = dict.fromkeys(metrics.PHASES, 0.0)
+            for part in parts:
+                for name, seconds in part['phases'].items():
+                    phases[name] = phases.get(name, 0.0) + seconds
+            phases['write'] += time.perf_counter() - start
+            self.finished(job, sum(part['elapsed'] for part in parts), phases)
+
+        landed, self.landed = self.landed, []
+        if self.sheet is not None and landed:
+            self.sheet.add_many(landed, load_pixels)
+
+    def close(self, operator=None):
+        if self.encoder is not None:
+            self.encoder.close()
+            self.scene.render.image_settings.file_format = self.file_format
+            if operator is not None:
+                for job, message in self.encoder.errors:
+                    operator.report({'WARNING'}, 'Encoding failed %s : %s' % (job['filepath'], message))
+        self.update()
+        if self.derivatives is not None:
+            self.derivatives.close()
+            self.update()
+            if operator is not None:
+                for job, message in self.derivatives.errors:
+                    operator.report({'WARNING'}, 'Derivatives failed %s : %s' % (job['filepath'], message))
+        if self.sheet is not None:
+            self.sheet.write()
+        if self.store is not None:
+            duplicates = self.store.write_report()
+            if operator is not None:
+                operator.report({'INFO'}, 'Duplicates : Report ==> %s' % duplicates)
+        if self.packager is not None:
+            manifest = self.packager.close()
+            if operator is not None:
+                for name, message in self.packager.errors:
+                    operator.report({'WARNING'}, 'Delivery failed %s : %s' % (name, message))
+                operator.report({'INFO'}, 'Delivery : %d shards, Manifest ==> %s' % (
+                    len(self.packager.shards), manifest))
+        return self.metrics.write_report()
+
+
+def get_contact_sheet(scene, path, jobs):
+    settings = scene.render_farm_settings
+    rows = settings.sheet_rows.lower()
+    return contact_sheet.ContactSheet(
+        path, jobs,
+        rows=(rows,),
+        columns=tuple(a for a in planner.AXES if a != rows),
+        tile_width=settings.sheet_tile,
+        tile_height=settings.sheet_tile)
+
+
+def get_render_settings(scene):
+    """Render settings which change the cost of a render"""
+    render = scene.render
+    settings = {
+        'engine': render.engine,
+        'resolution': [render.resolution_x, render.resolution_y, render.resolution_percentage],
+        'format': [render.image_settings.file_format, render.image_settings.color_depth],
+    }
+    if render.engine == 'CYCLES':
+        settings['samples'] = scene.cycles.samples
+    elif render.engine.startswith('BLENDER_EEVEE'):
+        settings['samples'] = scene.eevee.taa_render_samples
+    return settings
+
+
+def set_fingerprints(scene, jobs):
+    """Store the fingerprint of each job's inputs in job['inputs']"""
+    fp = fingerprint.Fingerprinter(bpy.path.abspath)
+    h = hashlib.sha1(history.fingerprint(get_render_settings(scene)).encode('utf-8'))
+    view = scene.view_settings
+    h.update(repr((view.view_transform, view.look, view.exposure, view.gamma)).encode('utf-8'))
+    engine = scene.render.engine
+    if engine == 'CYCLES':
+        fp.rna(h, scene.cycles)
+    elif engine.startswith('BLENDER_EEVEE'):
+        fp.rna(h, scene.eevee)
+    if scene.world is not None:
+        h.update(fp.material(scene.world).encode('utf-8'))
+    settings = h.hexdigest()
+
+    for job in jobs:
+        job['inputs'] = fp.job(bpy.data.objects[job['object']], bpy.data.materials[job['material']],
+                               bpy.data.objects[job['camera']], settings)
+
+
+def get_costs(scene, path):
+    """Model of render seconds per job fitted on the history of path for the current settings"""
+    records = metrics.read(os.path.join(path, metrics.METRICS_NAME))
+    return history.fit(history.matching(records, history.fingerprint(get_render_settings(scene))))[0]
+
+
+def get_estimate(scene):
+    """Lines predicting the time and disk use of rendering the plan, from the metrics history"""
+    settings = scene.render_farm_settings
+    path = bpy.path.abspath(scene.render_farm_savePath.path)
+    records = metrics.read(os.path.join(path, metrics.METRICS_NAME))
+    matched = history.matching(records, history.fingerprint(get_render_settings(scene)))
+    result = history.estimate(get_jobs(scene, path), matched, settings.workers, settings.longest_first)
+    if result is None:
+        if records:
+            return ['No render history with the current settings']
+        return ['No render history in the output folder']
+    lines = ['%d variations, %s render time' % (result['jobs'], progress.format_duration(result['seconds']))]
+    if settings.workers > 1:
+        lines.append('%s on %d workers' % (progress.format_duration(result['wall']), settings.workers))
+    if result['bytes'] is not None:
+        lines.append('%.1f MB on disk' % (result['bytes'] / 1e6))
+    lines.append('From %d renders' % result['records'])
+    return lines
+
+
+@contextlib.contextmanager
+def preview_settings(scene):
+    """Lower resolution and samples to the preview tier, yields the estimated cost fraction"""
+    settings = scene.render_farm_settings
+    render = scene.render
+    samples = None
+    if render.engine == 'CYCLES':
+        samples = (scene.cycles, 'samples')
+    elif render.engine.startswith('BLENDER_EEVEE'):
+        samples = (scene.eevee, 'taa_render_samples')
+
+    percentage = render.resolution_percentage
+    final_samples = getattr(*samples) if samples else 0
+    render.resolution_percentage = max(1, percentage * settings.preview_scale // 100)
+    if samples:
+        setattr(*samples, tiers.preview_samples(final_samples, settings.preview_samples))
+    try:
+        yield tiers.cost_fraction(settings.preview_scale, final_samples, settings.preview_samples)
+    finally:
+        render.resolution_percentage = percentage
+        if samples:
+            setattr(*samples, final_samples)
+
+
+@functools.lru_cache(maxsize=1)
+def get_frame_table(text):
+    return timeline.loads(text)
+
+
+@persistent
+def timeline_frame_change(scene, *args):
+    """Assign the material of the frame's job when rendering an encoded timeline"""
+    text = scene.get(timeline.FRAMES_PROP)
+    if not text:
+        return
+    job = get_frame_table(text).get(scene.frame_current)
+    if job is None:
+        return
+    obj = bpy.data.objects.get(job['object'])
+    mat = bpy.data.materials.get(job['material'])
+    if obj is not None and mat is not None:
+        if not obj.data.materials or obj.data.materials[0] != mat:
+            assign_material(obj, mat)
+
+
+@persistent
+def timeline_render_write(scene, *args):
+    """Rename a written frame of an encoded timeline to its material_object_camera name"""
+    text = scene.get(timeline.FRAMES_PROP)
+    if not text:
+        return
+    job = get_frame_table(text).get(scene.frame_current)
+    if job is None:
+        return
+    frame_path = scene.render.frame_path(frame=scene.frame_current)
+    if os.path.exists(frame_path):
+        os.replace(frame_path, os.path.join(os.path.dirname(frame_path), job['name'] + scene.render.file_extension))
+
+
+class SceneRenderer:
+    """Render jobs one by one, only touching the objects and materials that change"""
+
+    def __init__(self, scene=None):
+        scene = scene or bpy.context.scene
+        self.visibility = visibility.VisibilityManager(
+            [r_ob.object for r_ob in scene.render_farm_objects],
+            scene.render_farm_settings.use_collections)
+        self.prev_ob = None
+        self.prev_mat = None
+        self.phases = {}
+
+    def render(self, job):
+        """Render a single job, returns the elapsed time. Time per phase is kept in self.phases"""
+        phases = dict.fromkeys(metrics.PHASES, 0.0)
+        scene = bpy.context.scene
+        start = lap = time.perf_counter()
+
+        def phase(name):
+            nonlocal lap
+            now = time.perf_counter()
+            phases[name] += now - lap
+            lap = now
+
+        obj = bpy.data.objects[job['object']]
+        mat = bpy.data.materials[job['material']]
+
+        if obj != self.prev_ob:
+            self.visibility.show(obj.name)
+            self.prev_mat = None
+        phase('visibility')
+
+        #assign material
+        if mat != self.prev_mat:
+            assign_material(obj, mat)
+        phase('material')
+
+        self.prev_ob = obj
+        self.prev_mat = mat
+
+        scene.camera = bpy.data.objects[job['camera']]
+        scene.render.filepath = job['filepath']
+        phase('camera')
+
+        if 'region' in job:
+            render = scene.render
+            border = (render.use_border, render.use_crop_to_border, render.border_min_x,
+                      render.border_max_x, render.border_min_y, render.border_max_y)
+            render.use_border = render.use_crop_to_border = True
+            render.border_min_x, render.border_max_x = 0.0, 1.0
+            render.border_min_y, render.border_max_y = regions.border(job)
+            try:
+                bpy.ops.render.render()
+            finally:
+                (render.use_border, render.use_crop_to_border, render.border_min_x,
+                 render.border_max_x, render.border_min_y, render.border_max_y) = border
+        else:
+            bpy.ops.render.render()
+        phase('render')
+
+        bpy.data.images['Render Result'].save_render(filepath=job['output'], scene=scene)
+        phase('write')
+
+        self.phases = phases
+        return time.perf_counter() - start
+
+
+class AtlasRenderer:
+    """Render batches of variations seen from one orthographic camera in a single frame, see atlas.py"""
+
+    GEOMETRY = {'MESH', 'CURVE', 'SURFACE', 'META', 'FONT', 'CURVES', 'POINTCLOUD', 'VOLUME'}
+
+    def __init__(self, renderer, run, size):
+        self.renderer = renderer
+        self.run = run
+        self.scene = run.scene
+        self.size = size
+        self.fits_cache = {}
+
+        render = self.scene.render
+        self.width = render.resolution_x * render.resolution_percentage // 100
+        self.height = render.resolution_y * render.resolution_percentage // 100
+        shown = set()
+        for group in renderer.visibility.groups.values():
+            shown.update(ob.name for ob in group)
+        # anything else in view would be rendered once, in one of the cells
+        self.scenery = [ob.name for ob in self.scene.objects
+                        if ob.name not in shown and not ob.hide_render and ob.type != 'CAMERA'
+                        and not (ob.type == 'LIGHT' and ob.data.type == 'SUN')]
+        settings = render.image_settings
+        self.usable = (not self.scenery and render.pixel_aspect_x == render.pixel_aspect_y
+                       and (run.encoder is not None or settings.file_format == 'PNG')
+                       and settings.color_depth == '8')
+
+    def fits(self, job):
+        """Whether a job can share an atlas: orthographic camera, object inside the frame"""
+        from bpy_extras.object_utils import world_to_camera_view
+        from mathutils import Vector
+        key = (job['object'], job['camera'])
+        if key not in self.fits_cache:
+            cam = bpy.data.objects[job['camera']]
+            obj = bpy.data.objects[job['object']]
+            fits = cam.type == 'CAMERA' and cam.data.type == 'ORTHO'
+            for ob in [obj] + visibility.get_descendants(obj):
+                if not fits:
+                    break
+                if ob.type not in self.GEOMETRY:
+                    continue
+                for corner in ob.bound_box:
+                    x, y, _ = world_to_camera_view(self.scene, cam, ob.matrix_world @ Vector(corner))
+                    if not (0.0 <= x <= 1.0 and 0.0 <= y <= 1.0):
+                        fits = False
+                        break
+            self.fits_cache[key] = fits
+        return self.fits_cache[key]
+
+    def batches(self, jobs):
+        key = (lambda job: job['camera'] if self.fits(job) else None) if self.usable else (lambda job: None)
+        return atlas.batches(jobs, self.size, key)
+
+    def copy_hierarchy(self, ob, collection, parent=None):
+        copy = ob.copy()
+        collection.objects.link(copy)
+        if parent is not None:
+            copy.parent = parent
+        copy.hide_render = copy.hide_viewport = False
+        copies = [copy]
+        for child in ob.children:
+            copies += self.copy_hierarchy(child, collection, copy)
+        return copies
+
+    def render(self, jobs):
+        """Render jobs in one frame and write each of them, returns the elapsed time"""
+        from mathutils import Matrix, Vector
+        phases = dict.fromkeys(metrics.PHASES, 0.0)
+        scene = self.scene
+        render = scene.render
+        start = lap = time.perf_counter()
+
+        def phase(name):
+            nonlocal lap
+            now = time.perf_counter()
+            phases[name] += now - lap
+            lap = now
+
+        cam = bpy.data.objects[jobs[0]['camera']]
+        columns, rows = atlas.grid(len(jobs), self.width, self.height)
+        cell_width, cell_height = atlas.cell_extent(cam.data.ortho_scale, cam.data.sensor_fit,
+                                                    self.width, self.height)
+        right = cam.matrix_world.to_3x3() @ Vector((1.0, 0.0, 0.0))
+        up = cam.matrix_world.to_3x3() @ Vector((0.0, 1.0, 0.0))
+        right.normalize()
+        up.normalize()
+
+        # the render objects are hidden, each cell gets linked copies
+        self.renderer.visibility.hide_all()
+        self.renderer.prev_ob = self.renderer.prev_mat = None
+        collection = bpy.data.collections.new("render_farm_atlas")
+        scene.collection.children.link(collection)
+        phase('visibility')
+
+        copies = []
+        try:
+            for job, (dx, dy) in zip(jobs, atlas.offsets(columns, rows, cell_width, cell_height)):
+                obj = bpy.data.objects[job['object']]
+                mat = bpy.data.materials[job['material']]
+                cell = self.copy_hierarchy(obj, collection)
+                cell[0].matrix_world = Matrix.Translation(right * dx + up * dy) @ obj.matrix_world
+                if not obj.data.materials:
+                    obj.data.materials.append(mat)
+                cell[0].material_slots[0].link = 'OBJECT'
+                cell[0].material_slots[0].material = mat
+                copies += cell
+            phase('material')
+
+            saved = (scene.camera, render.resolution_x, render.resolution_y, render.resolution_percentage,
+                     render.filepath, cam.data.ortho_scale, cam.data.sensor_fit,
+                     cam.data.shift_x, cam.data.shift_y)
+            settings = render.image_settings
+            saved_format = (settings.file_format, settings.color_mode)
+            scale = cam.data.ortho_scale
+            try:
+                scene.camera = cam
+                render.resolution_x = columns * self.width
+                render.resolution_y = rows * self.height
+                render.resolution_percentage = 100
+                cam.data.sensor_fit = 'HORIZONTAL'
+                cam.data.ortho_scale = columns * cell_width
+                # shifts are fractions of the frame, keep them in world units
+                cam.data.shift_x *= scale / cam.data.ortho_scale
+                cam.data.shift_y *= scale / cam.data.ortho_scale
+                render.filepath = jobs[0]['filepath']
+                phase('camera')
+
+                bpy.ops.render.render()
+                phase('render')
+
+                raw = os.path.join(self.run.path, encoder.RAW_DIR, 'atlas.tga')
+                os.makedirs(os.path.dirname(raw), exist_ok=True)
+                settings.file_format = 'TARGA_RAW'
+                settings.color_mode = 'RGBA'
+                bpy.data.images['Render Result'].save_render(filepath=raw, scene=scene)
+            finally:
+                (scene.camera, render.resolution_x, render.resolution_y, render.resolution_percentage,
+                 render.filepath, cam.data.ortho_scale, cam.data.sensor_fit,
+                 cam.data.shift_x, cam.data.shift_y) = saved
+                settings.file_format, settings.color_mode = saved_format
+        finally:
+            for copy in copies:
+                bpy.data.objects.remove(copy, do_unlink=True)
+            bpy.data.collections.remove(collection)
+
+        cells = atlas.slice_cells(encoder.read_tga(raw), columns, rows, self.width, self.height)
+        os.remove(raw)
+        if self.run.encoder is None:
+            try:
+                os.rmdir(os.path.dirname(raw))
+            except OSError:
+                pass
+        level = round(render.image_settings.compression * 9 / 100)
+        for job, pixels in zip(jobs, cells):
+            if self.run.encoder is not None:
+                encoder.write_tga(self.run.encoder.raw_path(job), pixels)
+            else:
+                encoder.write_png(job['output'], self.width, self.height, (pixels,), level)
+        phase('write')
+
+        # every job of the atlas is charged an equal share
+        share = {name: seconds / len(jobs) for name, seconds in phases.items()}
+        elapsed = time.perf_counter() - start
+        for job in jobs:
+            if self.run.encoder is not None:
+                self.run.encoder.submit(job, self.run.encoder.raw_path(job), elapsed / len(jobs), dict(share))
+            else:
+                self.run.finished(job, elapsed / len(jobs), dict(share))
+        return elapsed
+
+
 # -------------------------------------------------------------------
 #   Operators
 # -------------------------------------------------------------------
@@ -146,16 +970,9 @@ class MaterialsAddAllOperator(Operator):
         return len(bpy.data.materials)
 
     def execute(self, context):
-        scn = context.scene
-        for mat in bpy.data.materials:
-            if not context.scene.render_farm_materials.get(mat.name):
-                item = scn.render_farm_materials.add()
-                item.id = len(scn.render_farm_materials)
-                item.material = mat
-                item.name = item.material.name
-                scn.render_farm_materials_index = (len(scn.render_farm_materials) - 1)
-                info = '%s added to list' % (item.name)
-                self.report({'INFO'}, info)
+        added = add_materials(context.scene, bpy.data.materials)
+        info = '%d materials added to list' % added
+        self.report({'INFO'}, info)
         return {'FINISHED'}
 
 
@@ -187,6 +1004,35 @@ class MaterialsPrintOperator(Operator):
         return {'FINISHED'}
 
 
+class PlanPrintOperator(Operator):
+    """Print the render plan to the console"""
+    bl_idname = "render_farm.print_plan"
+    bl_label = "Print Plan to Console"
+    bl_description = "Print the order in which variations will be rendered to the console"
+    bl_options = {'REGISTER'}
+
+    @cancel_on_rules_error
+    def execute(self, context):
+        plan = get_plan(context.scene)
+        print(plan.format())
+        print("Switches:", plan.switches())
+        self.report({'INFO'}, str(plan))
+        return {'FINISHED'}
+
+
+class EstimateOperator(Operator):
+    """Predict render time and disk use from past renders"""
+    bl_idname = "render_farm.estimate"
+    bl_label = "Estimate"
+    bl_description = "Predict the render time and disk use of the plan from the renders recorded in the output folder"
+
+    @cancel_on_rules_error
+    def execute(self, context):
+        history.current = get_estimate(context.scene)
+        self.report({'INFO'}, 'Estimate : %s' % ', '.join(history.current))
+        return {'FINISHED'}
+
+
 class MaterialsClear(Operator):
     """Clear all items of the list and remove from scene"""
     bl_idname = "render_farm.clear_materials_list"
@@ -240,23 +1086,128 @@ class ObjectsAddOperator(Operator):
     bl_label = "Add selected Objects"
 
     def execute(self, context):
-        scn = context.scene
+        added = add_objects(context.scene, bpy.context.selected_objects)
+        info = '%d objects added to list' % added
+        self.report({'INFO'}, info)
+        return {'FINISHED'}
 
-        for obj in bpy.context.selected_objects:
-            added = bool(scn.render_farm_objects.get(obj.name))
-            self.report({'INFO'}, obj.name + " : " + str(added))
-            if not scn.render_farm_objects.get(obj.name):
-                item = context.scene.render_farm_objects.add()
-                scn = context.scene
-                item.id = len(scn.render_farm_objects)
-                item.name = obj.name
-                item.object = obj
-                scn.render_farm_objects_index = (len(scn.render_farm_objects) - 1)
-                info = '%s added to list' % (item.name)
-                self.report({'INFO'}, info)
+
+class ManifestImportOperator(Operator):
+    """Add the objects and materials listed in a CSV or JSON manifest"""
+    bl_idname = "render_farm.import_manifest"
+    bl_label = "Import Manifest"
+    bl_description = "Add the objects and materials listed in a CSV or JSON manifest to the lists"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    filepath: StringProperty(subtype='FILE_PATH')
+    filter_glob: StringProperty(default="*.csv;*.json", options={'HIDDEN'})
+
+    def invoke(self, context, event):
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+    def execute(self, context):
+        try:
+            result = import_manifest(context.scene, self.filepath)
+        except (OSError, ValueError) as e:
+            self.report({'ERROR'}, 'Manifest : %s' % e)
+            return {'CANCELLED'}
+
+        info = 'Manifest : %d objects, %d materials added' % (result['objects'], result['materials'])
+        missing = ['%d %s' % (len(result['missing'][axis]), axis + 's')
+                   for axis in manifest.AXES if result['missing'][axis]]
+        if missing:
+            info += ', not found : ' + ', '.join(missing)
+            print('Manifest not found :', result['missing'])
+            self.report({'WARNING'}, info)
+        else:
+            self.report({'INFO'}, info)
         return {'FINISHED'}
 
 
+def render_local(operator, run):
+    """Render the jobs of a run in this process, one by one or in atlases, returns the outputs"""
+    renderer = SceneRenderer()
+    size = run.scene.render_farm_settings.atlas
+    atlas_renderer = AtlasRenderer(renderer, run, size) if size > 1 else None
+    if atlas_renderer is not None and not atlas_renderer.usable:
+        operator.report({'WARNING'}, 'Atlas needs a PNG output of 8 bits, square pixels and a scene lit by '
+                                     'the world and sun lights only, rendering one by one')
+    images = []
+    for batch in atlas_renderer.batches(run.jobs) if atlas_renderer else ([job] for job in run.jobs):
+        if len(batch) > 1:
+            operator.report({'INFO'}, 'Rendering atlas of %d... %s' % (len(batch), batch[0]['filepath']))
+            atlas_renderer.render(batch)
+        else:
+            operator.report({'INFO'}, 'Rendering... %s' % batch[0]['filepath'])
+            run.render(renderer, batch[0])
+        run.update()
+        images += [job['output'] for job in batch]
+
+    return images
+
+
+def render_pool(operator, scene, run):
+    """Render the jobs of a run on background Blender processes, returns the outputs"""
+    settings = scene.render_farm_settings
+
+    # workers load a copy of the current state, saved changes or not
+    tmp_dir = tempfile.mkdtemp(prefix="render_farm_")
+    blend = os.path.join(tmp_dir, "render_farm.blend")
+    bpy.ops.wm.save_as_mainfile(filepath=blend, copy=True)
+
+    worker_script = os.path.join(os.path.dirname(__file__), "worker.py")
+    threads = max(1, (os.cpu_count() or 1) // settings.workers)
+
+    def command(index, host, port, authkey):
+        return [bpy.app.binary_path, "-b", blend, "-t", str(threads),
+                "--python", worker_script, "--",
+                "--address", host, str(port), "--authkey", authkey, "--index", str(index)]
+
+    def on_result(reply):
+        if reply['type'] == 'done':
+            run.finished(reply['job'], reply['elapsed'], reply.get('phases'), reply.get('worker'))
+            print('Rendered... %s' % reply['job']['filepath'])
+        else:
+            print('Failed... %s : %s' % (reply['job']['filepath'], reply['message']), file=sys.stderr)
+
+    operator.report({'INFO'}, 'Rendering %d jobs on %d workers' % (len(run.jobs), settings.workers))
+    workers = pool.WorkerPool(command, settings.workers,
+                              job_timeout=settings.job_timeout,
+                              max_rss=settings.max_memory * 2 ** 20,
+                              recycle_after=settings.recycle_jobs,
+                              recycle_rss=settings.recycle_memory * 2 ** 20,
+                              max_attempts=settings.max_attempts)
+    # the pool waits for its workers on a thread, this one keeps contact sheets and regions current
+    outcome = {}
+
+    def serve():
+        try:
+            outcome['results'] = workers.run(run.jobs, on_result)
+        except BaseException as e:
+            outcome['error'] = e
+    thread = threading.Thread(target=serve, name='render_farm_pool', daemon=True)
+    try:
+        thread.start()
+        while thread.is_alive():
+            thread.join(2.0)
+            run.update()
+    finally:
+        thread.join()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    if 'error' in outcome:
+        raise outcome['error']
+    results = outcome['results']
+
+    for line in workers.report():
+        operator.report({'INFO'}, line)
+    for error in workers.errors:
+        operator.report({'WARNING'}, 'Quarantined %s after %d attempts : %s' % (
+            error['job']['filepath'], error.get('attempts', 1), error['message']))
+
+    return [r['job']['output'] for r in results]
+
+
 class RenderObjectsOperator(Operator):
     bl_idname = "render.items"
     bl_label = "Render Items"
@@ -269,6 +1220,7 @@ class RenderObjectsOperator(Operator):
     def invoke(self, context, event):
         return context.window_manager.invoke_confirm(self, event)
 
+    @cancel_on_rules_error
     def execute(self, context):
 
         scn = context.scene
@@ -279,48 +1231,291 @@ class RenderObjectsOperator(Operator):
         # print('Rendering : Path ==> ' , path);
 
 
-        # set export options
-        bpy.context.scene.render.image_settings.color_mode = 'RGBA'
         startTime = time.time()
 
-        hide_objects()
-        scene = context.scene
-        prev_ob = None
-        cameras = get_cameras()
-        images = []
-        for r_ob in scene.render_farm_objects:
+        self.report({'INFO'}, str(get_plan(scn)))
+        self.report({'INFO'}, 'Estimate : %s' % ', '.join(get_estimate(scn)))
+        run = RenderRun(self, scn, local=scn.render_farm_settings.workers == 1)
+        try:
+            if scn.render_farm_settings.workers > 1:
+                images = render_pool(self, scn, run)
+            else:
+                images = render_local(self, run)
+        finally:
+            report = run.close(self)
 
-            obj = r_ob.object
+        endTime = time.time()
+        total = endTime - startTime
 
-            if bool(prev_ob):
-                hide_object(prev_ob)
+        info = "Rendering : Elapsed ==> %s (%d images)" % (total, len(images))
+        self.report({'INFO'}, info)
+        self.report({'INFO'}, "Rendering : Report ==> %s" % report)
 
-            show_object(obj)
+        return {'FINISHED'}
 
-            for r_mat in scene.render_farm_materials:
 
-                #assign material
-                if(obj.data.materials):
-                    obj.data.materials[0] = r_mat.material
+class PreviewRenderOperator(RenderObjectsOperator):
+    """Render every variation at preview quality into the preview folder"""
+    bl_idname = "render_farm.render_preview"
+    bl_label = "Render Preview"
+    bl_description = "Render the whole matrix at low resolution and samples into a preview folder, with a contact sheet"
+
+    @cancel_on_rules_error
+    def execute(self, context):
+        scn = context.scene
+        settings = scn.render_farm_settings
+
+        startTime = time.time()
+        with preview_settings(scn) as fraction:
+            self.report({'INFO'}, 'Preview : %d%% resolution, about %.1f%% of the final render time' % (
+                settings.preview_scale, fraction * 100))
+            run = RenderRun(self, scn, local=settings.workers == 1, preview=True)
+            try:
+                if settings.workers > 1:
+                    images = render_pool(self, scn, run)
                 else:
-                    obj.data.materials.append(r_mat.material)
+                    images = render_local(self, run)
+            finally:
+                run.close(self)
 
-                for cam in cameras:
-                    bpy.context.scene.camera = cam
-                    renderPath = os.path.join(path, r_mat.material.name + "_" + obj.name + "_" + cam.name)
-                    self.report({'INFO'}, 'Rendering... %s' % renderPath)
-                    bpy.context.scene.render.filepath = renderPath
-                    bpy.ops.render.render(write_still=True)
-                    images.append(renderPath + ".png")
+        info = "Preview : Elapsed ==> %s (%d images)" % (time.time() - startTime, len(images))
+        self.report({'INFO'}, info)
+        self.report({'INFO'}, "Preview : Contact sheet ==> %s" % run.sheet.path)
+        return {'FINISHED'}
 
-            prev_ob = r_ob.object
 
-        endTime = time.time()
-        total = endTime - startTime
+class ContactSheetOperator(Operator):
+    """Build the contact sheet from the images already rendered"""
+    bl_idname = "render_farm.contact_sheet"
+    bl_label = "Build Contact Sheet"
+    bl_description = "Build a grid of all variations rendered so far in the output folder"
+
+    @cancel_on_rules_error
+    def execute(self, context):
+        scn = context.scene
+        path = bpy.path.abspath(scn.render_farm_savePath.path)
+        jobs = get_jobs(scn, path)
+        sheet = get_contact_sheet(scn, path, jobs)
+        count = sheet.add_many(jobs, load_pixels)
+        sheet_path = sheet.write()
+        self.report({'INFO'}, 'Contact sheet : %d of %d variations ==> %s' % (count, len(jobs), sheet_path))
+        return {'FINISHED'}
 
-        info = "Rendering : Elapsed ==> %s" % total
-        self.report({'INFO'}, info)
 
+class TimelineEncodeOperator(Operator):
+    """Encode all variations into the timeline, one per frame"""
+    bl_idname = "render_farm.encode_timeline"
+    bl_label = "Encode Timeline"
+    bl_description = ("Keyframe visibility, bind cameras to markers and store the materials per frame, "
+                      "then save a copy to render with a single 'blender -b -a' call")
+    bl_options = {'REGISTER', 'UNDO'}
+
+    @classmethod
+    def poll(cls, context):
+        return bool(len(get_cameras()))
+
+    @cancel_on_rules_error
+    def execute(self, context):
+        scn = context.scene
+        path = bpy.path.abspath(scn.render_farm_savePath.path)
+        if path:
+            os.makedirs(path, exist_ok=True)
+
+        jobs = [dict(job, name=os.path.basename(job['filepath'])) for job in get_jobs(scn, path)]
+        if not jobs:
+            self.report({'WARNING'}, "Nothing to render")
+            return {'CANCELLED'}
+        table = timeline.frame_table(jobs, start=1)
+
+        # everything below only goes into the saved copy, the working scene is put back after
+        render = scn.render
+        saved = (scn.frame_start, scn.frame_end, render.filepath, render.use_lock_interface)
+        objects = [r_ob.object for r_ob in scn.render_farm_objects]
+        groups = visibility.VisibilityManager(objects).groups
+        animated = {}
+        try:
+            # visibility, a constant key wherever an object is shown or hidden
+            for name, keys in timeline.visibility_keys(table, [ob.name for ob in objects]).items():
+                for ob in groups[name]:
+                    if ob.name in animated:
+                        continue
+                    action = ob.animation_data.action if ob.animation_data else None
+                    animated[ob.name] = (ob, ob.animation_data is not None, action, ob.hide_render, ob.hide_viewport)
+                    if action:
+                        # keyed on a copy, the object gets its own action back
+                        ob.animation_data.action = action = action.copy()
+                        for fcurve in [f for f in action.fcurves if f.data_path in ('hide_render', 'hide_viewport')]:
+                            action.fcurves.remove(fcurve)
+                    for frame, hidden in keys:
+                        ob.hide_render = hidden
+                        ob.hide_viewport = hidden
+                        ob.keyframe_insert('hide_render', frame=frame)
+                        ob.keyframe_insert('hide_viewport', frame=frame)
+
+            # cameras, bound to markers
+            for marker in [m for m in scn.timeline_markers if m.name.startswith(timeline.FRAME_PREFIX)]:
+                scn.timeline_markers.remove(marker)
+            for frame, cam in timeline.changes(table, 'camera'):
+                marker = scn.timeline_markers.new(timeline.FRAME_PREFIX + cam, frame=frame)
+                marker.camera = bpy.data.objects[cam]
+
+            # materials, assigned by timeline_frame_change
+            scn[timeline.FRAMES_PROP] = timeline.dumps(table)
+
+            scn.frame_start = 1
+            scn.frame_end = len(table)
+            render.filepath = os.path.join(path, timeline.FRAME_PREFIX)
+            render.use_lock_interface = True
+
+            blend = os.path.join(path, timeline.TIMELINE_NAME)
+            bpy.ops.wm.save_as_mainfile(filepath=blend, copy=True)
+        finally:
+            for ob, had_animation, action, hide_render, hide_viewport in animated.values():
+                keyed = ob.animation_data.action if ob.animation_data else None
+                if had_animation:
+                    ob.animation_data.action = action
+                else:
+                    ob.animation_data_clear()
+                if keyed is not None and keyed is not action:
+                    bpy.data.actions.remove(keyed)
+                ob.hide_render = hide_render
+                ob.hide_viewport = hide_viewport
+            for marker in [m for m in scn.timeline_markers if m.name.startswith(timeline.FRAME_PREFIX)]:
+                scn.timeline_markers.remove(marker)
+            if timeline.FRAMES_PROP in scn:
+                del scn[timeline.FRAMES_PROP]
+            scn.frame_start, scn.frame_end, render.filepath, render.use_lock_interface = saved
+
+        self.report({'INFO'}, 'Timeline : %d frames ==> %s' % (len(table), blend))
+        workers = scn.render_farm_settings.workers
+        for start, end in timeline.split_range(1, len(table), workers):
+            print('blender -b "%s" -s %d -e %d -a' % (blend, start, end))
+        return {'FINISHED'}
+
+
+class RenderSubmitOperator(Operator):
+    """Submit all variations to a render coordinator"""
+    bl_idname = "render_farm.submit"
+    bl_label = "Submit to Farm"
+    bl_description = "Send all variations to the coordinator, render nodes lease and render them"
+
+    @classmethod
+    def poll(cls, context):
+        return bool(context.scene.render_farm_settings.coordinator) and bool(len(get_cameras()))
+
+    @cancel_on_rules_error
+    def execute(self, context):
+        scn = context.scene
+        client = coordinator.Client(scn.render_farm_settings.coordinator,
+                                    scn.render_farm_settings.coordinator_token)
+        # the coordinator decides where images end up, only names are sent
+        jobs = get_jobs(scn, "")
+        try:
+            queued = client.submit(jobs, resume=scn.render_farm_settings.resume)
+        except PermissionError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        except OSError as e:
+            self.report({'ERROR'}, 'Coordinator unreachable : %s' % e)
+            return {'CANCELLED'}
+        except ValueError as e:
+            self.report({'ERROR'}, 'Coordinator refused the jobs : %s' % e)
+            return {'CANCELLED'}
+        self.report({'INFO'}, 'Submitted %d of %d jobs to %s' % (queued, len(jobs), client.url))
+        return {'FINISHED'}
+
+
+class RenderQueueOperator(Operator):
+    """Render the variations one per timer tick, keeping the interface responsive"""
+    bl_idname = "render_farm.render_queue"
+    bl_label = "Render Queue"
+    bl_description = "Render variations one at a time without blocking the interface. Esc cancels"
+
+    _timer = None
+
+    @classmethod
+    def poll(cls, context):
+        return progress.current is None and bool(len(get_cameras()))
+
+    @cancel_on_rules_error
+    def execute(self, context):
+        self.run = RenderRun(self, context.scene)
+        self.jobs = collections.deque(self.run.jobs)
+        self.renderer = SceneRenderer()
+
+        progress.current = progress.Progress(len(self.jobs))
+        wm = context.window_manager
+        self._timer = wm.event_timer_add(0.1, window=context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        state = progress.current
+        if event.type == 'ESC' or state.cancelled:
+            return self.finish(context, 'Rendering : Cancelled')
+
+        if event.type != 'TIMER' or state.paused:
+            return {'PASS_THROUGH'}
+
+        if not self.jobs:
+            return self.finish(context, 'Rendering : Done')
+
+        job = self.jobs.popleft()
+        self.report({'INFO'}, 'Rendering... %s' % job['filepath'])
+        try:
+            elapsed = self.run.render(self.renderer, job)
+            self.run.update()
+        except Exception as e:
+            # stop like Esc, the timer and progress.current would block every later render
+            state.cancel()
+            self.report({'ERROR'}, 'Rendering failed %s : %s' % (job['filepath'], e))
+            return self.finish(context, 'Rendering : Failed')
+        state.record(elapsed)
+
+        for area in context.screen.areas:
+            if area.type == 'VIEW_3D':
+                area.tag_redraw()
+        return {'PASS_THROUGH'}
+
+    def finish(self, context, message):
+        state = progress.current
+        context.window_manager.event_timer_remove(self._timer)
+        progress.current = None
+        self.run.close(self)
+        self.report({'INFO'}, '%s ==> %s' % (message, ', '.join(state.lines())))
+        return {'CANCELLED'} if state.cancelled else {'FINISHED'}
+
+
+class RenderQueuePauseOperator(Operator):
+    """Pause or resume the running render queue after the current job"""
+    bl_idname = "render_farm.render_queue_pause"
+    bl_label = "Pause"
+    bl_options = {'INTERNAL'}
+
+    @classmethod
+    def poll(cls, context):
+        return progress.current is not None
+
+    def execute(self, context):
+        if progress.current.paused:
+            progress.current.resume()
+        else:
+            progress.current.pause()
+        return {'FINISHED'}
+
+
+class RenderQueueCancelOperator(Operator):
+    """Stop the running render queue after the current job"""
+    bl_idname = "render_farm.render_queue_cancel"
+    bl_label = "Cancel"
+    bl_options = {'INTERNAL'}
+
+    @classmethod
+    def poll(cls, context):
+        return progress.current is not None
+
+    def execute(self, context):
+        progress.current.cancel()
         return {'FINISHED'}
 
 
@@ -349,11 +1544,107 @@ class RenderOptionsPanel(RenderFarmPanel, bpy.types.Panel):
 
         row = layout.row()
         row.operator(RenderObjectsOperator.bl_idname, text="Render")
+        row.operator(RenderQueueOperator.bl_idname, text="Render Queue")
+
+        state = progress.current
+        if state is not None:
+            box = layout.box()
+            col = box.column(align=True)
+            for line in state.lines():
+                col.label(text=line)
+            row = box.row(align=True)
+            row.operator(RenderQueuePauseOperator.bl_idname,
+                         text="Resume" if state.paused else "Pause",
+                         icon='PLAY' if state.paused else 'PAUSE')
+            row.operator(RenderQueueCancelOperator.bl_idname, icon='CANCEL')
 
         col = layout.column(align=True)
         col.label(text='Out Path')
         col.prop(scn.render_farm_savePath, "path", text="")
 
+        row = layout.row()
+        row.prop(scn.render_farm_settings, "workers")
+        row.prop(scn.render_farm_settings, "resume")
+        row.prop(scn.render_farm_settings, "only_changed", text="Changed")
+        row.prop(scn.render_farm_settings, "use_collections", text="Collections")
+
+        if scn.render_farm_settings.workers > 1:
+            row = layout.row(align=True)
+            row.prop(scn.render_farm_settings, "regions")
+            row.prop(scn.render_farm_settings, "split_jobs", text="Jobs")
+            row.prop(scn.render_farm_settings, "longest_first", text="Longest First")
+            row = layout.row(align=True)
+            row.prop(scn.render_farm_settings, "job_timeout", text="Timeout")
+            row.prop(scn.render_farm_settings, "max_memory", text="Memory")
+            row.prop(scn.render_farm_settings, "max_attempts", text="Attempts")
+            row = layout.row(align=True)
+            row.label(text="Restart after")
+            row.prop(scn.render_farm_settings, "recycle_jobs", text="Jobs")
+            row.prop(scn.render_farm_settings, "recycle_memory", text="MB")
+
+        row = layout.row(align=True)
+        row.prop(scn.render_farm_settings, "rules", text="", icon='FILTER')
+
+        row = layout.row(align=True)
+        row.prop(scn.render_farm_settings, "order", text="")
+        row.operator(PlanPrintOperator.bl_idname, text="", icon="LINENUMBERS_ON")
+        row.operator(EstimateOperator.bl_idname, text="", icon="TIME")
+        if history.current:
+            col = layout.box().column(align=True)
+            for line in history.current:
+                col.label(text=line)
+
+        row = layout.row(align=True)
+        row.operator(PreviewRenderOperator.bl_idname, icon='RESTRICT_RENDER_OFF')
+        row.prop(scn.render_farm_settings, "preview_scale", text="")
+        row.prop(scn.render_farm_settings, "preview_samples", text="Samples")
+        row = layout.row()
+        row.prop(scn.render_farm_settings, "final_approved")
+
+        row = layout.row(align=True)
+        row.prop(scn.render_farm_settings, "contact_sheet")
+        row.prop(scn.render_farm_settings, "sheet_rows", text="")
+        row.prop(scn.render_farm_settings, "sheet_tile", text="Tile")
+        row.operator(ContactSheetOperator.bl_idname, text="", icon='IMGDISPLAY')
+
+        row = layout.row(align=True)
+        row.prop(scn.render_farm_settings, "dedupe")
+
+        row = layout.row(align=True)
+        row.prop(scn.render_farm_settings, "atlas")
+
+        row = layout.row(align=True)
+        row.prop(scn.render_farm_settings, "async_encode")
+        row.prop(scn.render_farm_settings, "png_compression", text="Level")
+        row.prop(scn.render_farm_settings, "webp", text="WebP")
+
+        row = layout.row(align=True)
+        row.prop(scn.render_farm_settings, "derivatives")
+        row.prop(scn.render_farm_settings, "derivative_formats")
+        if scn.render_farm_settings.derivatives:
+            row = layout.row(align=True)
+            row.prop(scn.render_farm_settings, "derivative_sizes", text="")
+            row.prop(scn.render_farm_settings, "trim_alpha")
+            row.prop(scn.render_farm_settings, "trim_margin", text="Margin")
+
+        row = layout.row(align=True)
+        row.prop(scn.render_farm_settings, "package")
+        row.prop(scn.render_farm_settings, "package_format", text="")
+        row.prop(scn.render_farm_settings, "package_size", text="MB")
+        if scn.render_farm_settings.package:
+            row = layout.row(align=True)
+            row.prop(scn.render_farm_settings, "upload_url", text="", icon='EXPORT')
+
+        row = layout.row()
+        row.operator(TimelineEncodeOperator.bl_idname, icon='TIME')
+
+        row = layout.row(align=True)
+        row.prop(scn.render_farm_settings, "coordinator", text="", icon='URL')
+        row.operator(RenderSubmitOperator.bl_idname, text="Submit")
+        if scn.render_farm_settings.coordinator:
+            row = layout.row()
+            row.prop(scn.render_farm_settings, "coordinator_token", text="Token", icon='LOCKED')
+
         row = layout.row()
 
         if scn.update_cameras:
@@ -367,6 +1658,7 @@ class RenderOptionsPanel(RenderFarmPanel, bpy.types.Panel):
 class ObjectsList(UIList):
     def draw_item(self, context, layout, data, item, icon, active_data, active_propname, index):
         layout.label(text=item.name, icon_value=layout.icon(item.object))
+        layout.prop(item, "final", text="")
 
 
 class ObjectsPanel(RenderFarmPanel, bpy.types.Panel):
@@ -392,6 +1684,9 @@ class ObjectsPanel(RenderFarmPanel, bpy.types.Panel):
         box = layout.row()
         box.operator(ObjectsClearOperator.bl_idname, icon='REMOVE')
 
+        box = layout.row()
+        box.operator(ManifestImportOperator.bl_idname, icon='IMPORT')
+
 
 class MaterialsList(UIList):
     def draw_item(self, context, layout, data, item, icon, active_data, active_propname, index):
@@ -402,6 +1697,7 @@ class MaterialsList(UIList):
             # static method UILayout.icon returns the integer value of the icon ID
             # "computed" for the given RNA object.
             split.prop(mat, "name", text="", emboss=False, icon_value=layout.icon(mat))
+            split.prop(item, "final", text="")
 
         elif self.layout_type in {'GRID'}:
             layout.alignment = 'CENTER'
@@ -461,12 +1757,20 @@ class MaterialsPropertyGroup(PropertyGroup):
     material: PointerProperty(
         name="Material",
         type=bpy.types.Material)
+    final: BoolProperty(
+        name="Final",
+        description="Render in the final run, previews render every material",
+        default=True)
 
 
 class ObjectsPropertyGroup(PropertyGroup):
     object: PointerProperty(
         name="Object",
         type=bpy.types.Object)
+    final: BoolProperty(
+        name="Final",
+        description="Render in the final run, previews render every object",
+        default=True)
 
 
 class FilePathProperty(PropertyGroup):
@@ -478,6 +1782,194 @@ class FilePathProperty(PropertyGroup):
         subtype='DIR_PATH')
 
 
+class SettingsPropertyGroup(PropertyGroup):
+    rules: StringProperty(
+        name="Rules",
+        description="JSON file of groups and include / exclude rules, only the variations they allow are rendered",
+        default="",
+        subtype='FILE_PATH')
+    workers: IntProperty(
+        name="Workers",
+        description="Number of background Blender processes rendering in parallel, 1 renders in this process",
+        default=1,
+        min=1,
+        soft_max=32)
+    resume: BoolProperty(
+        name="Resume",
+        description="Skip variations recorded as done in the journal and still present on disk",
+        default=False)
+    order: bpy.props.EnumProperty(
+        name="Order",
+        description="Order in which variations are rendered",
+        items=(
+            ('GROUPED', "Grouped", "Keep object and material changes between renders to a minimum"),
+            ('NESTED', "Nested", "Each object, then each material, then each camera")),
+        default='GROUPED')
+    use_collections: BoolProperty(
+        name="Collection Visibility",
+        description="Toggle whole collections instead of single objects, for objects whose hierarchy has a collection of its own",
+        default=False)
+    contact_sheet: BoolProperty(
+        name="Contact Sheet",
+        description="Add every render to a contact sheet in the output folder",
+        default=False)
+    sheet_rows: bpy.props.EnumProperty(
+        name="Rows",
+        description="One row of the contact sheet per value of this axis, the others make the columns",
+        items=(
+            ('OBJECT', "Objects", ""),
+            ('MATERIAL', "Materials", ""),
+            ('CAMERA', "Cameras", "")),
+        default='OBJECT')
+    sheet_tile: IntProperty(
+        name="Tile Size",
+        description="Size of one variation on the contact sheet in pixels",
+        default=256,
+        min=16,
+        soft_max=1024)
+    only_changed: BoolProperty(
+        name="Only Changed",
+        description="Render only variations whose material, object, camera or render settings changed since they were last rendered with this on",
+        default=False)
+    longest_first: BoolProperty(
+        name="Longest First",
+        description="Hand workers the variations predicted slowest from past renders first, so the run does not end on them",
+        default=True)
+    job_timeout: IntProperty(
+        name="Job Timeout",
+        description="Seconds a worker may spend on one variation before it is killed and the job retried, 0 waits forever",
+        default=0,
+        min=0)
+    max_memory: IntProperty(
+        name="Memory Ceiling",
+        description="Megabytes a worker may use while rendering before it is killed and the job retried, 0 for no limit",
+        default=0,
+        min=0)
+    max_attempts: IntProperty(
+        name="Attempts",
+        description="Times a variation is tried before it is quarantined and the run goes on without it",
+        default=2,
+        min=1)
+    recycle_jobs: IntProperty(
+        name="Restart After Jobs",
+        description="Restart a worker after this many variations to release the memory it gathered, 0 never",
+        default=0,
+        min=0)
+    recycle_memory: IntProperty(
+        name="Restart Above Memory",
+        description="Restart a worker once it uses more than this many megabytes after a variation, 0 never",
+        default=0,
+        min=0)
+    regions: IntProperty(
+        name="Regions",
+        description="Split the slowest variations into this many bands rendered by separate workers, 1 does not split",
+        default=1,
+        min=1,
+        soft_max=16)
+    split_jobs: IntProperty(
+        name="Split Jobs",
+        description="Number of variations to split, the slowest of the last run or the last of the plan",
+        default=4,
+        min=0)
+    preview_scale: IntProperty(
+        name="Preview Scale",
+        description="Resolution of previews, percent of the final resolution",
+        default=25,
+        min=1,
+        max=100,
+        subtype='PERCENTAGE')
+    preview_samples: IntProperty(
+        name="Preview Samples",
+        description="Render samples of previews, capped at the final samples",
+        default=16,
+        min=1)
+    final_approved: BoolProperty(
+        name="Approved Only",
+        description="Render only the variations whose preview is still in the preview folder, delete the rejected ones",
+        default=False)
+    dedupe: BoolProperty(
+        name="Deduplicate",
+        description="Keep identical renders once in .store/ and hardlink their names, report which axes made no difference",
+        default=False)
+    async_encode: BoolProperty(
+        name="Encode in Background",
+        description="Write renders uncompressed and encode them to PNG in background threads while the next one renders, 8 bit PNG output only",
+        default=False)
+    png_compression: IntProperty(
+        name="PNG Compression",
+        description="zlib level of background encoded PNGs, 0 is fastest, 9 is smallest",
+        default=6,
+        min=0,
+        max=9)
+    webp: BoolProperty(
+        name="WebP",
+        description="Also encode a WebP next to each PNG, needs Pillow",
+        default=False)
+    atlas: IntProperty(
+        name="Atlas",
+        description="Render up to this many variations seen from the same orthographic camera in one frame "
+                    "and slice it, for small renders lit by the world and sun lights. 1 renders one by one",
+        default=1,
+        min=1,
+        max=64)
+    derivatives: BoolProperty(
+        name="Derivatives",
+        description="Write trimmed and resized copies of every render in derivatives/, "
+                    "each render is decoded once in background processes while the run goes on",
+        default=False)
+    derivative_formats: bpy.props.EnumProperty(
+        name="Derivative Formats",
+        description="Formats of the derivatives, WebP needs Pillow",
+        items=(
+            ('PNG', "PNG", ""),
+            ('WEBP', "WebP", "")),
+        options={'ENUM_FLAG'},
+        default={'PNG'})
+    derivative_sizes: StringProperty(
+        name="Sizes",
+        description="name:pixels of the longest side, or just name for the full size, separated by commas",
+        default="thumb:256, medium:1024, full")
+    trim_alpha: BoolProperty(
+        name="Trim",
+        description="Crop the transparent border of the derivatives",
+        default=True)
+    trim_margin: IntProperty(
+        name="Trim Margin",
+        description="Pixels of transparent border kept around the trimmed image",
+        default=0,
+        min=0)
+    package: BoolProperty(
+        name="Package",
+        description="Append every finished render to zip or tar shards in delivery/ with a manifest, while the run goes on",
+        default=False)
+    package_format: bpy.props.EnumProperty(
+        name="Archive Format",
+        description="Format of the delivery shards",
+        items=(
+            ('ZIP', "Zip", "Stored zip archives"),
+            ('TAR', "Tar", "Uncompressed tar archives")),
+        default='ZIP')
+    package_size: IntProperty(
+        name="Shard Size",
+        description="Close a delivery shard and start the next once it holds this many MB",
+        default=1024,
+        min=1)
+    upload_url: StringProperty(
+        name="Upload",
+        description="S3 compatible http(s)://host/bucket/prefix the shards are uploaded to as they close, "
+                    "keys are read from AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY",
+        default="")
+    coordinator: StringProperty(
+        name="Coordinator",
+        description="URL of the render coordinator, e.g. http://farm:8765",
+        default="")
+    coordinator_token: StringProperty(
+        name="Token",
+        description="Token the coordinator was started with, RENDER_FARM_TOKEN when empty",
+        default="",
+        subtype='PASSWORD')
+
+
 class CamerasPropertyGroup(PropertyGroup):
     camera: PointerProperty(
         name="Camera",
@@ -493,14 +1985,24 @@ classes = (
 
     RenderOptionsPanel,
     RenderObjectsOperator,
+    PreviewRenderOperator,
+    ContactSheetOperator,
+    TimelineEncodeOperator,
+    RenderSubmitOperator,
+    RenderQueueOperator,
+    RenderQueuePauseOperator,
+    RenderQueueCancelOperator,
 
     ObjectsAddOperator,
+    ManifestImportOperator,
     ObjectsClearOperator,
     ObjectsPanel,
     ObjectsList,
 
     MaterialsMoveOperator,
     MaterialsPrintOperator,
+    PlanPrintOperator,
+    EstimateOperator,
     MaterialsClear,
     MaterialsAddAllOperator,
     MaterialsList,
@@ -508,23 +2010,22 @@ classes = (
 
     MaterialsPropertyGroup,
     ObjectsPropertyGroup,
-    FilePathProperty
+    FilePathProperty,
+    SettingsPropertyGroup
 )
 
 def get_update_cameras(self):
-    update = set(s.object for s in self.render_farm_all_cameras).symmetric_difference(self.allCameras)
-    if update:
+    cameras = [c.name for c in self.allCameras]
+    if scene_cache.cache.synced_cameras.get(self.name) != cameras:
         set_update_cameras(self, True)
     return False
 
 
 def set_update_cameras(self, value):
     if (value):
-        self.render_farm_all_cameras.clear()
-        for c in self.allCameras:
-            cam = self.render_farm_all_cameras.add()
-            cam.name = c.name
-            cam.object = c
+        cameras = self.allCameras
+        scene_cache.sync_collection(self.render_farm_all_cameras, {c.name: c for c in cameras}, 'object')
+        scene_cache.cache.synced_cameras[self.name] = [c.name for c in cameras]
 
 
 def get_scene_materials(self):
@@ -532,19 +2033,15 @@ def get_scene_materials(self):
 
 
 def get_update_materials(self):
-    update = set(s.material for s in self.render_farm_all_materials).symmetric_difference(self.allMaterials)
-    if update:
+    if scene_cache.cache.synced_materials.get(self.name) != len(bpy.data.materials):
         set_update_materials(self, True)
     return False
 
 
 def set_update_materials(self, value):
     if value:
-        self.render_farm_all_materials.clear()  # update (or get) instead?
-        for m in bpy.data.materials:
-            s = self.render_farm_all_materials.add()
-            s.name = m.name
-            s.material = m
+        scene_cache.sync_collection(self.render_farm_all_materials, {m.name: m for m in bpy.data.materials}, 'material')
+        scene_cache.cache.synced_materials[self.name] = len(bpy.data.materials)
 
 
 def register():
@@ -582,9 +2079,26 @@ def register():
     bpy.types.Scene.render_farm_objects_index = IntProperty()
 
     bpy.types.Scene.render_farm_savePath = PointerProperty(type=FilePathProperty)
+    bpy.types.Scene.render_farm_settings = PointerProperty(type=SettingsPropertyGroup)
+
+    bpy.app.handlers.frame_change_pre.append(timeline_frame_change)
+    bpy.app.handlers.render_write.append(timeline_render_write)
+
+    bpy.app.handlers.depsgraph_update_post.append(scene_cache_update)
+    for handler in (bpy.app.handlers.load_post, bpy.app.handlers.undo_post, bpy.app.handlers.redo_post):
+        handler.append(scene_cache_reset)
+    subscribe_renames()
 
 
 def unregister():
+    bpy.app.handlers.frame_change_pre.remove(timeline_frame_change)
+    bpy.app.handlers.render_write.remove(timeline_render_write)
+
+    bpy.app.handlers.depsgraph_update_post.remove(scene_cache_update)
+    for handler in (bpy.app.handlers.load_post, bpy.app.handlers.undo_post, bpy.app.handlers.redo_post):
+        handler.remove(scene_cache_reset)
+    bpy.msgbus.clear_by_owner(_msgbus_owner)
+
     from bpy.utils import unregister_class
     for cls in reversed(classes):
         unregister_class(cls)
@@ -608,6 +2122,7 @@ def unregister():
     del bpy.types.Scene.render_farm_objects_index
 
     del bpy.types.Scene.render_farm_savePath
+    del bpy.types.Scene.render_farm_settings
 
 
 if __name__ == "__main__":
@@ -0,0 +1,61 @@
+"""Atlas rendering, several small variations in one render.
+
+Every render pays a fixed cost (scene sync, kernel setup, file write) which
+dwarfs the pixel work of thumbnail sized outputs. An atlas lays out up to K
+variations seen from the same orthographic camera in a grid: each cell gets a
+linked copy of the variation's object, with its material linked to the copy,
+moved along the camera's right and up axes by one frame per cell. The camera
+frame is widened to the whole grid and the resolution multiplied, so each
+cell renders exactly what the variation's own render shows, then the atlas is
+sliced back into the usual files.
+
+An orthographic view does not change when the object moves across it, which a
+perspective one does, so only orthographic cameras are batched. Cells share
+the scene, so it should be lit by the world and sun lights only, and objects
+must stay inside their frame, anything else is rendered on its own. Glossy
+and glass variations can reflect their neighbours.
+"""
+import math
+
+
+def grid(count, width, height):
+    """(columns, rows) of a grid of count cells of width x height, about square"""
+    columns = max(1, min(count, round(math.sqrt(count * height / width))))
+    return columns, math.ceil(count / columns)
+
+
+def cell_extent(scale, sensor_fit, width, height):
+    """(width, height) in world units of the frame of an orthographic camera"""
+    if sensor_fit == 'VERTICAL' or (sensor_fit == 'AUTO' and height > width):
+        return scale * width / height, scale
+    return scale, scale * height / width
+
+
+def offsets(columns, rows, cell_width, cell_height):
+    """(right, up) world offset of each cell from the frame center, row by row from the top left"""
+    return [((column - (columns - 1) / 2.0) * cell_width, ((rows - 1) / 2.0 - row) * cell_height)
+            for row in range(rows) for column in range(columns)]
+
+
+def slice_cells(pixels, columns, rows, width, height):
+    """(columns * rows, height, width, channels) cells of a top row first atlas"""
+    channels = pixels.shape[2]
+    cells = pixels[:rows * height, :columns * width].reshape(rows, height, columns, width, channels)
+    return cells.transpose(0, 2, 1, 3, 4).reshape(rows * columns, height, width, channels)
+
+
+def batches(jobs, size, key):
+    """Lists of up to size jobs with the same key(job), in order, a None key is a batch of its own"""
+    open_batches = {}
+    for job in jobs:
+        k = key(job)
+        if k is None or size < 2:
+            yield [job]
+            continue
+        batch = open_batches.setdefault(k, [])
+        batch.append(job)
+        if len(batch) == size:
+            del open_batches[k]
+            yield batch
+    for batch in open_batches.values():
+        yield batch
@@ -0,0 +1,260 @@
+"""Benchmarks of the add-on's non-render overhead, run without Blender.
+
+The add-on is imported against fake_bpy and driven at 10, 1,000 and 100,000
+variations: visibility helpers and manager, camera lookup, the update_materials and
+update_cameras getters read on every panel redraw, the planner, manifest import and the
+RenderObjectsOperator loop with a no-op renderer.
+
+    python bench/bench.py                          compare against bench/baseline.json
+    python bench/bench.py --update render_loop     record the render_loop entries again
+    python bench/bench.py --update plan@1000       record one entry again
+    python bench/bench.py --scales 10 1000
+
+Timings are recorded and compared as multiples of a fixed pure Python
+calibration loop timed just before each benchmark, not in seconds, so a slower
+or busier machine moves the calibration as much as the benchmarks. Every
+benchmark is the best of several repeats, and timings of a few tens of
+microseconds are compared as equal to that floor, where noise dominates.
+
+Exits with status 1 when a benchmark is slower than its baseline by more than
+the tolerance, so CI catches regressions before production does. Only refresh
+the entries a change is meant to move, and say why in the commit message.
+"""
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import sys
+import tempfile
+import timeit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+BASELINE = os.path.join(HERE, 'baseline.json')
+
+sys.path.insert(0, HERE)
+import fake_bpy  # noqa: E402
+
+# variations -> (objects, materials, cameras)
+SCALES = {
+    10: (5, 2, 1),
+    1000: (20, 10, 5),
+    100000: (200, 50, 10),
+}
+
+SCRATCH = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+# calibration units under which timings are mostly noise, a few tens of microseconds
+FLOOR = 0.05
+
+
+def load_addon(bpy):
+    """Import the add-on as the package render_farm, against the installed fake bpy"""
+    for name in [n for n in sys.modules if n == 'render_farm' or n.startswith('render_farm.')]:
+        del sys.modules[name]
+    spec = importlib.util.spec_from_file_location(
+        'render_farm', os.path.join(ROOT, '__init__.py'), submodule_search_locations=[ROOT])
+    farm = importlib.util.module_from_spec(spec)
+    sys.modules['render_farm'] = farm
+    with contextlib.redirect_stdout(io.StringIO()):
+        spec.loader.exec_module(farm)
+        farm.register()
+    return farm
+
+
+def setup(variations):
+    bpy = fake_bpy.install()
+    farm = load_addon(bpy)
+    objects, materials, cameras = SCALES[variations]
+    scene = fake_bpy.build_scene(bpy, objects, materials, cameras, extra_objects=variations // 10)
+    return bpy, farm, scene
+
+
+def timed(fn, repeat=9, number=None):
+    """Best of repeat runs in seconds per call, calls per run chosen to take at least 0.2s"""
+    timer = timeit.Timer(fn)
+    if number is None:
+        number = timer.autorange()[0]
+    return min(timer.repeat(repeat, number)) / number
+
+
+def calibrate():
+    """Seconds of a fixed dict, list and string workload, the unit of the results"""
+    def work():
+        names = {}
+        for i in range(2000):
+            names['OB_%d' % i] = i
+        return sorted(key for key, value in names.items() if value % 3)
+    return timed(work, repeat=5)
+
+
+# -------------------------------------------------------------------
+#   Benchmarks
+# -------------------------------------------------------------------
+
+def bench_hide_objects(bpy, farm, scene):
+    return timed(farm.hide_objects)
+
+
+def bench_show_hide_object(bpy, farm, scene):
+    obj = scene.render_farm_objects[0].object
+
+    def toggle():
+        farm.show_object(obj)
+        farm.hide_object(obj)
+    return timed(toggle)
+
+
+def bench_visibility_switch(bpy, farm, scene):
+    objects = [r_ob.object for r_ob in scene.render_farm_objects]
+    manager = farm.visibility.VisibilityManager(objects)
+
+    def switch_all():
+        for ob in objects:
+            manager.show(ob.name)
+    return timed(switch_all)
+
+
+def bench_get_cameras(bpy, farm, scene):
+    return timed(farm.get_cameras)
+
+
+def bench_update_materials(bpy, farm, scene):
+    scene.update_materials
+    return timed(lambda: scene.update_materials)
+
+
+def bench_update_cameras(bpy, farm, scene):
+    scene.update_cameras
+    return timed(lambda: scene.update_cameras)
+
+
+def bench_plan(bpy, farm, scene):
+    return timed(lambda: sum(1 for _ in farm.get_plan(scene)))
+
+
+def bench_import_manifest(bpy, farm, scene):
+    objects = [r_ob.object.name for r_ob in scene.render_farm_objects]
+    materials = [r_mat.material.name for r_mat in scene.render_farm_materials]
+    with tempfile.TemporaryDirectory() as path:
+        manifest = os.path.join(path, 'manifest.json')
+        with open(manifest, 'w', encoding='utf-8') as f:
+            json.dump({'objects': objects, 'materials': materials}, f)
+
+        def reimport():
+            scene.render_farm_objects.clear()
+            scene.render_farm_materials.clear()
+            farm.import_manifest(scene, manifest)
+        return timed(reimport)
+
+
+def bench_render_loop(bpy, farm, scene):
+    # the journal syncs every job, keep the disk out of the measurement where memory backed storage exists
+    with tempfile.TemporaryDirectory(dir=SCRATCH) as path:
+        scene.render_farm_savePath.path = path
+        operator = farm.RenderObjectsOperator()
+        repeat = 3 if len(scene.render_farm_objects) < 100 else 1
+        return timed(lambda: operator.execute(bpy.context), repeat=repeat, number=1)
+
+
+BENCHMARKS = (
+    bench_hide_objects,
+    bench_show_hide_object,
+    bench_visibility_switch,
+    bench_get_cameras,
+    bench_update_materials,
+    bench_update_cameras,
+    bench_plan,
+    bench_import_manifest,
+    bench_render_loop,
+)
+
+
+def run(scales):
+    """{name: multiples of the calibration loop, timed again next to each benchmark}"""
+    results = {}
+    for variations in scales:
+        for bench in BENCHMARKS:
+            bpy, farm, scene = setup(variations)
+            name = '%s@%d' % (bench.__name__[len('bench_'):], variations)
+            unit = calibrate()
+            seconds = bench(bpy, farm, scene)
+            results[name] = seconds / unit
+            print('%-28s %14.1f us %14.4f' % (name, seconds * 1e6, results[name]), flush=True)
+    return results
+
+
+def compare(results, baseline, tolerance, floor=FLOOR):
+    """Entries slower than baseline by more than tolerance, both counted as at least floor"""
+    regressions = []
+    for name, units in sorted(results.items()):
+        if name not in baseline:
+            print('%-28s no baseline' % name)
+            continue
+        ratio = max(units, floor) / max(baseline[name], floor)
+        if ratio > 1.0 + tolerance:
+            regressions.append('%-28s %14.4f  baseline %14.4f  x%.2f' % (
+                name, units, baseline[name], ratio))
+    return regressions
+
+
+def selected(results, names):
+    """Entries of results named in names, a bare benchmark name selects all its scales"""
+    if 'all' in names:
+        return dict(results)
+    return {key: value for key, value in results.items()
+            if key in names or key.partition('@')[0] in names}
+
+
+def load_baseline(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if 'benchmarks' not in data:
+        # older baselines were recorded in seconds
+        return None
+    return data['benchmarks']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render farm overhead benchmarks")
+    parser.add_argument('--scales', type=int, nargs='+', default=sorted(SCALES), choices=sorted(SCALES))
+    parser.add_argument('--update', nargs='+', metavar='NAME',
+                        help="Record these entries (name@scale, name for every scale, or all) in the baseline")
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--tolerance', type=float, default=0.5, help="Allowed slowdown, 0.5 = 50%%")
+    args = parser.parse_args()
+
+    names = {bench.__name__[len('bench_'):] for bench in BENCHMARKS}
+    unknown = [name for name in args.update or () if name != 'all' and name.partition('@')[0] not in names]
+    if unknown:
+        parser.error('unknown benchmark %s' % ', '.join(unknown))
+
+    results = run(args.scales)
+
+    baseline = load_baseline(args.baseline) if os.path.exists(args.baseline) else None
+
+    if args.update:
+        updates = selected(results, args.update)
+        baseline = dict(baseline or {}, **updates)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'unit': 'calibration', 'benchmarks': baseline}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print('Baseline ==> %s (%s)' % (args.baseline, ', '.join(sorted(updates))))
+        return 0
+
+    if baseline is None:
+        print('No baseline at %s, run with --update all' % args.baseline)
+        return 0
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print('\nRegressions:')
+        print('\n'.join(regressions))
+        return 1
+    print('\nNo regressions')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
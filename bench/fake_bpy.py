@@ -0,0 +1,351 @@
+"""Lightweight stand-in for bpy, enough to import the add-on and drive it without Blender.
+
+Models scenes, objects with child hierarchies, materials, cameras, the add-on's
+custom scene properties and a no-op renderer. Rendering does not write files,
+so timings measure the Python side only.
+
+    import fake_bpy
+    bpy = fake_bpy.install()
+"""
+import sys
+import types
+
+
+# -------------------------------------------------------------------
+#   Properties
+# -------------------------------------------------------------------
+
+class _Prop:
+    """Property definition, stores its value per instance"""
+
+    def __init__(self, kind, **options):
+        self.kind = kind
+        self.options = options
+
+    def default(self):
+        if self.kind == 'collection':
+            return Collection(self.options['type'])
+        if self.kind == 'pointer':
+            cls = self.options['type']
+            return cls() if issubclass(cls, PropertyGroup) else None
+        if 'default' in self.options:
+            return self.options['default']
+        if self.kind == 'enum':
+            return self.options['items'][0][0]
+        return {'int': 0, 'bool': False, 'string': '', 'float': 0.0}[self.kind]
+
+    def _values(self, instance):
+        return instance.__dict__.setdefault('_rna', {})
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        if 'get' in self.options:
+            return self.options['get'](instance)
+        values = self._values(instance)
+        if id(self) not in values:
+            values[id(self)] = self.default()
+        return values[id(self)]
+
+    def __set__(self, instance, value):
+        if 'set' in self.options:
+            self.options['set'](instance, value)
+        else:
+            self._values(instance)[id(self)] = value
+
+
+def _prop(kind):
+    def make(**options):
+        return _Prop(kind, **options)
+    return make
+
+
+class Collection:
+    """CollectionProperty value"""
+
+    def __init__(self, type):
+        self.type = type
+        self.items = []
+
+    def add(self):
+        item = self.type()
+        self.items.append(item)
+        return item
+
+    def get(self, name, default=None):
+        for item in self.items:
+            if item.name == name:
+                return item
+        return default
+
+    def remove(self, index):
+        del self.items[index]
+
+    def move(self, src, dst):
+        self.items.insert(dst, self.items.pop(src))
+
+    def clear(self):
+        self.items.clear()
+
+    def __getitem__(self, index):
+        return self.items[index]
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+
+# -------------------------------------------------------------------
+#   Types
+# -------------------------------------------------------------------
+
+class PropertyGroup:
+    def __init__(self):
+        self.name = ''
+        for cls in reversed(type(self).__mro__):
+            for name, prop in getattr(cls, '__annotations__', {}).items():
+                if isinstance(prop, _Prop):
+                    setattr(self, name, prop.default())
+
+
+class Operator:
+    def __init__(self):
+        PropertyGroup.__init__(self)
+        self.reports = []
+
+    def report(self, level, message):
+        self.reports.append((level, message))
+
+
+class Panel:
+    pass
+
+
+class UIList:
+    pass
+
+
+class ID:
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return '<%s %s>' % (type(self).__name__, self.name)
+
+
+class Material(ID):
+    def __init__(self, name):
+        super().__init__(name)
+        self.diffuse_color = (0.8, 0.8, 0.8, 1.0)
+
+
+class Mesh(ID):
+    def __init__(self, name):
+        super().__init__(name)
+        self.materials = []
+
+
+class Object(ID):
+    def __init__(self, name, type='MESH', parent=None):
+        super().__init__(name)
+        self.type = type
+        self.data = Mesh(name) if type == 'MESH' else ID(name)
+        self.children = []
+        self.parent = parent
+        self.hide_render = False
+        self.hide_viewport = False
+        if parent is not None:
+            parent.children.append(self)
+
+    @property
+    def children_recursive(self):
+        result = []
+        for child in self.children:
+            result.append(child)
+            result.extend(child.children_recursive)
+        return result
+
+
+class Collection_(ID):
+    pass
+
+
+class ImageSettings:
+    def __init__(self):
+        self.color_mode = 'RGB'
+        self.file_format = 'PNG'
+        self.color_depth = '8'
+
+
+class RenderSettings:
+    def __init__(self):
+        self.filepath = ''
+        self.file_extension = '.png'
+        self.image_settings = ImageSettings()
+        self.resolution_x = 1920
+        self.resolution_y = 1080
+        self.resolution_percentage = 100
+        self.engine = 'BLENDER_WORKBENCH'
+
+
+class Scene(ID):
+    def __init__(self, name='Scene'):
+        super().__init__(name)
+        self.objects = []
+        self.camera = None
+        self.render = RenderSettings()
+
+
+class Image(ID):
+    def save_render(self, filepath, scene=None):
+        pass
+
+
+class DataCollection:
+    """bpy.data.objects and friends, looked up by name"""
+
+    def __init__(self):
+        self._items = {}
+
+    def new(self, item):
+        self._items[item.name] = item
+        return item
+
+    def remove(self, item):
+        self._items.pop(item.name, None)
+
+    def get(self, name, default=None):
+        return self._items.get(name, default)
+
+    def __getitem__(self, name):
+        return self._items[name]
+
+    def __contains__(self, name):
+        return name in self._items
+
+    def __iter__(self):
+        return iter(list(self._items.values()))
+
+    def __len__(self):
+        return len(self._items)
+
+
+# -------------------------------------------------------------------
+#   Install
+# -------------------------------------------------------------------
+
+def render(**kwargs):
+    """bpy.ops.render.render, counts the calls"""
+    render.count += 1
+    return {'FINISHED'}
+
+
+render.count = 0
+
+
+def install():
+    """Put a fresh fake bpy into sys.modules and return it"""
+    bpy = types.ModuleType('bpy')
+    bpy.props = types.ModuleType('bpy.props')
+    for kind, name in (('int', 'IntProperty'), ('float', 'FloatProperty'), ('bool', 'BoolProperty'),
+                       ('string', 'StringProperty'), ('enum', 'EnumProperty'),
+                       ('collection', 'CollectionProperty'), ('pointer', 'PointerProperty')):
+        setattr(bpy.props, name, _prop(kind))
+
+    bpy.types = types.ModuleType('bpy.types')
+    for cls in (Operator, PropertyGroup, Panel, UIList, Material, Object, Scene, Image, Mesh, ID):
+        setattr(bpy.types, cls.__name__, cls)
+    bpy.types.Collection = Collection_
+    # the add-on sets its scene properties on the class, start from a clean one
+    bpy.types.Scene = type('Scene', (Scene,), {})
+
+    bpy.utils = types.ModuleType('bpy.utils')
+    bpy.utils.register_class = lambda cls: None
+    bpy.utils.unregister_class = lambda cls: None
+
+    bpy.ops = types.SimpleNamespace(
+        render=types.SimpleNamespace(render=render),
+        wm=types.SimpleNamespace(save_as_mainfile=lambda **kwargs: {'FINISHED'}),
+    )
+    bpy.path = types.SimpleNamespace(abspath=lambda path: path)
+    bpy.msgbus = types.SimpleNamespace(subscribe_rna=lambda **kwargs: None, clear_by_owner=lambda owner: None)
+    bpy.app = types.ModuleType('bpy.app')
+    bpy.app.binary_path = 'blender'
+    bpy.app.version = (3, 0, 0)
+    bpy.app.handlers = types.ModuleType('bpy.app.handlers')
+    bpy.app.handlers.persistent = lambda fn: fn
+    for name in ('frame_change_pre', 'frame_change_post', 'render_write', 'load_post',
+                 'depsgraph_update_post', 'undo_post', 'redo_post'):
+        setattr(bpy.app.handlers, name, [])
+
+    bpy.data = types.SimpleNamespace(
+        objects=DataCollection(),
+        materials=DataCollection(),
+        images=DataCollection(),
+        scenes=DataCollection(),
+    )
+    bpy.data.images.new(Image('Render Result'))
+
+    scene = bpy.data.scenes.new(bpy.types.Scene())
+    bpy.context = types.SimpleNamespace(scene=scene, selected_objects=[], object=None)
+
+    sys.modules['bpy'] = bpy
+    for name in ('props', 'types', 'utils', 'app'):
+        sys.modules['bpy.' + name] = getattr(bpy, name)
+    sys.modules['bpy.app.handlers'] = bpy.app.handlers
+    return bpy
+
+
+# -------------------------------------------------------------------
+#   Scene building
+# -------------------------------------------------------------------
+
+def add_object(bpy, name, type='MESH', parent=None):
+    ob = bpy.data.objects.new(Object(name, type, parent))
+    bpy.context.scene.objects.append(ob)
+    return ob
+
+
+def add_material(bpy, name):
+    return bpy.data.materials.new(Material(name))
+
+
+def build_scene(bpy, objects, materials, cameras, children=2, depth=2, extra_objects=0):
+    """Fill the scene with objects (each with a child hierarchy), materials and cameras.
+
+    Objects and materials are added to the add-on's render lists, extra_objects
+    are scene clutter that is not rendered.
+    """
+    scene = bpy.context.scene
+
+    def add_children(parent, level):
+        if level >= depth:
+            return
+        for i in range(children):
+            child = add_object(bpy, '%s.%d' % (parent.name, i), parent=parent)
+            add_children(child, level + 1)
+
+    for i in range(objects):
+        ob = add_object(bpy, 'Object.%04d' % i)
+        add_children(ob, 0)
+        item = scene.render_farm_objects.add()
+        item.name = ob.name
+        item.object = ob
+
+    for i in range(materials):
+        mat = add_material(bpy, 'Material.%04d' % i)
+        item = scene.render_farm_materials.add()
+        item.name = mat.name
+        item.material = mat
+
+    for i in range(cameras):
+        add_object(bpy, 'Camera.%03d' % i, type='CAMERA')
+
+    for i in range(extra_objects):
+        add_object(bpy, 'Clutter.%06d' % i)
+    return scene
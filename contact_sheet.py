@@ -0,0 +1,160 @@
+"""Contact sheets of rendered variations.
+
+A sheet is a grid of tiles, one row per value of the row axes (objects by
+default) and one column per combination of the column axes (material x camera).
+Tiles are kept in one cache file per row band, so adding a render only touches
+its own band, and the sheet PNG is streamed out band by band. Peak memory is one
+band of the sheet, not the whole sheet.
+
+Uses NumPy and zlib only, the PNG writer is shared with encoder.py. Decoding
+rendered images is left to the caller (``load`` returns an (height, width, 4)
+uint8 array, top row first), inside Blender that is done with bpy.
+"""
+import itertools
+import json
+import os
+
+import numpy as np
+
+try:
+    from .encoder import write_png
+except ImportError:
+    from encoder import write_png
+
+SHEET_NAME = "contact_sheet.png"
+CACHE_DIR = ".contact_sheet"
+
+BACKGROUND = (0, 0, 0, 0)
+
+
+# -------------------------------------------------------------------
+#   Tiles
+# -------------------------------------------------------------------
+
+def fit_tile(pixels, width, height):
+    """Scale pixels to fit the tile, keeping the aspect ratio, centred on a clear tile"""
+    tile = np.empty((height, width, 4), dtype=np.uint8)
+    tile[:] = BACKGROUND
+    h, w = pixels.shape[:2]
+    scale = min(width / w, height / h)
+    tw, th = max(1, int(w * scale)), max(1, int(h * scale))
+
+    fy, fx = h // th, w // tw
+    if fy == fx and fy > 1 and h % th == 0 and w % tw == 0:
+        # integer factor, average the pixels of each block
+        scaled = pixels.reshape(th, fy, tw, fx, 4).mean(axis=(1, 3)).astype(np.uint8)
+    else:
+        ys = np.arange(th) * h // th
+        xs = np.arange(tw) * w // tw
+        scaled = pixels[ys][:, xs]
+
+    y, x = (height - th) // 2, (width - tw) // 2
+    tile[y:y + th, x:x + tw] = scaled
+    return tile
+
+
+# -------------------------------------------------------------------
+#   Sheet
+# -------------------------------------------------------------------
+
+class ContactSheet:
+    """Grid of tiles for a set of jobs, rows and columns chosen by axis"""
+
+    def __init__(self, directory, jobs, rows=('object',), columns=('material', 'camera'),
+                 tile_width=256, tile_height=256):
+        self.directory = directory
+        self.path = os.path.join(directory, SHEET_NAME)
+        self.cache = os.path.join(directory, CACHE_DIR)
+        self.rows_axes = tuple(rows)
+        self.columns_axes = tuple(columns)
+        self.tile_width = tile_width
+        self.tile_height = tile_height
+
+        self.rows = []
+        self.columns = []
+        for job in jobs:
+            row, column = self.cell(job)
+            if row not in self.rows:
+                self.rows.append(row)
+            if column not in self.columns:
+                self.columns.append(column)
+        self._row_index = {row: i for i, row in enumerate(self.rows)}
+        self._column_index = {column: i for i, column in enumerate(self.columns)}
+        self._open_cache()
+
+    @property
+    def width(self):
+        return self.tile_width * len(self.columns)
+
+    @property
+    def height(self):
+        return self.tile_height * len(self.rows)
+
+    def cell(self, job):
+        return (tuple(job[a] for a in self.rows_axes),
+                tuple(job[a] for a in self.columns_axes))
+
+    def _layout(self):
+        return {
+            'rows': [list(r) for r in self.rows],
+            'columns': [list(c) for c in self.columns],
+            'tile': [self.tile_width, self.tile_height],
+        }
+
+    def _open_cache(self):
+        """Keep the cached bands if they were made for the same layout"""
+        os.makedirs(self.cache, exist_ok=True)
+        layout_path = os.path.join(self.cache, 'layout.json')
+        layout = self._layout()
+        try:
+            with open(layout_path, 'r', encoding='utf-8') as f:
+                if json.load(f) == layout:
+                    return
+        except (OSError, ValueError):
+            pass
+        for name in os.listdir(self.cache):
+            os.remove(os.path.join(self.cache, name))
+        with open(layout_path, 'w', encoding='utf-8') as f:
+            json.dump(layout, f)
+
+    def _band_path(self, index):
+        return os.path.join(self.cache, 'band_%05d.npy' % index)
+
+    def _band(self, index, mmap_mode=None):
+        path = self._band_path(index)
+        if os.path.exists(path):
+            return np.load(path, mmap_mode=mmap_mode)
+        band = np.empty((self.tile_height, self.width, 4), dtype=np.uint8)
+        band[:] = BACKGROUND
+        return band
+
+    def add(self, job, pixels):
+        """Paste the render of a job into its band"""
+        row, column = self.cell(job)
+        r, c = self._row_index[row], self._column_index[column]
+        band = self._band(r)
+        x = c * self.tile_width
+        band[:, x:x + self.tile_width] = fit_tile(pixels, self.tile_width, self.tile_height)
+        np.save(self._band_path(r), band)
+
+    def add_many(self, jobs, load):
+        """Paste every job whose output exists, loading one band and one image at a time"""
+        jobs = sorted((j for j in jobs if os.path.exists(j['output'])),
+                      key=lambda j: self._row_index[self.cell(j)[0]])
+        count = 0
+        for r, band_jobs in itertools.groupby(jobs, key=lambda j: self._row_index[self.cell(j)[0]]):
+            band = self._band(r)
+            for job in band_jobs:
+                x = self._column_index[self.cell(job)[1]] * self.tile_width
+                band[:, x:x + self.tile_width] = fit_tile(load(job['output']), self.tile_width, self.tile_height)
+                count += 1
+            np.save(self._band_path(r), band)
+        return count
+
+    def write(self):
+        """Stream the sheet to SHEET_NAME, one band in memory at a time"""
+        if not self.rows:
+            return None
+        bands = (self._band(r, mmap_mode='r') for r in range(len(self.rows)))
+        write_png(self.path, self.width, self.height, bands)
+        return self.path
@@ -0,0 +1,365 @@
+"""Render coordinator handing out leased jobs to workers on any number of nodes.
+
+Run it on any machine the render nodes can reach:
+
+    python coordinator.py --output /renders --port 8765 --token SECRET
+
+Jobs are submitted from the Render Options panel (Submit to Farm), workers on
+the nodes are started with
+
+    blender -b scene.blend --python worker.py -- --coordinator http://host:8765 --token SECRET
+
+Every request carries the shared token, the RENDER_FARM_TOKEN environment
+variable when it is not given, the coordinator makes one up and prints it when
+neither is set.
+
+A worker leases one job at a time and renews the lease while rendering. When a
+lease expires the job is queued again for another worker. Finished images are
+uploaded to the coordinator and written to its output folder, finished jobs are
+recorded in the journal there.
+"""
+import argparse
+import collections
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    from . import journal
+except ImportError:
+    import journal
+
+TOKEN_ENV = "RENDER_FARM_TOKEN"
+# files of the add-on itself in the output folder all start with it
+RESERVED_PREFIX = "render_farm_"
+IMAGE_EXTENSIONS = {'.bmp', '.cin', '.dpx', '.exr', '.hdr', '.j2c', '.jp2', '.jpeg', '.jpg', '.png', '.rgb',
+                    '.sgi', '.tga', '.tif', '.tiff', '.webp'}
+
+
+def output_name(job):
+    """File name of a job's output in the output folder, ValueError for anything but a plain image name"""
+    if not isinstance(job, dict) or not isinstance(job.get('output'), str):
+        raise ValueError("Job without output")
+    name = os.path.basename(job['output'].replace('\\', '/'))
+    if name.startswith('.') or name.startswith(RESERVED_PREFIX):
+        raise ValueError("Reserved output name : %s" % name)
+    if os.path.splitext(name)[1].lower() not in IMAGE_EXTENSIONS:
+        raise ValueError("Output is not an image : %s" % name)
+    return name
+
+
+class Lease:
+
+    def __init__(self, job, worker, duration):
+        self.id = secrets.token_hex(8)
+        self.job = job
+        self.worker = worker
+        self.duration = duration
+        self.expires = time.time() + duration
+
+    def renew(self):
+        self.expires = time.time() + self.duration
+
+
+class Coordinator:
+    """Job queue with leases, thread safe"""
+
+    def __init__(self, output_dir, lease_time=300.0, max_attempts=3):
+        self.output_dir = output_dir
+        self.lease_time = lease_time
+        self.max_attempts = max_attempts
+        self.journal = journal.Journal(output_dir)
+        self.pending = collections.deque()
+        self.leases = {}
+        self.attempts = collections.Counter()
+        self.done = 0
+        self.failed = []
+        self.lock = threading.Lock()
+
+    def submit(self, jobs, resume=True):
+        """Queue jobs, their output is moved into the output folder, ValueError when one is not an image"""
+        jobs = [dict(job, output=os.path.join(self.output_dir, output_name(job))) for job in jobs]
+        if resume:
+            jobs = self.journal.pending(jobs)
+        with self.lock:
+            self.pending.extend(jobs)
+        return len(jobs)
+
+    def _expire(self):
+        now = time.time()
+        for lease in [lease for lease in self.leases.values() if lease.expires < now]:
+            del self.leases[lease.id]
+            self.pending.appendleft(lease.job)
+
+    def lease(self, worker):
+        with self.lock:
+            self._expire()
+            if not self.pending:
+                return None
+            lease = Lease(self.pending.popleft(), worker, self.lease_time)
+            self.leases[lease.id] = lease
+            return lease
+
+    def renew(self, lease_id):
+        with self.lock:
+            lease = self.leases.get(lease_id)
+            if lease is None:
+                return False
+            lease.renew()
+            return True
+
+    def complete(self, lease_id, data, elapsed):
+        with self.lock:
+            lease = self.leases.pop(lease_id, None)
+        if lease is None:
+            # expired and handed to someone else
+            return False
+        output = lease.job['output']
+        tmp = output + '.part'
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, output)
+        except OSError:
+            # disk full or output folder gone, queue the job again for when it is fixed
+            with self.lock:
+                self.pending.appendleft(lease.job)
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        with self.lock:
+            self.journal.append(lease.job, elapsed)
+            self.done += 1
+        return True
+
+    def fail(self, lease_id, message):
+        with self.lock:
+            lease = self.leases.pop(lease_id, None)
+            if lease is None:
+                return False
+            key = journal.job_key(lease.job)
+            self.attempts[key] += 1
+            if self.attempts[key] < self.max_attempts:
+                self.pending.append(lease.job)
+            else:
+                self.failed.append(dict(lease.job, message=message))
+            return True
+
+    def status(self):
+        with self.lock:
+            self._expire()
+            return {
+                'pending': len(self.pending),
+                'leased': len(self.leases),
+                'done': self.done,
+                'failed': len(self.failed),
+            }
+
+
+# -------------------------------------------------------------------
+#   Server
+# -------------------------------------------------------------------
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    POST /jobs            {"jobs": [...], "resume": true}   -> {"queued": n}
+    POST /lease           {"worker": name}                  -> {"lease": id, "job": {...}} or 204
+    POST /renew           {"lease": id}                     -> 200 or 409
+    POST /fail            {"lease": id, "message": text}    -> 200 or 409
+    PUT  /results/<lease> image bytes, X-Elapsed header     -> 200 or 409
+    GET  /status                                            -> counts
+
+    Requests without the coordinator's token are answered 401, malformed ones
+    400 with {"error": message}.
+    """
+
+    coordinator = None
+    token = None
+
+    def reply(self, code, body=None):
+        data = json.dumps(body).encode('utf-8') if body is not None else b''
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_body(self):
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def authorized(self):
+        sent = self.headers.get('Authorization', '')
+        if hmac.compare_digest(sent.encode('utf-8'), ('Bearer %s' % self.token).encode('utf-8')):
+            return True
+        self.reply(401, {'error': 'Bad or missing token'})
+        return False
+
+    def do_GET(self):
+        if not self.authorized():
+            return
+        if self.path == '/status':
+            self.reply(200, self.coordinator.status())
+        else:
+            self.reply(404)
+
+    def do_POST(self):
+        if not self.authorized():
+            return
+        try:
+            body = json.loads(self.read_body() or b'{}')
+            if not isinstance(body, dict):
+                raise ValueError("Body must be an object")
+            self.post(body)
+        except KeyError as e:
+            self.reply(400, {'error': 'Missing %s' % e})
+        except (TypeError, ValueError) as e:
+            self.reply(400, {'error': str(e)})
+
+    def post(self, body):
+        if self.path == '/jobs':
+            if not isinstance(body['jobs'], list):
+                raise ValueError("jobs must be a list")
+            queued = self.coordinator.submit(body['jobs'], body.get('resume', True))
+            self.reply(200, {'queued': queued})
+        elif self.path == '/lease':
+            lease = self.coordinator.lease(body.get('worker', self.client_address[0]))
+            if lease is None:
+                self.reply(204)
+            else:
+                self.reply(200, {'lease': lease.id, 'job': lease.job, 'duration': lease.duration})
+        elif self.path == '/renew':
+            self.reply(200 if self.coordinator.renew(body['lease']) else 409)
+        elif self.path == '/fail':
+            self.reply(200 if self.coordinator.fail(body['lease'], body.get('message', '')) else 409)
+        else:
+            self.reply(404)
+
+    def do_PUT(self):
+        if not self.authorized():
+            return
+        if not self.path.startswith('/results/'):
+            return self.reply(404)
+        lease_id = self.path[len('/results/'):]
+        try:
+            elapsed = float(self.headers.get('X-Elapsed', 0))
+        except ValueError:
+            return self.reply(400, {'error': 'Bad X-Elapsed'})
+        try:
+            ok = self.coordinator.complete(lease_id, self.read_body(), elapsed)
+        except OSError as e:
+            return self.reply(500, {'error': 'Cannot write the result : %s' % e})
+        self.reply(200 if ok else 409)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(coordinator, token, host='127.0.0.1', port=8765):
+    handler = type('CoordinatorHandler', (Handler,), {'coordinator': coordinator, 'token': token})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+# -------------------------------------------------------------------
+#   Client
+# -------------------------------------------------------------------
+
+class Client:
+    """Talks to a coordinator, used by the panel and by the workers.
+
+    A coordinator that cannot be reached is tried again up to retries times,
+    waiting twice as long each time up to a minute, then the OSError is raised.
+    """
+
+    def __init__(self, url, token=None, timeout=30.0, retries=0):
+        self.url = url.rstrip('/')
+        self.token = token or os.environ.get(TOKEN_ENV, '')
+        self.timeout = timeout
+        self.retries = retries
+
+    def request(self, method, path, body=None, data=None, headers=None):
+        if body is not None:
+            data = json.dumps(body).encode('utf-8')
+        headers = dict(headers or {}, Authorization='Bearer %s' % self.token)
+        for attempt in range(self.retries + 1):
+            request = urllib.request.Request(self.url + path, data=data, method=method, headers=headers)
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    content = response.read()
+                    return response.status, json.loads(content) if content else None
+            except urllib.error.HTTPError as e:
+                if e.code == 401:
+                    raise PermissionError("Coordinator refused the token : %s" % self.url)
+                try:
+                    return e.code, json.loads(e.read())
+                except ValueError:
+                    return e.code, None
+            except OSError as e:
+                if attempt == self.retries:
+                    raise
+                delay = min(60.0, 2.0 ** attempt)
+                print('Coordinator unreachable (%s), retrying in %d s' % (e, delay))
+                time.sleep(delay)
+
+    def submit(self, jobs, resume=True):
+        status, body = self.request('POST', '/jobs', {'jobs': jobs, 'resume': resume})
+        if status != 200:
+            raise ValueError((body or {}).get('error', 'HTTP %d' % status))
+        return body['queued']
+
+    def lease(self, worker):
+        """Returns (lease id, job) or None when there is nothing to do"""
+        status, body = self.request('POST', '/lease', {'worker': worker})
+        if status != 200:
+            return None
+        return body['lease'], body['job']
+
+    def renew(self, lease_id):
+        return self.request('POST', '/renew', {'lease': lease_id})[0] == 200
+
+    def fail(self, lease_id, message):
+        return self.request('POST', '/fail', {'lease': lease_id, 'message': message})[0] == 200
+
+    def complete(self, lease_id, filepath, elapsed):
+        with open(filepath, 'rb') as f:
+            data = f.read()
+        return self.request('PUT', '/results/' + lease_id, data=data,
+                            headers={'X-Elapsed': '%f' % elapsed})[0] == 200
+
+    def status(self):
+        return self.request('GET', '/status')[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render farm coordinator")
+    parser.add_argument('--output', required=True, help="Folder the rendered images are collected in")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--lease', type=float, default=300.0, help="Seconds before an unrenewed job is queued again")
+    parser.add_argument('--token', default=os.environ.get(TOKEN_ENV),
+                        help="Shared token the panel and the workers send, default $%s" % TOKEN_ENV)
+    args = parser.parse_args()
+
+    token = args.token or secrets.token_hex(16)
+    os.makedirs(args.output, exist_ok=True)
+    server = make_server(Coordinator(args.output, args.lease), token, args.host, args.port)
+    print('Coordinator : http://%s:%d ==> %s' % (args.host, args.port, args.output))
+    if not args.token:
+        print('Token : %s' % token)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
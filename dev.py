@@ -1,6 +1,8 @@
 import argparse
 import os
 import shutil
+import subprocess
+import sys
 from pathlib import Path
 
 import logging
@@ -23,6 +25,7 @@ def do_build(install_at=None, include_tests=False):
     '.gitignore',
     'dev.py',
     'README.md',
+    'pytest.ini',
     # 'CONTRIBUTING.md',
     # 'setup.cfg'
   ]
@@ -49,28 +52,43 @@ def do_build(install_at=None, include_tests=False):
     shutil.rmtree(f'{install_at}/blender-render-farm', ignore_errors=True)
     shutil.copytree(target_dir, f'{install_at}/blender-render-farm', copy_function=copy2_verbose)
 
+def run_bench(update=None):
+  """Run the headless overhead benchmarks in ./bench against bench/baseline.json"""
+  command = [sys.executable, 'bench/bench.py']
+  if update:
+    command += ['--update'] + update
+  return subprocess.call(command)
+
+def run_tests():
+  """Run the unit tests in ./tests, they do not need Blender"""
+  return subprocess.call([sys.executable, '-m', 'unittest', 'discover', '-s', 'tests'])
+
 ### COMMAND LINE INTERFACE
 
 parser = argparse.ArgumentParser()
 parser.add_argument(
   "command",
   default='build',
-  choices=['build', 'bundle', 'test'],
+  choices=['build', 'bundle', 'test', 'bench'],
   help=
   """
   BUILD = copy relevant files into ./out/blenderkit.
   BUNDLE = bundle dependencies into ./dependencies
   TEST = build with test files and run tests
+  BENCH = run overhead benchmarks without Blender, fails on regressions
   """
   )
 parser.add_argument('--install-at', type=str, default=None, help='If path is specified, then builded addon will be copied to that location.')
+parser.add_argument('--update-baseline', nargs='+', metavar='NAME', default=None, help='BENCH only, record these entries (name@scale, name or all) in the baseline.')
 args = parser.parse_args()
 
 if args.command == "build":
   do_build(args.install_at)
-# elif args.command == "test":
-#   do_build(args.install_at, include_tests=True)
-#   run_tests()
+elif args.command == "bench":
+  sys.exit(run_bench(args.update_baseline))
+elif args.command == "test":
+  do_build(args.install_at, include_tests=True)
+  sys.exit(run_tests())
 # elif args.command == "bundle":
 #   bundle_dependencies()
 else:
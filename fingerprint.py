@@ -0,0 +1,196 @@
+"""Fingerprints of what goes into a render.
+
+A job's fingerprint hashes everything that can change its image: the material
+(settings, node tree, node groups and the images they use), the object (mesh,
+UVs, modifiers, transform, and the same for its children, which are shown
+with it), the camera (transform and lens) and the render settings. Stored in
+the journal next to each finished job, it tells which outputs are stale after
+an edit, so only those are rendered again.
+
+Data is read generically through RNA: every plain property of a datablock or
+node is hashed, and of the settings structs it owns (a camera's depth of
+field, Cycles settings, ...) down to a few levels, except the ones that only
+affect the interface or that the add-on itself changes between renders
+(visibility, material slots). Each material, object and camera is hashed once
+per run.
+
+NumPy hashes mesh arrays.
+"""
+import hashlib
+import os
+
+import numpy as np
+
+# properties which do not change the rendered image, of any struct
+SKIP = frozenset((
+    'rna_type', 'name', 'name_full', 'session_uid', 'is_evaluated', 'original', 'users',
+    'use_fake_user', 'use_extra_user', 'is_embedded_data', 'is_library_indirect', 'tag',
+    'is_runtime_data', 'is_missing', 'preview', 'library_weak_reference', 'asset_data',
+    'dimensions', 'show_viewport', 'show_in_editmode', 'show_on_cage', 'is_active',
+    'is_override_data', 'bl_description', 'bl_icon', 'bl_label',
+    'bl_idname', 'bl_static_type', 'bl_width_default', 'bl_width_min', 'bl_width_max',
+    'bl_height_default', 'bl_height_min', 'bl_height_max', 'type_info',
+    'total_vert_sel', 'total_edge_sel', 'total_face_sel', 'is_editmode',
+    # changed by the add-on between renders
+    'hide_render', 'hide_viewport', 'hide_select', 'active_material', 'active_material_index',
+))
+# and of nodes, where these only place and draw the node in the editor, a modifier's
+# width or an object's color do change the image
+NODE_SKIP = SKIP | frozenset((
+    'location', 'width', 'width_hidden', 'height', 'select', 'hide', 'label', 'color',
+    'use_custom_color', 'internal_links', 'show_options', 'show_preview', 'show_texture',
+    'show_expanded',
+))
+SIMPLE = frozenset(('BOOLEAN', 'INT', 'FLOAT', 'STRING', 'ENUM'))
+# datablocks followed through pointers, others are only named
+FOLLOW = frozenset(('Image', 'ShaderNodeTree', 'GeometryNodeTree', 'NodeTree', 'Texture'))
+# levels of nested settings structs hashed below a datablock or node
+MAX_DEPTH = 3
+
+
+def _value(value):
+    if isinstance(value, (set, frozenset)):
+        return repr(sorted(value))
+    if hasattr(value, '__len__') and not isinstance(value, str):
+        try:
+            return repr([_value(v) for v in value])
+        except TypeError:
+            pass
+    return repr(value)
+
+
+class Fingerprinter:
+    """Hash datablocks, each once. ``abspath`` resolves Blender relative paths."""
+
+    def __init__(self, abspath=os.path.abspath):
+        self.abspath = abspath
+        self.cache = {}
+
+    def _cached(self, kind, data, digest):
+        key = (kind, type(data).__name__, data.name)
+        if key not in self.cache:
+            h = hashlib.sha1(kind.encode('utf-8'))
+            # marks the datablock while it is being hashed, node groups can nest
+            self.cache[key] = 'cycle'
+            digest(h, data)
+            self.cache[key] = h.hexdigest()
+        return self.cache[key]
+
+    # ---------------------------------------------------------------
+    #   Generic
+
+    def rna(self, h, struct, depth=0, skip=SKIP):
+        for prop in struct.bl_rna.properties:
+            ident = prop.identifier
+            if ident in skip:
+                continue
+            if prop.type in SIMPLE:
+                h.update(('%s=%s;' % (ident, _value(getattr(struct, ident, None)))).encode('utf-8'))
+            elif prop.type == 'POINTER':
+                value = getattr(struct, ident, None)
+                if value is None:
+                    continue
+                kind = type(value).__name__
+                if kind in FOLLOW or kind.endswith('NodeTree'):
+                    h.update(('%s->%s;' % (ident, self.datablock(value))).encode('utf-8'))
+                elif hasattr(value, 'name_full'):
+                    h.update(('%s->%s;' % (ident, value.name_full)).encode('utf-8'))
+                elif depth < MAX_DEPTH and hasattr(value, 'bl_rna'):
+                    h.update(('%s{' % ident).encode('utf-8'))
+                    self.rna(h, value, depth + 1)
+                    h.update(b'};')
+
+    def datablock(self, data):
+        if hasattr(data, 'nodes') and hasattr(data, 'links'):
+            return self.node_tree(data)
+        if hasattr(data, 'packed_file') and hasattr(data, 'filepath_raw'):
+            return self.image(data)
+        return self._cached(type(data).__name__, data, self.rna)
+
+    # ---------------------------------------------------------------
+    #   Materials
+
+    def node_tree(self, tree):
+        def digest(h, tree):
+            self.rna(h, tree)
+            for node in sorted(tree.nodes, key=lambda n: n.name):
+                h.update(('node %s %s;' % (node.name, node.bl_idname)).encode('utf-8'))
+                self.rna(h, node, skip=NODE_SKIP)
+                for socket in node.inputs:
+                    if not socket.is_linked and hasattr(socket, 'default_value'):
+                        h.update(('%s=%s;' % (socket.identifier, _value(socket.default_value))).encode('utf-8'))
+            links = sorted((link.from_node.name, link.from_socket.identifier,
+                            link.to_node.name, link.to_socket.identifier, link.is_muted)
+                           for link in tree.links)
+            h.update(repr(links).encode('utf-8'))
+        return self._cached('node_tree', tree, digest)
+
+    def image(self, image):
+        def digest(h, image):
+            self.rna(h, image)
+            h.update(image.colorspace_settings.name.encode('utf-8'))
+            if image.packed_file is not None:
+                h.update(hashlib.sha1(bytes(image.packed_file.data)).digest())
+            else:
+                try:
+                    stat = os.stat(self.abspath(image.filepath_raw))
+                    h.update(('%d %d' % (stat.st_size, stat.st_mtime_ns)).encode('utf-8'))
+                except OSError:
+                    h.update(b'missing')
+        return self._cached('image', image, digest)
+
+    def material(self, mat):
+        def digest(h, mat):
+            self.rna(h, mat)
+            if mat.use_nodes and mat.node_tree is not None:
+                h.update(self.node_tree(mat.node_tree).encode('utf-8'))
+        return self._cached('material', mat, digest)
+
+    # ---------------------------------------------------------------
+    #   Objects
+
+    def mesh(self, h, mesh):
+        self.rna(h, mesh)
+        for collection, attr, width, dtype in ((mesh.vertices, 'co', 3, np.float32),
+                                               (mesh.loops, 'vertex_index', 1, np.int32),
+                                               (mesh.polygons, 'loop_total', 1, np.int32),
+                                               (mesh.polygons, 'material_index', 1, np.int32),
+                                               (mesh.polygons, 'use_smooth', 1, np.bool_)):
+            array = np.empty(len(collection) * width, dtype=dtype)
+            collection.foreach_get(attr, array)
+            h.update(array.tobytes())
+        for layer in mesh.uv_layers:
+            array = np.empty(len(layer.data) * 2, dtype=np.float32)
+            layer.data.foreach_get('uv', array)
+            h.update(array.tobytes())
+
+    def object(self, obj):
+        def digest(h, obj):
+            self.rna(h, obj)
+            h.update(_value(obj.matrix_world).encode('utf-8'))
+            if obj.data is not None:
+                if obj.type == 'MESH':
+                    self.mesh(h, obj.data)
+                else:
+                    self.rna(h, obj.data)
+            for modifier in obj.modifiers:
+                self.rna(h, modifier)
+            for child in sorted(obj.children, key=lambda c: c.name):
+                h.update(self.object(child).encode('utf-8'))
+        return self._cached('object', obj, digest)
+
+    def camera(self, cam):
+        def digest(h, cam):
+            h.update(_value(cam.matrix_world).encode('utf-8'))
+            self.rna(h, cam.data)
+        return self._cached('camera', cam, digest)
+
+    # ---------------------------------------------------------------
+    #   Jobs
+
+    def job(self, obj, mat, cam, settings):
+        """Fingerprint of one variation, settings is the digest of the render settings"""
+        h = hashlib.sha1()
+        for part in (self.object(obj), self.material(mat), self.camera(cam), settings):
+            h.update(part.encode('utf-8'))
+        return h.hexdigest()[:16]
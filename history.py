@@ -0,0 +1,111 @@
+"""Render cost history and estimates.
+
+Every render recorded in the metrics log carries a fingerprint of the render
+settings it was made with (engine, resolution, samples, file format). The
+records of the current settings are fitted with an additive model per axis,
+
+    seconds = base + object effect + material effect + camera effect
+
+(the same for bytes on disk), so a glass material or a heavy object costs the
+same extra wherever it appears, and a variation never rendered before is
+predicted from the effects of its object, material and camera. The estimate
+gives the total and the wall time of a run before it starts, and the predicted
+seconds order pool jobs longest first, so the run does not end on a few slow
+variations queued last.
+"""
+import collections
+import hashlib
+import heapq
+import json
+
+AXES = ('object', 'material', 'camera')
+
+# estimate lines shown in the panel, set by the estimate operator
+current = None
+
+
+def fingerprint(settings):
+    """Short stable id of a dict of render settings"""
+    data = json.dumps(settings, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha1(data).hexdigest()[:12]
+
+
+def matching(records, key):
+    """Records made with the settings fingerprint key, other settings do not predict these"""
+    return [r for r in records if r.get('settings') == key]
+
+
+# -------------------------------------------------------------------
+#   Model
+# -------------------------------------------------------------------
+
+class AdditiveModel:
+    """value = base + sum of one effect per axis value, fitted by backfitting"""
+
+    def __init__(self, base=0.0, effects=None, count=0):
+        self.base = base
+        self.effects = effects or {axis: {} for axis in AXES}
+        self.count = count
+
+    @classmethod
+    def fit(cls, records, value, iterations=10):
+        rows = [(tuple(r[a] for a in AXES), r[value]) for r in records if r.get(value) is not None]
+        if not rows:
+            return cls()
+        model = cls(sum(v for _, v in rows) / len(rows), count=len(rows))
+        for _ in range(iterations):
+            for i, axis in enumerate(AXES):
+                sums = collections.defaultdict(float)
+                counts = collections.Counter()
+                for key, v in rows:
+                    others = sum(model.effects[a].get(key[j], 0.0) for j, a in enumerate(AXES) if j != i)
+                    sums[key[i]] += v - model.base - others
+                    counts[key[i]] += 1
+                model.effects[axis] = {k: sums[k] / counts[k] for k in sums}
+        return model
+
+    def predict(self, job):
+        value = self.base + sum(self.effects[a].get(job[a], 0.0) for a in AXES)
+        return max(0.0, value)
+
+    def __bool__(self):
+        return self.count > 0
+
+
+def fit(records):
+    """(seconds model, bytes model) of history records"""
+    return AdditiveModel.fit(records, 'total'), AdditiveModel.fit(records, 'size')
+
+
+# -------------------------------------------------------------------
+#   Scheduling
+# -------------------------------------------------------------------
+
+def longest_first(jobs, model):
+    """Jobs ordered by predicted time, longest first, plan order among equals"""
+    return sorted(jobs, key=lambda job: -model.predict(job))
+
+
+def makespan(durations, workers):
+    """Wall time of durations handed in order to the first free of workers"""
+    free = [0.0] * max(1, workers)
+    for duration in durations:
+        heapq.heappush(free, heapq.heappop(free) + duration)
+    return max(free)
+
+
+def estimate(jobs, records, workers=1, longest=True):
+    """Predicted cost of rendering jobs, None without history"""
+    times, sizes = fit(records)
+    if not times:
+        return None
+    if workers > 1 and longest:
+        jobs = longest_first(jobs, times)
+    durations = [times.predict(job) for job in jobs]
+    return {
+        'jobs': len(jobs),
+        'seconds': sum(durations),
+        'wall': makespan(durations, workers),
+        'bytes': sum(sizes.predict(job) for job in jobs) if sizes else None,
+        'records': times.count,
+    }
@@ -0,0 +1,76 @@
+"""Variant manifests: the objects, materials and cameras of a catalogue in one file.
+
+CSV, one row per entry, any column may be left empty:
+
+    object,material,camera
+    Coin_2022,Gold,Front
+    Coin_2023,Silver,Back
+
+JSON, either the same rows or one list per axis:
+
+    {"objects": ["Coin_2022"], "materials": ["Gold", "Silver"], "cameras": ["Front"]}
+
+Names are kept in file order without duplicates.
+"""
+import csv
+import json
+import os
+
+AXES = ('object', 'material', 'camera')
+
+
+class Manifest:
+
+    def __init__(self):
+        self.objects = []
+        self.materials = []
+        self.cameras = []
+        self._seen = {axis: set() for axis in AXES}
+
+    def values(self, axis):
+        return getattr(self, axis + 's')
+
+    def add(self, axis, name):
+        name = (name or '').strip()
+        if name and name not in self._seen[axis]:
+            self._seen[axis].add(name)
+            self.values(axis).append(name)
+
+    def add_row(self, row):
+        for axis in AXES:
+            self.add(axis, row.get(axis))
+
+    def __len__(self):
+        return len(self.objects) + len(self.materials) + len(self.cameras)
+
+
+def load(path):
+    manifest = Manifest()
+    if os.path.splitext(path)[1].lower() == '.json':
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            for axis in AXES:
+                for name in data.get(axis + 's', ()):
+                    manifest.add(axis, name)
+        else:
+            for row in data:
+                manifest.add_row(row)
+    else:
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            for row in csv.DictReader(f):
+                manifest.add_row({k.strip().lower(): v for k, v in row.items() if k})
+    return manifest
+
+
+def resolve(names, index):
+    """Split names into the items found in index (name -> item) and the names missing"""
+    found = []
+    missing = []
+    for name in names:
+        item = index.get(name)
+        if item is None:
+            missing.append(name)
+        else:
+            found.append(item)
+    return found, missing
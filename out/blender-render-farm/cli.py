@@ -0,0 +1,192 @@
+"""Headless render runs driven by a job spec file.
+
+    blender -b scene.blend --python render_farm/cli.py -- --spec job.json
+    blender -b scene.blend --python render_farm/cli.py -- --spec job.json --shard 2/4
+
+A sharded run writes its own manifest, merge them with shards.py.
+Renders what the spec (see spec.py) asks for without any UI, streams one line
+per finished render to stdout and exits with:
+
+    0   every job rendered
+    1   some jobs failed or were not rendered, run again with resume to finish,
+        or the run stopped on an error
+    2   bad arguments or spec
+    3   objects, materials or cameras of the spec not found in the .blend file
+    130 interrupted
+"""
+import argparse
+import importlib
+import os
+import sys
+import time
+import traceback
+
+import bpy
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_MISSING = 3
+EXIT_INTERRUPTED = 130
+
+
+def parse_args():
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    parser = argparse.ArgumentParser(prog='cli.py', description="Render variations from a job spec")
+    parser.add_argument('--spec', required=True, help="Job spec file")
+    parser.add_argument('--shard', help="Render the i-th of N parts of the plan, e.g. 1/4, overrides the spec")
+    parser.add_argument('--dry-run', action='store_true', help="Print the jobs and exit")
+    return parser.parse_args(argv)
+
+
+def import_addon():
+    addon_dir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, os.path.dirname(addon_dir))
+    return importlib.import_module(os.path.basename(addon_dir))
+
+
+class Reporter:
+    """Stands in for the operator, prints its reports"""
+
+    def report(self, level, message):
+        kind = next(iter(level))
+        out = sys.stderr if kind in ('WARNING', 'ERROR') else sys.stdout
+        print('%s: %s' % (kind.title(), message), file=out, flush=True)
+
+
+def set_properties(target, values, section):
+    for key, value in values.items():
+        if not hasattr(target, key):
+            raise ValueError("Unknown %s property : %s" % (section, key))
+        try:
+            setattr(target, key, value)
+        except (TypeError, ValueError) as e:
+            raise ValueError("Bad %s.%s : %s" % (section, key, e))
+
+
+def apply_spec(farm, scene, spec):
+    """Set up the scene from the spec, returns the camera names to render and the names not found"""
+    names = farm.manifest.Manifest()
+    if spec['manifest']:
+        names = farm.manifest.load(spec['manifest'])
+    for axis in farm.manifest.AXES:
+        for name in spec[axis + 's'] or ():
+            names.add(axis, name)
+
+    objects, missing_objects = farm.manifest.resolve(names.objects, {ob.name: ob for ob in bpy.data.objects})
+    materials, missing_materials = farm.manifest.resolve(names.materials, {m.name: m for m in bpy.data.materials})
+    cameras, missing_cameras = farm.manifest.resolve(names.cameras, {c.name: c for c in farm.get_cameras(scene)})
+    missing = {'object': missing_objects, 'material': missing_materials, 'camera': missing_cameras}
+
+    if names.objects:
+        scene.render_farm_objects.clear()
+        farm.add_objects(scene, objects)
+    if names.materials:
+        scene.render_farm_materials.clear()
+        farm.add_materials(scene, materials)
+
+    scene.render_farm_savePath.path = spec['output']
+    set_properties(scene.render_farm_settings, spec['settings'], 'settings')
+    set_properties(scene.render, spec['render'], 'render')
+    if spec['cycles']:
+        set_properties(scene.cycles, spec['cycles'], 'cycles')
+    return [cam.name for cam in cameras], missing
+
+
+def main():
+    args = parse_args()
+    reporter = Reporter()
+    try:
+        return render(import_addon(), args, reporter)
+    except KeyboardInterrupt:
+        return EXIT_INTERRUPTED
+    except Exception:
+        # Blender exits with 0 on an uncaught exception
+        traceback.print_exc()
+        return EXIT_FAILED
+
+
+def render(farm, args, reporter):
+    scene = bpy.context.scene
+
+    try:
+        spec = farm.spec.load(args.spec)
+        if args.shard:
+            spec['shard'] = farm.spec.parse_shard(args.shard)
+        cameras, missing = apply_spec(farm, scene, spec)
+    except ValueError as e:
+        reporter.report({'ERROR'}, str(e))
+        return EXIT_USAGE
+
+    if any(missing.values()):
+        for axis, names in missing.items():
+            if names:
+                reporter.report({'ERROR'}, 'Not found, %s : %s' % (axis, ', '.join(names)))
+        return EXIT_MISSING
+
+    path = bpy.path.abspath(scene.render_farm_savePath.path)
+    try:
+        jobs = farm.get_jobs(scene, path)
+    except farm.rules.RulesError as e:
+        reporter.report({'ERROR'}, str(e))
+        return EXIT_USAGE
+    if cameras:
+        jobs = [job for job in jobs if job['camera'] in cameras]
+    if spec['shard']:
+        os.makedirs(path, exist_ok=True)
+        costs = farm.get_costs(scene, path)
+        jobs = farm.shards.select(path, jobs, *spec['shard'], cost=costs.predict if costs else None)
+        reporter.report({'INFO'}, 'Shard %d/%d : %d jobs' % (spec['shard'][0] + 1, spec['shard'][1], len(jobs)))
+
+    if args.dry_run:
+        for job in jobs:
+            print(job['output'])
+        return EXIT_OK
+
+    settings = scene.render_farm_settings
+    run = farm.RenderRun(reporter, scene, local=settings.workers == 1, jobs=jobs)
+    state = farm.progress.Progress(len(run.jobs))
+
+    def on_finished(job, elapsed):
+        state.record(elapsed)
+        print('[%d/%d] %s %.2fs, ETA %s' % (state.done, state.total, job['output'], elapsed,
+                                           farm.progress.format_duration(state.eta)), flush=True)
+    run.on_finished = on_finished
+
+    start = time.time()
+    status = EXIT_OK
+    try:
+        if settings.workers > 1:
+            farm.render_pool(reporter, scene, run)
+        else:
+            farm.render_local(reporter, run)
+    except KeyboardInterrupt:
+        status = EXIT_INTERRUPTED
+    except Exception:
+        traceback.print_exc()
+        status = EXIT_FAILED
+    finally:
+        report = run.close(reporter)
+
+    records = run.journal.load()
+    done = []
+    pending = []
+    for job in run.all_jobs:
+        record = records.get(farm.journal.job_key(job))
+        if farm.journal.is_done(record, job):
+            done.append(record)
+        else:
+            pending.append(job)
+    if spec['shard']:
+        manifest = farm.shards.write_manifest(path, *spec['shard'], done)
+        reporter.report({'INFO'}, 'Shard manifest ==> %s' % manifest)
+    reporter.report({'INFO'}, 'Rendered %d of %d in %s, report ==> %s' % (
+        len(run.all_jobs) - len(pending), len(run.all_jobs),
+        farm.progress.format_duration(time.time() - start), report))
+    if status == EXIT_OK and pending:
+        reporter.report({'WARNING'}, '%d jobs not rendered' % len(pending))
+        status = EXIT_FAILED
+    return status
+
+
+sys.exit(main())
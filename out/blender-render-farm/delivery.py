@@ -0,0 +1,546 @@
+"""Package a run for delivery while it renders.
+
+Every finished render is appended to the current archive in delivery/ of the
+output folder, a zip (stored, PNG and WebP are already compressed) or a tar.
+Once an archive reaches the shard size it is closed, renamed from .part into
+place and the next one is started, so archives are complete as soon as they
+appear. delivery/manifest.json lists every shard with its size and SHA-1 and
+the files in it with theirs. A resumed run starts new shards after the ones
+already listed, a file packaged twice is in the later shard as well.
+
+Closed shards can be pushed to an S3 compatible endpoint while the run goes
+on, with multipart uploads over kept-alive connections:
+
+    http://host:9000/bucket/prefix
+
+Requests are signed (AWS signature version 4) with AWS_ACCESS_KEY_ID and
+AWS_SECRET_ACCESS_KEY when they are set, AWS_REGION defaults to us-east-1.
+A small stand-in server stores uploads in a local folder, and shards that
+failed to upload can be sent again:
+
+    python delivery.py serve /tmp/bucket --port 9000
+    python delivery.py upload /path/to/output http://localhost:9000/bucket/coins
+"""
+import argparse
+import datetime
+import hashlib
+import hmac
+import http.client
+import json
+import os
+import queue
+import sys
+import tarfile
+import threading
+import time
+import urllib.parse
+import xml.etree.ElementTree as ET
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DELIVERY_DIR = "delivery"
+MANIFEST_NAME = "manifest.json"
+FORMATS = {
+    'zip': '.zip',
+    'tar': '.tar',
+}
+CHUNK = 1 << 20
+# smallest part S3 accepts, except for the last one
+MIN_PART = 5 << 20
+
+
+def _write_json(path, data):
+    tmp = path + '.part'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp, path)
+
+
+def load_manifest(directory):
+    """Manifest of the delivery folder, empty without one"""
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'shards': []}
+
+
+class _HashingReader:
+    """File object hashing what is read through it"""
+
+    def __init__(self, f):
+        self.f = f
+        self.sha1 = hashlib.sha1()
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.sha1.update(data)
+        return data
+
+
+# -------------------------------------------------------------------
+#   Archives
+# -------------------------------------------------------------------
+
+class Packager:
+    """Append finished renders to archive shards in a background thread.
+
+    ``uploader`` (an S3Uploader) gets every shard once it is closed.
+    """
+
+    def __init__(self, directory, format='zip', shard_size=1 << 30, uploader=None, name=None):
+        self.root = directory
+        self.directory = os.path.join(directory, DELIVERY_DIR)
+        os.makedirs(self.directory, exist_ok=True)
+        self.format = format
+        self.shard_size = shard_size
+        self.uploader = uploader
+        self.name = name or os.path.basename(os.path.normpath(directory)) or 'delivery'
+
+        self.manifest = load_manifest(self.directory)
+        self.manifest['format'] = format
+        self.shards = self.manifest['shards']
+        self.uploads = []
+        self.errors = []
+
+        self.archive = None
+        self.entry = None
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name='render_farm_package', daemon=True)
+        self.thread.start()
+
+    def add(self, paths, record=None):
+        """Queue files for packaging, record (object, material, camera) goes to the manifest"""
+        self.queue.put((list(paths), record or {}))
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            paths, record = item
+            for path in paths:
+                try:
+                    self._append(path, record)
+                except Exception as e:
+                    self.errors.append((path, str(e)))
+        try:
+            self._close_shard()
+        except Exception as e:
+            self.errors.append((self.entry['name'] if self.entry else self.directory, str(e)))
+
+    # ---------------------------------------------------------------
+    #   Shards
+
+    def _open_shard(self):
+        number = max([shard['number'] for shard in self.shards] or [0]) + 1
+        name = '%s_%04d%s' % (self.name, number, FORMATS[self.format])
+        path = os.path.join(self.directory, name + '.part')
+        if self.format == 'zip':
+            self.archive = zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED, allowZip64=True)
+        else:
+            self.archive = tarfile.open(path, 'w', format=tarfile.PAX_FORMAT)
+        self.entry = {'number': number, 'name': name, 'size': 0, 'sha1': None, 'files': [], 'uploaded': None}
+
+    def _close_shard(self):
+        if self.archive is None:
+            return
+        self.archive.close()
+        self.archive = None
+        entry, self.entry = self.entry, None
+
+        path = os.path.join(self.directory, entry['name'])
+        h = hashlib.sha1()
+        with open(path + '.part', 'rb') as f:
+            for data in iter(lambda: f.read(CHUNK), b''):
+                h.update(data)
+        os.replace(path + '.part', path)
+        entry['size'] = os.path.getsize(path)
+        entry['sha1'] = h.hexdigest()
+        self.shards.append(entry)
+        self.write_manifest()
+        if self.uploader is not None:
+            self.uploads.append((entry, self.uploader.submit(path, entry['name'])))
+
+    def _append(self, path, record):
+        if self.archive is None:
+            self._open_shard()
+        arcname = os.path.relpath(path, self.root).replace(os.sep, '/')
+        size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            reader = _HashingReader(f)
+            if self.format == 'zip':
+                info = zipfile.ZipInfo.from_file(path, arcname)
+                with self.archive.open(info, 'w', force_zip64=size >= 0x7fffffff) as out:
+                    for data in iter(lambda: reader.read(CHUNK), b''):
+                        out.write(data)
+            else:
+                info = self.archive.gettarinfo(path, arcname)
+                self.archive.addfile(info, reader)
+        self.entry['files'].append(dict(
+            {key: record[key] for key in ('object', 'material', 'camera') if key in record},
+            name=arcname, size=size, sha1=reader.sha1.hexdigest()))
+        self.entry['size'] += size
+        if self.entry['size'] >= self.shard_size:
+            self._close_shard()
+
+    def write_manifest(self):
+        self.manifest['updated'] = time.time()
+        _write_json(os.path.join(self.directory, MANIFEST_NAME), self.manifest)
+
+    def close(self):
+        """Package what is queued, wait for the uploads, returns the manifest path"""
+        self.queue.put(None)
+        self.thread.join()
+        for entry, future in self.uploads:
+            try:
+                entry['uploaded'] = future.result()
+            except Exception as e:
+                self.errors.append((entry['name'], str(e)))
+        path = os.path.join(self.directory, MANIFEST_NAME)
+        self.write_manifest()
+        if self.uploader is not None:
+            try:
+                self.uploader.upload(path, MANIFEST_NAME)
+            except Exception as e:
+                self.errors.append((MANIFEST_NAME, str(e)))
+            self.uploader.close()
+        return path
+
+
+# -------------------------------------------------------------------
+#   S3
+# -------------------------------------------------------------------
+
+def _quote(text, safe='-_.~'):
+    return urllib.parse.quote(text, safe=safe)
+
+
+def _hmac(key, text):
+    return hmac.new(key, text.encode('utf-8'), hashlib.sha256).digest()
+
+
+def sign(method, host, path, query, headers, payload_hash, access_key, secret_key, region, now=None):
+    """Authorization header of AWS signature version 4, headers must hold every signed header"""
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    amz_date = now.strftime('%Y%m%dT%H%M%SZ')
+    date = amz_date[:8]
+    headers.update({'host': host, 'x-amz-date': amz_date, 'x-amz-content-sha256': payload_hash})
+
+    names = sorted(name.lower() for name in headers)
+    values = {name.lower(): str(value).strip() for name, value in headers.items()}
+    canonical = '\n'.join((
+        method,
+        _quote(path, safe='/-_.~'),
+        '&'.join('%s=%s' % (_quote(k), _quote(v)) for k, v in sorted(query.items())),
+        ''.join('%s:%s\n' % (name, values[name]) for name in names),
+        ';'.join(names),
+        payload_hash))
+    scope = '%s/%s/s3/aws4_request' % (date, region)
+    to_sign = '\n'.join(('AWS4-HMAC-SHA256', amz_date, scope,
+                         hashlib.sha256(canonical.encode('utf-8')).hexdigest()))
+    key = _hmac(_hmac(_hmac(_hmac(('AWS4' + secret_key).encode('utf-8'), date), region), 's3'), 'aws4_request')
+    signature = hmac.new(key, to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+    return 'AWS4-HMAC-SHA256 Credential=%s/%s, SignedHeaders=%s, Signature=%s' % (
+        access_key, scope, ';'.join(names), signature)
+
+
+def _find(root, tag):
+    """Text of the first element named tag, whatever its namespace"""
+    for element in root.iter():
+        if element.tag == tag or element.tag.endswith('}' + tag):
+            return element.text
+    return None
+
+
+class S3Error(Exception):
+    pass
+
+
+class S3Uploader:
+    """Upload files to an S3 compatible endpoint, http(s)://host/bucket/prefix.
+
+    Files up to part_size are sent with one PUT, larger ones in parts. Uploads
+    run in ``threads`` background threads sharing a pool of connections.
+    """
+
+    def __init__(self, url, access_key=None, secret_key=None, region=None,
+                 part_size=16 << 20, threads=2, retries=3, timeout=60.0):
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.netloc:
+            raise ValueError("Upload URL must be http(s)://host/bucket/prefix : %s" % url)
+        path = parts.path.strip('/')
+        if not path:
+            raise ValueError("Upload URL has no bucket : %s" % url)
+        self.scheme = parts.scheme
+        self.host = parts.netloc
+        self.prefix = '/' + path + '/'
+        self.access_key = access_key or os.environ.get('AWS_ACCESS_KEY_ID')
+        self.secret_key = secret_key or os.environ.get('AWS_SECRET_ACCESS_KEY')
+        self.region = region or os.environ.get('AWS_REGION') or os.environ.get('AWS_DEFAULT_REGION') or 'us-east-1'
+        self.part_size = max(MIN_PART, part_size)
+        self.retries = retries
+        self.timeout = timeout
+        self.connections = queue.LifoQueue()
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix='render_farm_upload')
+
+    def url(self, key):
+        return '%s://%s%s%s' % (self.scheme, self.host, self.prefix, key)
+
+    # ---------------------------------------------------------------
+    #   Requests
+
+    def _connection(self):
+        try:
+            return self.connections.get_nowait()
+        except queue.Empty:
+            cls = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+            return cls(self.host, timeout=self.timeout)
+
+    def request(self, method, key, query=None, body=b''):
+        """(status, headers, body) of a request, retried on connection errors and server errors"""
+        query = query or {}
+        path = self.prefix + key
+        target = _quote(path, safe='/-_.~')
+        if query:
+            target += '?' + '&'.join('%s=%s' % (_quote(k), _quote(v)) if v else _quote(k)
+                                     for k, v in sorted(query.items()))
+        for attempt in range(self.retries + 1):
+            headers = {'content-length': str(len(body))}
+            if self.access_key and self.secret_key:
+                headers['authorization'] = sign(
+                    method, self.host, path, query, headers, hashlib.sha256(body).hexdigest(),
+                    self.access_key, self.secret_key, self.region)
+            conn = self._connection()
+            try:
+                conn.request(method, target, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                error = S3Error('%s %s : %s' % (method, key, e))
+            else:
+                self.connections.put(conn)
+                if response.status < 500:
+                    if response.status >= 300:
+                        raise S3Error('%s %s : %d %s' % (method, key, response.status,
+                                                         _find_error(data) or response.reason))
+                    return response.status, response, data
+                error = S3Error('%s %s : %d %s' % (method, key, response.status, response.reason))
+            if attempt < self.retries:
+                time.sleep(0.5 * 2 ** attempt)
+        raise error
+
+    # ---------------------------------------------------------------
+    #   Uploads
+
+    def submit(self, path, key):
+        """Upload in the background, the future's result is the object URL"""
+        return self.executor.submit(self.upload, path, key)
+
+    def upload(self, path, key):
+        size = os.path.getsize(path)
+        if size <= self.part_size:
+            with open(path, 'rb') as f:
+                self.request('PUT', key, body=f.read())
+            return self.url(key)
+
+        _, _, data = self.request('POST', key, {'uploads': ''})
+        upload_id = _find(ET.fromstring(data), 'UploadId')
+        if not upload_id:
+            raise S3Error('POST %s : no UploadId in the response' % key)
+        try:
+            etags = []
+            with open(path, 'rb') as f:
+                for number, body in enumerate(iter(lambda: f.read(self.part_size), b''), 1):
+                    _, response, _ = self.request('PUT', key, {'partNumber': str(number), 'uploadId': upload_id}, body)
+                    etags.append(response.getheader('ETag'))
+            complete = ''.join('<Part><PartNumber>%d</PartNumber><ETag>%s</ETag></Part>' % (number, etag)
+                               for number, etag in enumerate(etags, 1))
+            _, _, data = self.request('POST', key, {'uploadId': upload_id},
+                                      ('<CompleteMultipartUpload>%s</CompleteMultipartUpload>'
+                                       % complete).encode('utf-8'))
+            # errors can come with a 200 once the upload started
+            error = _find_error(data)
+            if error:
+                raise S3Error('Completing %s : %s' % (key, error))
+        except Exception:
+            try:
+                self.request('DELETE', key, {'uploadId': upload_id})
+            except S3Error:
+                pass
+            raise
+        return self.url(key)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        while not self.connections.empty():
+            self.connections.get_nowait().close()
+
+
+def _find_error(data):
+    try:
+        root = ET.fromstring(data)
+    except ET.ParseError:
+        return None
+    if not root.tag.endswith('Error'):
+        return None
+    return '%s %s' % (_find(root, 'Code'), _find(root, 'Message') or '')
+
+
+# -------------------------------------------------------------------
+#   Stand-in server
+# -------------------------------------------------------------------
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """The part of the S3 API the uploader uses, objects are files of server.root, nothing is checked"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def _reply(self, status, body=b'', headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _target(self):
+        parts = urllib.parse.urlsplit(self.path)
+        key = urllib.parse.unquote(parts.path).lstrip('/')
+        query = dict(urllib.parse.parse_qsl(parts.query, keep_blank_values=True))
+        path = os.path.normpath(os.path.join(self.server.root, key))
+        if not key or not path.startswith(os.path.normpath(self.server.root) + os.sep):
+            self._reply(400)
+            return None, None, None
+        return key, path, query
+
+    def _body(self):
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def _part_dir(self, upload_id):
+        return os.path.join(self.server.root, '.uploads', os.path.basename(upload_id))
+
+    def do_PUT(self):
+        key, path, query = self._target()
+        if key is None:
+            return
+        body = self._body()
+        if 'uploadId' in query:
+            part_dir = self._part_dir(query['uploadId'])
+            if not os.path.isdir(part_dir):
+                return self._reply(404)
+            path = os.path.join(part_dir, '%05d' % int(query['partNumber']))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(body)
+        self._reply(200, headers={'ETag': '"%s"' % hashlib.md5(body).hexdigest()})
+
+    def do_POST(self):
+        key, path, query = self._target()
+        if key is None:
+            return
+        body = self._body()
+        if 'uploads' in query:
+            upload_id = '%d-%d' % (time.time_ns(), threading.get_ident())
+            os.makedirs(self._part_dir(upload_id))
+            return self._reply(200, ('<InitiateMultipartUploadResult><Key>%s</Key><UploadId>%s</UploadId>'
+                                     '</InitiateMultipartUploadResult>' % (key, upload_id)).encode('utf-8'))
+        part_dir = self._part_dir(query.get('uploadId', ''))
+        if not os.path.isdir(part_dir):
+            return self._reply(404)
+        numbers = [int(_find(part, 'PartNumber')) for part in ET.fromstring(body).iter()
+                   if part.tag.endswith('Part')]
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as out:
+            for number in numbers:
+                with open(os.path.join(part_dir, '%05d' % number), 'rb') as f:
+                    out.write(f.read())
+        self._remove(part_dir)
+        self._reply(200, b'<CompleteMultipartUploadResult/>')
+
+    def do_DELETE(self):
+        key, path, query = self._target()
+        if key is None:
+            return
+        if 'uploadId' in query:
+            self._remove(self._part_dir(query['uploadId']))
+        elif os.path.exists(path):
+            os.remove(path)
+        self._reply(204)
+
+    def do_GET(self):
+        key, path, query = self._target()
+        if key is None:
+            return
+        try:
+            with open(path, 'rb') as f:
+                body = f.read()
+        except OSError:
+            return self._reply(404)
+        self._reply(200, body)
+
+    @staticmethod
+    def _remove(part_dir):
+        if os.path.isdir(part_dir):
+            for name in os.listdir(part_dir):
+                os.remove(os.path.join(part_dir, name))
+            os.rmdir(part_dir)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(root, host='127.0.0.1', port=9000):
+    """Stand-in server storing uploads under root, serves until interrupted"""
+    server = ThreadingHTTPServer((host, port), StandInHandler)
+    server.root = os.path.abspath(root)
+    os.makedirs(server.root, exist_ok=True)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in upload server, or upload a packaged run")
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve_parser = commands.add_parser('serve', help="Store uploads in a folder")
+    serve_parser.add_argument('root')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=9000)
+    upload_parser = commands.add_parser('upload', help="Upload the shards of a run not uploaded yet")
+    upload_parser.add_argument('output', help="Output folder of the run")
+    upload_parser.add_argument('url', help="http(s)://host/bucket/prefix")
+    upload_parser.add_argument('--all', action='store_true', help="Upload every shard again")
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        server = serve(args.root, args.host, args.port)
+        print('Storing uploads in %s, serving on http://%s:%d' % (server.root, args.host, args.port))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    directory = os.path.join(args.output, DELIVERY_DIR)
+    manifest = load_manifest(directory)
+    uploader = S3Uploader(args.url)
+    failed = 0
+    for shard in manifest['shards']:
+        if shard['uploaded'] and not args.all:
+            continue
+        try:
+            shard['uploaded'] = uploader.upload(os.path.join(directory, shard['name']), shard['name'])
+            print('%s ==> %s' % (shard['name'], shard['uploaded']))
+        except (OSError, S3Error) as e:
+            print('%s : %s' % (shard['name'], e), file=sys.stderr)
+            failed += 1
+    path = os.path.join(directory, MANIFEST_NAME)
+    _write_json(path, manifest)
+    uploader.upload(path, MANIFEST_NAME)
+    uploader.close()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,319 @@
+"""Derivative images of every render: trimmed, resized and in web formats.
+
+Each finished render is decoded once, its transparent border is cropped to the
+alpha bounding box, and every configured size is written in every format from
+that one decode:
+
+    derivatives/<size>/<material>_<object>_<camera>.png
+
+Sizes are "name:pixels", the longest side (never upscaled), or just "name" for
+the trimmed full size, e.g. "thumb:256, medium:1024, full". Resizing averages
+the source pixels each output pixel covers, with premultiplied alpha so edges
+do not darken.
+
+Renders are derived by a few plain Python processes while the run goes on,
+they start in a blink and do not load the .blend file (``python derivatives.py
+serve`` reads one JSON task per line on stdin and answers on stdout). PNG is
+decoded with NumPy, or Pillow when it is installed, WebP needs Pillow.
+"""
+import json
+import os
+import queue
+import struct
+import subprocess
+import sys
+import threading
+import zlib
+
+import numpy as np
+
+try:
+    from . import encoder
+except ImportError:
+    import encoder
+
+DERIVATIVES_DIR = "derivatives"
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# channels of the PNG color types, palette images are not written by Blender
+PNG_CHANNELS = {0: 1, 2: 3, 4: 2, 6: 4}
+
+
+def parse_sizes(text):
+    """[(name, longest side or None)] from "thumb:256, medium:1024, full" """
+    sizes = []
+    for item in text.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, pixels = item.partition(':')
+        name = name.strip()
+        if not name or os.sep in name or name.startswith('.'):
+            raise ValueError("Bad derivative size name : %s" % item)
+        try:
+            pixels = int(pixels) if pixels.strip() else None
+        except ValueError:
+            raise ValueError("Derivative size must be name:pixels : %s" % item)
+        if pixels is not None and pixels < 1:
+            raise ValueError("Derivative size out of range : %s" % item)
+        sizes.append((name, pixels))
+    if not sizes:
+        raise ValueError("No derivative sizes")
+    return sizes
+
+
+# -------------------------------------------------------------------
+#   Decoding
+# -------------------------------------------------------------------
+
+def _unfilter(filters, rows):
+    """Undo the PNG row filters of (height, width, bytes per pixel) uint8 rows"""
+    height, width, bpp = rows.shape
+    if filters.max(initial=0) <= 2:
+        # None, Sub and Up only, one row at a time
+        out = np.empty_like(rows)
+        prev = np.zeros((width, bpp), dtype=np.uint8)
+        for y in range(height):
+            if filters[y] == 1:
+                out[y] = np.cumsum(rows[y], axis=0, dtype=np.uint8)
+            elif filters[y] == 2:
+                out[y] = rows[y] + prev
+            else:
+                out[y] = rows[y]
+            prev = out[y]
+        return out
+
+    # Average and Paeth need the pixel to the left, decode along the anti-diagonals,
+    # every pixel of one depends only on the two before it
+    ftype = filters.astype(np.int16)[:, None]
+    data = rows.astype(np.int16)
+    out = np.zeros((height + 1, width + 1, bpp), dtype=np.int16)
+    for t in range(height + width - 1):
+        y = np.arange(max(0, t - width + 1), min(height, t + 1))
+        x = t - y
+        a = out[y + 1, x]
+        b = out[y, x + 1]
+        c = out[y, x]
+        p = a + b - c
+        pa, pb, pc = np.abs(p - a), np.abs(p - b), np.abs(p - c)
+        paeth = np.where((pa <= pb) & (pa <= pc), a, np.where(pb <= pc, b, c))
+        kind = ftype[y]
+        predicted = np.select([kind == 1, kind == 2, kind == 3, kind == 4],
+                              [a, b, (a + b) >> 1, paeth], 0)
+        out[y + 1, x + 1] = (data[y, x] + predicted) & 255
+    return out[1:, 1:].astype(np.uint8)
+
+
+def read_png(path):
+    """8 or 16 bit, non interlaced PNG as an (height, width, 4) uint8 array"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:8] != PNG_SIGNATURE:
+        raise ValueError("Not a PNG : %s" % path)
+    header = None
+    idat = []
+    pos = 8
+    while pos + 8 <= len(data):
+        length, kind = struct.unpack('>I4s', data[pos:pos + 8])
+        body = data[pos + 8:pos + 8 + length]
+        if kind == b'IHDR':
+            header = struct.unpack('>IIBBBBB', body)
+        elif kind == b'IDAT':
+            idat.append(body)
+        elif kind == b'IEND':
+            break
+        pos += 12 + length
+    if header is None:
+        raise ValueError("PNG without header : %s" % path)
+    width, height, depth, color_type, _, _, interlace = header
+    channels = PNG_CHANNELS.get(color_type)
+    if channels is None or depth not in (8, 16) or interlace:
+        raise ValueError("Unsupported PNG, type %d depth %d : %s" % (color_type, depth, path))
+
+    bpp = channels * depth // 8
+    raw = np.frombuffer(zlib.decompress(b''.join(idat)), dtype=np.uint8)
+    raw = raw[:height * (1 + width * bpp)].reshape(height, 1 + width * bpp)
+    pixels = _unfilter(raw[:, 0], raw[:, 1:].reshape(height, width, bpp))
+    # 16 bit samples are big endian, keep the high byte
+    pixels = pixels.reshape(height, width, channels, depth // 8)[..., 0]
+
+    if channels == 4:
+        return np.ascontiguousarray(pixels)
+    rgba = np.empty((height, width, 4), dtype=np.uint8)
+    rgba[..., :3] = pixels[..., :1] if channels <= 2 else pixels
+    rgba[..., 3] = pixels[..., -1] if channels in (2, 4) else 255
+    return rgba
+
+
+def read_image(path):
+    """Render output as an (height, width, 4) uint8 array"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.tga':
+        return encoder.read_tga(path)
+    if encoder.webp_available():
+        from PIL import Image
+        with Image.open(path) as image:
+            return np.asarray(image.convert('RGBA'))
+    if ext == '.png':
+        return read_png(path)
+    raise ValueError("Cannot decode %s without Pillow" % path)
+
+
+# -------------------------------------------------------------------
+#   Processing
+# -------------------------------------------------------------------
+
+def alpha_bbox(pixels, threshold=0):
+    """(left, top, right, bottom) of the pixels with alpha above threshold, None when there are none"""
+    opaque = pixels[..., 3] > threshold
+    rows = np.flatnonzero(opaque.any(axis=1))
+    if not len(rows):
+        return None
+    cols = np.flatnonzero(opaque.any(axis=0))
+    return int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1
+
+
+def trim(pixels, margin=0):
+    """(pixels cropped to the alpha bounding box plus margin, box), uncropped when fully transparent"""
+    height, width = pixels.shape[:2]
+    box = alpha_bbox(pixels)
+    if box is None:
+        return pixels, [0, 0, width, height]
+    left, top, right, bottom = box
+    box = [max(0, left - margin), max(0, top - margin), min(width, right + margin), min(height, bottom + margin)]
+    return pixels[box[1]:box[3], box[0]:box[2]], box
+
+
+def _weights(src, dst):
+    """(dst, src) matrix averaging the source pixels each destination pixel covers"""
+    scale = src / dst
+    edges = np.arange(dst + 1) * scale
+    cells = np.arange(src)
+    overlap = np.minimum(edges[1:, None], cells + 1) - np.maximum(edges[:-1, None], cells)
+    return (np.clip(overlap, 0, None) / scale).astype(np.float32)
+
+
+def resize(pixels, longest):
+    """Pixels scaled down so the longest side is at most longest"""
+    height, width = pixels.shape[:2]
+    if longest is None or max(height, width) <= longest:
+        return pixels
+    scale = longest / max(height, width)
+    new_height = max(1, round(height * scale))
+    new_width = max(1, round(width * scale))
+
+    image = pixels.astype(np.float32)
+    alpha = image[..., 3:] / 255.0
+    image[..., :3] *= alpha
+    image = _weights(height, new_height) @ image.reshape(height, width * 4)
+    image = image.reshape(new_height, width, 4).transpose(0, 2, 1) @ _weights(width, new_width).T
+    image = image.transpose(0, 2, 1)
+    alpha = image[..., 3:] / 255.0
+    np.divide(image[..., :3], alpha, out=image[..., :3], where=alpha > 0)
+    return np.clip(np.rint(image), 0, 255).astype(np.uint8)
+
+
+def derive(source, directory, name, sizes, formats=('PNG',), trim_alpha=True, margin=0, png_level=6,
+           webp_quality=90):
+    """Decode source once and write every size in every format, returns the trim box and the files"""
+    pixels = read_image(source)
+    height, width = pixels.shape[:2]
+    box = [0, 0, width, height]
+    if trim_alpha:
+        pixels, box = trim(pixels, margin)
+
+    files = []
+    for size, longest in sizes:
+        image = resize(pixels, longest)
+        folder = os.path.join(directory, DERIVATIVES_DIR, size)
+        os.makedirs(folder, exist_ok=True)
+        for format in formats:
+            path = os.path.join(folder, name + encoder.FORMATS[format])
+            if format == 'PNG':
+                encoder.write_png(path, image.shape[1], image.shape[0], (image,), png_level)
+            else:
+                encoder.write_webp(path, image, webp_quality)
+            files.append({'size': size, 'format': format, 'path': path,
+                          'width': image.shape[1], 'height': image.shape[0]})
+    return {'trim': box, 'files': files}
+
+
+def serve():
+    """Derive the JSON tasks read from stdin, one reply line each"""
+    for line in sys.stdin:
+        try:
+            reply = {'result': derive(**json.loads(line))}
+        except Exception as e:
+            reply = {'error': '%s: %s' % (type(e).__name__, e)}
+        sys.stdout.write(json.dumps(reply) + '\n')
+        sys.stdout.flush()
+
+
+# -------------------------------------------------------------------
+#   Pool
+# -------------------------------------------------------------------
+
+class DerivativePool:
+    """Derive finished renders in background processes.
+
+    ``submit(job, on_done)`` queues job['output'], on_done(result) is called
+    from a feeding thread, with None when it failed (the error is in errors).
+    """
+
+    def __init__(self, directory, sizes, formats=('PNG',), trim_alpha=True, margin=0, png_level=6,
+                 processes=None, python=None):
+        self.options = {'directory': directory, 'sizes': list(sizes), 'formats': list(formats),
+                        'trim_alpha': trim_alpha, 'margin': margin, 'png_level': png_level}
+        self.command = [python or sys.executable, os.path.abspath(__file__), 'serve']
+        self.tasks = queue.Queue()
+        self.errors = []
+        processes = processes or max(1, min(4, (os.cpu_count() or 1) // 2))
+        self.threads = [threading.Thread(target=self._feed, name='render_farm_derive_%d' % i, daemon=True)
+                        for i in range(processes)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, job, on_done):
+        self.tasks.put((job, on_done))
+
+    def _feed(self):
+        process = None
+        while True:
+            item = self.tasks.get()
+            if item is None:
+                break
+            job, on_done = item
+            task = dict(self.options, source=job['output'], name=os.path.basename(job['filepath']))
+            result = None
+            try:
+                if process is None or process.poll() is not None:
+                    process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+                process.stdin.write(json.dumps(task).encode('utf-8') + b'\n')
+                process.stdin.flush()
+                line = process.stdout.readline()
+                if not line:
+                    raise RuntimeError("Derivative process exited with %s" % process.wait())
+                reply = json.loads(line.decode('utf-8'))
+                if 'error' in reply:
+                    raise RuntimeError(reply['error'])
+                result = reply['result']
+            except Exception as e:
+                self.errors.append((job, str(e)))
+            on_done(result)
+        if process is not None:
+            process.stdin.close()
+            process.wait()
+
+    def close(self):
+        """Wait for every queued render to be derived"""
+        for _ in self.threads:
+            self.tasks.put(None)
+        for thread in self.threads:
+            thread.join()
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['serve']:
+        serve()
+    else:
+        print('Usage: python derivatives.py serve', file=sys.stderr)
+        sys.exit(2)
@@ -0,0 +1,197 @@
+"""Image encoding off the render thread.
+
+Blender writes each render as an uncompressed TGA, which is quick, and a
+bounded pool of threads compresses it to the delivery formats (PNG at a chosen
+zlib level, optionally WebP) while the next job renders. zlib and NumPy release
+the GIL, so the threads really run in parallel. Every file is written to a
+temporary name and renamed into place, and submitting blocks while the queue
+is full, so a slow disk cannot pile up renders in memory.
+
+WebP needs Pillow, which Blender does not ship. EXR needs the float render
+data, which only Blender's own writer has, use the normal output for it.
+"""
+import os
+import struct
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+RAW_DIR = ".encode"
+
+FORMATS = {
+    'PNG': '.png',
+    'WEBP': '.webp',
+}
+
+
+# -------------------------------------------------------------------
+#   TGA
+# -------------------------------------------------------------------
+
+def read_tga(path):
+    """Uncompressed 24 or 32 bit TGA as an (height, width, 4) uint8 array, top row first"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    id_length, colormap_type, image_type = data[0], data[1], data[2]
+    if image_type != 2 or colormap_type != 0:
+        raise ValueError("Not an uncompressed true color TGA : %s" % path)
+    width, height, depth, descriptor = struct.unpack('<HHBB', data[12:18])
+    channels = depth // 8
+    if channels not in (3, 4):
+        raise ValueError("Unsupported TGA depth %d : %s" % (depth, path))
+
+    offset = 18 + id_length
+    bgra = np.frombuffer(data, dtype=np.uint8, count=width * height * channels, offset=offset)
+    bgra = bgra.reshape(height, width, channels)
+    pixels = np.empty((height, width, 4), dtype=np.uint8)
+    pixels[..., 0] = bgra[..., 2]
+    pixels[..., 1] = bgra[..., 1]
+    pixels[..., 2] = bgra[..., 0]
+    pixels[..., 3] = bgra[..., 3] if channels == 4 else 255
+    if not descriptor & 0x20:
+        # stored bottom row first
+        pixels = pixels[::-1]
+    return pixels
+
+
+def write_tga(path, pixels):
+    """(height, width, 4) uint8 array, top row first, as an uncompressed 32 bit TGA"""
+    height, width = pixels.shape[:2]
+    bgra = np.empty((height, width, 4), dtype=np.uint8)
+    bgra[..., 0] = pixels[..., 2]
+    bgra[..., 1] = pixels[..., 1]
+    bgra[..., 2] = pixels[..., 0]
+    bgra[..., 3] = pixels[..., 3]
+    tmp = path + '.part'
+    with open(tmp, 'wb') as f:
+        f.write(struct.pack('<BBBHHBHHHHBB', 0, 0, 2, 0, 0, 0, 0, 0, width, height, 32, 0x28))
+        f.write(bgra.tobytes())
+    os.replace(tmp, path)
+
+
+# -------------------------------------------------------------------
+#   PNG
+# -------------------------------------------------------------------
+
+def _chunk(f, kind, data):
+    f.write(struct.pack('>I', len(data)))
+    f.write(kind)
+    f.write(data)
+    f.write(struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+
+def write_png(path, width, height, bands, level=6):
+    """Stream an 8 bit RGBA PNG from an iterable of (rows, width, 4) uint8 bands.
+
+    Rows use the Up filter, the difference to the row above, computed per band
+    with NumPy. The file is written to a temporary name and renamed into place.
+    """
+    tmp = path + '.part'
+    with open(tmp, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        _chunk(f, b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+        compressor = zlib.compressobj(level)
+        prev = np.zeros((1, width * 4), dtype=np.uint8)
+        for band in bands:
+            flat = np.asarray(band, dtype=np.uint8).reshape(band.shape[0], width * 4)
+            rows = np.empty((flat.shape[0], width * 4 + 1), dtype=np.uint8)
+            rows[:, 0] = 2
+            rows[:, 1:] = flat
+            rows[0, 1:] -= prev[0]
+            rows[1:, 1:] -= flat[:-1]
+            prev = flat[-1:]
+            data = compressor.compress(rows.tobytes())
+            if data:
+                _chunk(f, b'IDAT', data)
+        _chunk(f, b'IDAT', compressor.flush())
+        _chunk(f, b'IEND', b'')
+    os.replace(tmp, path)
+
+
+def write_webp(path, pixels, quality=90):
+    from PIL import Image
+    tmp = path + '.part'
+    Image.fromarray(pixels, 'RGBA').save(tmp, 'WEBP', quality=quality)
+    os.replace(tmp, path)
+
+
+def webp_available():
+    try:
+        from PIL import features
+    except ImportError:
+        return False
+    return bool(features.check('webp'))
+
+
+# -------------------------------------------------------------------
+#   Pool
+# -------------------------------------------------------------------
+
+class EncoderPool:
+    """Encode raw renders in background threads.
+
+    ``on_done(job, elapsed, phases)`` is called from the encoding thread once
+    all formats of a job are written, with the encoding time in phases.
+    """
+
+    def __init__(self, directory, formats=('PNG',), png_level=6, webp_quality=90,
+                 threads=None, max_pending=None, on_done=None):
+        self.raw_dir = os.path.join(directory, RAW_DIR)
+        os.makedirs(self.raw_dir, exist_ok=True)
+        self.formats = tuple(formats)
+        self.png_level = png_level
+        self.webp_quality = webp_quality
+        threads = threads or max(1, min(4, (os.cpu_count() or 1) // 2))
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix='render_farm_encode')
+        self.slots = threading.BoundedSemaphore(max_pending or threads * 2)
+        self.on_done = on_done
+        self.errors = []
+        self.waited = 0.0
+
+    def raw_path(self, job):
+        return os.path.join(self.raw_dir, os.path.basename(job['filepath']) + '.tga')
+
+    def output_path(self, job, format):
+        return job['filepath'] + FORMATS[format]
+
+    def submit(self, job, raw, elapsed, phases):
+        """Queue a raw render for encoding, blocks while the queue is full"""
+        start = time.perf_counter()
+        self.slots.acquire()
+        self.waited += time.perf_counter() - start
+        try:
+            self.executor.submit(self._encode, job, raw, elapsed, phases)
+        except RuntimeError:
+            self.slots.release()
+            raise
+
+    def _encode(self, job, raw, elapsed, phases):
+        try:
+            start = time.perf_counter()
+            pixels = read_tga(raw)
+            height, width = pixels.shape[:2]
+            for format in self.formats:
+                path = self.output_path(job, format)
+                if format == 'PNG':
+                    write_png(path, width, height, (pixels,), self.png_level)
+                elif format == 'WEBP':
+                    write_webp(path, pixels, self.webp_quality)
+            os.remove(raw)
+            phases = dict(phases, encode=time.perf_counter() - start)
+            if self.on_done:
+                self.on_done(job, elapsed, phases)
+        except Exception as e:
+            self.errors.append((job, str(e)))
+        finally:
+            self.slots.release()
+
+    def close(self):
+        """Wait for every queued render to be encoded"""
+        self.executor.shutdown(wait=True)
+        try:
+            os.rmdir(self.raw_dir)
+        except OSError:
+            pass
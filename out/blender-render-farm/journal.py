@@ -0,0 +1,77 @@
+"""Append-only journal of finished render jobs.
+
+One JSON record per line is written next to the rendered images as soon as a
+job finishes, so a crashed run can be resumed by skipping everything that is
+recorded and still present on disk. Jobs carrying a fingerprint of their
+inputs (see fingerprint.py) are also rendered again when it changed.
+"""
+import json
+import os
+import time
+
+JOURNAL_NAME = "render_farm_journal.jsonl"
+
+
+def job_key(job):
+    return (job['object'], job['material'], job['camera'])
+
+
+class Journal:
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, JOURNAL_NAME)
+
+    def load(self):
+        """Last record of every job in the journal, keyed by (object, material, camera)"""
+        records = {}
+        if not os.path.exists(self.path):
+            return records
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # the line being written when the run crashed
+                    continue
+                records[job_key(record)] = record
+        return records
+
+    def append(self, job, elapsed):
+        output = job['output']
+        record = {
+            'object': job['object'],
+            'material': job['material'],
+            'camera': job['camera'],
+            'output': output,
+            'size': os.path.getsize(output) if os.path.exists(output) else None,
+            'inputs': job.get('inputs'),
+            'derivatives': job.get('derivatives'),
+            'elapsed': elapsed,
+            'finished': time.time(),
+        }
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        return record
+
+    def pending(self, jobs):
+        """Jobs which are not recorded as done, whose output is missing or changed, or whose inputs changed"""
+        records = self.load()
+        return [job for job in jobs if not is_done(records.get(job_key(job)), job)]
+
+
+def is_done(record, job):
+    if record is None or record['size'] is None:
+        return False
+    if record['output'] != job['output']:
+        return False
+    if job.get('inputs') is not None and record.get('inputs') != job['inputs']:
+        return False
+    derived = record.get('derivatives') or {}
+    if not all(os.path.exists(f['path']) for f in derived.get('files', ())):
+        return False
+    try:
+        return os.path.getsize(record['output']) == record['size']
+    except OSError:
+        return False
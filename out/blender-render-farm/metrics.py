@@ -0,0 +1,157 @@
+"""Per job render metrics and run summary report.
+
+Every rendered job is broken down into phases (visibility toggling, material
+assignment, camera switch, render, file write, background encoding) and
+appended as one JSON record to render_farm_metrics.jsonl in the output folder.
+The report summarises the last run (or any run) per object, material and
+camera, and lists the slowest jobs.
+
+A report can be printed from any Python:
+
+    python metrics.py /path/to/output
+"""
+import argparse
+import json
+import os
+import time
+
+try:
+    from . import progress
+except ImportError:
+    import progress
+
+METRICS_NAME = "render_farm_metrics.jsonl"
+REPORT_NAME = "render_farm_report.txt"
+
+PHASES = ('visibility', 'material', 'camera', 'render', 'write', 'encode')
+AXES = ('object', 'material', 'camera')
+
+
+class MetricsLog:
+
+    def __init__(self, directory, run=None):
+        self.path = os.path.join(directory, METRICS_NAME)
+        self.report_path = os.path.join(directory, REPORT_NAME)
+        self.run = run or time.strftime('%Y%m%d-%H%M%S')
+
+    def append(self, job, phases, worker=None, size=None, settings=None):
+        record = {
+            'run': self.run,
+            'object': job['object'],
+            'material': job['material'],
+            'camera': job['camera'],
+            'phases': phases,
+            'total': sum(phases.values()),
+            'worker': worker,
+            'size': size,
+            'settings': settings,
+            'finished': time.time(),
+        }
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + '\n')
+        return record
+
+    def write_report(self):
+        records = load(self.path, self.run)
+        with open(self.report_path, 'w', encoding='utf-8') as f:
+            f.write(format_report(records))
+        return self.report_path
+
+
+def read(path):
+    """Records of every run"""
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records
+
+
+def load(path, run=None):
+    """Records of one run, the last one in the file if run is None"""
+    records = read(path)
+    if run is None and records:
+        run = records[-1]['run']
+    return [r for r in records if r['run'] == run]
+
+
+# -------------------------------------------------------------------
+#   Summary
+# -------------------------------------------------------------------
+
+def summarize(records, axis):
+    """Cost per value of axis, most expensive first"""
+    groups = {}
+    for record in records:
+        groups.setdefault(record[axis], []).append(record)
+
+    rows = []
+    for value, group in groups.items():
+        totals = [r['total'] for r in group]
+        row = {
+            axis: value,
+            'count': len(group),
+            'total': sum(totals),
+            'mean': sum(totals) / len(totals),
+            'p95': progress.percentile(totals, 95),
+            'max': max(totals),
+            'phases': {phase: sum(r['phases'].get(phase, 0.0) for r in group) / len(group)
+                       for phase in PHASES},
+        }
+        rows.append(row)
+    return sorted(rows, key=lambda row: -row['total'])
+
+
+def slowest(records, count=10):
+    return sorted(records, key=lambda r: -r['total'])[:count]
+
+
+def format_table(rows, axis):
+    width = max([len(axis)] + [len(str(row[axis])) for row in rows])
+    columns = ('count', 'total', 'mean', 'p95', 'max')
+    lines = ['%-*s ' % (width, axis) + ' '.join('%10s' % c for c in columns + PHASES)]
+    for row in rows:
+        cells = (['%10d' % row['count']] + ['%10.2f' % row[c] for c in columns[1:]]
+                 + ['%10.2f' % row['phases'][p] for p in PHASES])
+        lines.append('%-*s ' % (width, row[axis]) + ' '.join(cells))
+    return '\n'.join(lines)
+
+
+def format_report(records, outliers=10):
+    if not records:
+        return 'No renders recorded\n'
+
+    total = sum(r['total'] for r in records)
+    lines = [
+        'Run %s : %d renders, %s render time' % (records[0]['run'], len(records), progress.format_duration(total)),
+        '',
+        'Phases (total seconds)',
+    ]
+    for phase in PHASES:
+        seconds = sum(r['phases'].get(phase, 0.0) for r in records)
+        lines.append('  %-10s %10.2f  %5.1f%%' % (phase, seconds, 100.0 * seconds / total if total else 0.0))
+
+    for axis in AXES:
+        lines += ['', 'Per %s (mean seconds per phase)' % axis, format_table(summarize(records, axis), axis)]
+
+    lines += ['', 'Slowest %d renders' % min(outliers, len(records))]
+    for r in slowest(records, outliers):
+        lines.append('  %8.2fs  %s / %s / %s' % (r['total'], r['object'], r['material'], r['camera']))
+    return '\n'.join(lines) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise render farm metrics")
+    parser.add_argument('directory', help="Output folder of the run")
+    parser.add_argument('--run', default=None, help="Run id, defaults to the last run")
+    args = parser.parse_args()
+    print(format_report(load(os.path.join(args.directory, METRICS_NAME), args.run)), end='')
+
+
+if __name__ == '__main__':
+    main()
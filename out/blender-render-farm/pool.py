@@ -0,0 +1,391 @@
+"""Persistent pool of headless Blender render workers.
+
+Every worker is a long lived ``blender -b`` process which loads the .blend file
+once, connects back to the pool over a local socket and then takes jobs one at
+a time, so a fast worker never sits idle waiting on a slow one.
+
+Messages are newline delimited JSON objects. This module is shared by the
+operator (which owns the pool) and by worker.py (which runs inside each
+Blender process).
+"""
+import json
+import os
+import queue
+import secrets
+import select
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+# -------------------------------------------------------------------
+#   Connection
+# -------------------------------------------------------------------
+
+class Connection:
+    """Newline delimited JSON messages over a socket"""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.file = sock.makefile('rwb')
+
+    def send(self, message):
+        self.file.write(json.dumps(message).encode('utf-8') + b'\n')
+        self.file.flush()
+
+    def recv(self):
+        line = self.file.readline()
+        if not line:
+            raise EOFError("Connection closed")
+        return json.loads(line.decode('utf-8'))
+
+    def close(self):
+        try:
+            self.file.close()
+        finally:
+            self.sock.close()
+
+
+def connect(host, port, authkey, index):
+    """Connect a worker to the pool listening at host:port"""
+    sock = socket.create_connection((host, port))
+    conn = Connection(sock)
+    conn.send({'type': 'hello', 'authkey': authkey, 'worker': index})
+    return conn
+
+
+# -------------------------------------------------------------------
+#   Stats
+# -------------------------------------------------------------------
+
+class WorkerStats:
+    """Timings for one worker, reported when the run ends"""
+
+    def __init__(self, index):
+        self.index = index
+        self.started = time.time()
+        self.connected = None
+        self.finished = None
+        self.jobs = 0
+        self.failed = 0
+        self.busy = 0.0
+
+    @property
+    def startup(self):
+        if self.connected is None:
+            return 0.0
+        return self.connected - self.started
+
+    @property
+    def idle(self):
+        if self.connected is None:
+            return 0.0
+        end = self.finished or time.time()
+        return max(0.0, end - self.connected - self.busy)
+
+    @property
+    def throughput(self):
+        """Finished jobs per minute of connected time"""
+        if self.connected is None:
+            return 0.0
+        elapsed = (self.finished or time.time()) - self.connected
+        return 60.0 * self.jobs / elapsed if elapsed > 0 else 0.0
+
+    def __str__(self):
+        return ("Worker %d : %d jobs (%d failed), %.2f jobs/min, "
+                "busy %.1fs, idle %.1fs, startup %.1fs") % (
+                    self.index, self.jobs, self.failed, self.throughput,
+                    self.busy, self.idle, self.startup)
+
+
+# -------------------------------------------------------------------
+#   Memory
+# -------------------------------------------------------------------
+
+def process_rss(pid):
+    """Resident memory of a process in bytes, None where /proc is not available"""
+    try:
+        with open('/proc/%d/statm' % pid, 'r') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def current_rss():
+    """Resident memory of this process in bytes, the peak where the current one is not known"""
+    rss = process_rss(os.getpid())
+    if rss is not None:
+        return rss
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+# -------------------------------------------------------------------
+#   Pool
+# -------------------------------------------------------------------
+
+class WorkerPool:
+    """Start worker processes and hand out jobs until the queue is empty.
+
+    ``command(index, host, port, authkey)`` returns the argv used to start a
+    worker. Jobs are JSON serialisable dicts, they are passed to the worker
+    untouched and returned with its reply.
+
+    Workers are supervised: a job running longer than ``job_timeout`` seconds
+    or a worker growing past ``max_rss`` bytes while rendering gets the worker
+    killed, and a worker is restarted after ``recycle_after`` jobs or once it
+    reports more than ``recycle_rss`` bytes. A job is retried on another
+    worker until it failed ``max_attempts`` times, then it is quarantined in
+    ``errors`` and the run goes on. A worker only gets a job back it already
+    failed once no other worker is left. 0 or None turns a limit off.
+    """
+
+    def __init__(self, command, workers, startup_timeout=300.0, job_timeout=None,
+                 max_rss=None, recycle_after=None, recycle_rss=None, max_attempts=2):
+        self.command = command
+        self.workers = workers
+        self.startup_timeout = startup_timeout
+        self.job_timeout = job_timeout
+        self.max_rss = max_rss
+        self.recycle_after = recycle_after
+        self.recycle_rss = recycle_rss
+        self.max_attempts = max_attempts
+        self.stats = []
+        self.results = []
+        self.errors = []
+        self.remaining = []
+        self.restarts = 0
+        self._jobs = queue.Queue()
+        self._attempts = {}
+        # job key -> indexes of the workers it failed on
+        self._failed_on = {}
+        self._live = set()
+        self._lock = threading.Lock()
+        self._on_result = None
+        self._conns = {}
+
+    def run(self, jobs, on_result=None):
+        """Render all jobs, blocking until done. Returns the list of results."""
+        for job in jobs:
+            self._jobs.put(job)
+        self._on_result = on_result
+
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(self.workers)
+        listener.settimeout(0.5)
+        address = listener.getsockname()
+        authkey = secrets.token_hex(16)
+
+        threads = []
+        for index in range(self.workers):
+            self.stats.append(WorkerStats(index))
+            self._conns[index] = queue.Queue()
+            thread = threading.Thread(target=self._slot, args=(index, address, authkey), daemon=True)
+            thread.start()
+            threads.append(thread)
+
+        try:
+            # hand connections to the slot which started the worker
+            while any(thread.is_alive() for thread in threads):
+                try:
+                    sock, _ = listener.accept()
+                except socket.timeout:
+                    continue
+                sock.settimeout(None)
+                conn = Connection(sock)
+                try:
+                    hello = conn.recv()
+                except (OSError, EOFError, ValueError):
+                    conn.close()
+                    continue
+                if hello.get('authkey') != authkey or hello.get('worker') not in self._conns:
+                    conn.close()
+                    continue
+                self._conns[hello['worker']].put(conn)
+        finally:
+            listener.close()
+
+        while not self._jobs.empty():
+            self.remaining.append(self._jobs.get_nowait())
+        return self.results
+
+    def _slot(self, index, address, authkey):
+        """Keep one worker running while there are jobs, restarting it when needed"""
+        stats = self.stats[index]
+        with self._lock:
+            self._live.add(index)
+        try:
+            self._run_slot(index, address, authkey, stats)
+        finally:
+            with self._lock:
+                self._live.discard(index)
+        stats.finished = time.time()
+
+    def _run_slot(self, index, address, authkey, stats):
+        while not self._jobs.empty():
+            process = subprocess.Popen(self.command(index, address[0], address[1], authkey))
+            conn = self._wait_connection(index, process)
+            if conn is None:
+                # could not start, leave the jobs to the other workers
+                self._stop(process)
+                break
+            if stats.connected is None:
+                stats.connected = time.time()
+            try:
+                recycle = self._serve(conn, stats, process)
+            finally:
+                self._stop(process)
+            if not recycle:
+                break
+            with self._lock:
+                self.restarts += 1
+
+    def _wait_connection(self, index, process):
+        deadline = time.time() + self.startup_timeout
+        while time.time() < deadline:
+            try:
+                return self._conns[index].get(timeout=0.5)
+            except queue.Empty:
+                if process.poll() is not None:
+                    return None
+        return None
+
+    def _stop(self, process):
+        if process.poll() is None:
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+    def _recv(self, conn, process):
+        """Wait for the reply to a job, None once the job ran out of time or memory"""
+        start = time.time()
+        while not select.select([conn.sock], [], [], 1.0)[0]:
+            if process.poll() is not None:
+                raise EOFError("Worker exited")
+            if self.job_timeout and time.time() - start > self.job_timeout:
+                return None, 'timed out after %.0fs' % self.job_timeout
+            rss = process_rss(process.pid) if self.max_rss else None
+            if rss is not None and rss > self.max_rss:
+                return None, 'went over %d MB' % (self.max_rss // 2 ** 20)
+        return conn.recv(), None
+
+    def _take(self, index):
+        """Next job for worker index, None when the queue is empty.
+
+        Jobs the worker already failed are left to the live workers which have
+        not, it waits for them to be taken.
+        """
+        while True:
+            skipped = []
+            job = None
+            while True:
+                try:
+                    candidate = self._jobs.get_nowait()
+                except queue.Empty:
+                    break
+                with self._lock:
+                    failed_on = self._failed_on.get(json.dumps(candidate, sort_keys=True), set())
+                    others = bool(self._live - failed_on)
+                if index in failed_on and others:
+                    skipped.append(candidate)
+                    continue
+                job = candidate
+                break
+            for candidate in skipped:
+                self._jobs.put(candidate)
+            if job is not None or not skipped:
+                return job
+            time.sleep(0.5)
+
+    def _failed(self, job, message, index):
+        """Retry a failed job or quarantine it, returns the error reply"""
+        key = json.dumps(job, sort_keys=True)
+        with self._lock:
+            self._failed_on.setdefault(key, set()).add(index)
+            attempts = self._attempts[key] = self._attempts.get(key, 0) + 1
+        if attempts < self.max_attempts:
+            self._jobs.put(job)
+            return None
+        return {'type': 'error', 'job': job, 'message': message, 'attempts': attempts}
+
+    def _serve(self, conn, stats, process):
+        """Feed jobs to one worker process, returns True when it should be restarted"""
+        served = 0
+        try:
+            while True:
+                job = self._take(stats.index)
+                if job is None:
+                    break
+                start = time.time()
+                try:
+                    conn.send({'type': 'job', 'job': job})
+                    reply, problem = self._recv(conn, process)
+                except (OSError, EOFError, ValueError) as e:
+                    # the worker died, give the job to someone else
+                    reply, problem = None, 'worker died : %s' % (str(e) or 'connection closed')
+                stats.busy += time.time() - start
+
+                if reply is None:
+                    process.kill()
+                    reply = self._failed(job, problem, stats.index)
+                    if reply is not None:
+                        self._record(reply, stats)
+                    return True
+                if reply.get('type') != 'done':
+                    retried = self._failed(job, reply.get('message', 'failed'), stats.index)
+                    if retried is None:
+                        continue
+                    reply = retried
+                self._record(reply, stats)
+
+                served += 1
+                rss = reply.get('rss')
+                if ((self.recycle_after and served >= self.recycle_after)
+                        or (self.recycle_rss and rss and rss > self.recycle_rss)):
+                    if not self._jobs.empty():
+                        self._send_stop(conn)
+                        return True
+            self._send_stop(conn)
+            return False
+        finally:
+            conn.close()
+
+    def _send_stop(self, conn):
+        try:
+            conn.send({'type': 'stop'})
+        except OSError:
+            pass
+
+    def _record(self, reply, stats):
+        with self._lock:
+            if reply.get('type') == 'done':
+                stats.jobs += 1
+                self.results.append(reply)
+            else:
+                stats.failed += 1
+                self.errors.append(reply)
+            if self._on_result:
+                self._on_result(reply)
+
+    def report(self):
+        """Lines describing per worker throughput and idle time"""
+        lines = [str(s) for s in self.stats]
+        if self.restarts:
+            lines.append("%d worker restarts" % self.restarts)
+        if self.errors:
+            lines.append("%d jobs quarantined" % len(self.errors))
+        if self.remaining:
+            lines.append("%d jobs left unrendered" % len(self.remaining))
+        return lines
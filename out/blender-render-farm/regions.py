@@ -0,0 +1,84 @@
+"""Split a heavy job into horizontal bands rendered by separate workers.
+
+Each band is a region job, the parent job with a render border covering some
+rows of the image and its own output in .regions/. Once every band of a job
+has landed they are stacked back into one image with NumPy and written as the
+job's normal output, so nothing downstream knows the job was split.
+
+Bands are whole pixel rows, counted from the bottom like Blender's border.
+Blender keeps the border as float32 and truncates border x height to a row,
+so each edge is given as the middle of its row, and the stitched bands are
+placed by the rows Blender actually rendered.
+"""
+import os
+
+import numpy as np
+
+REGIONS_DIR = ".regions"
+
+
+def bands(height, count):
+    """[(first row, end row)] of count bands of about the same height, bottom first"""
+    count = max(1, min(count, height))
+    edges = [height * i // count for i in range(count + 1)]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def split(job, count, height, directory, ext):
+    """Region jobs covering job, with outputs in directory/REGIONS_DIR"""
+    name = os.path.basename(job['filepath'])
+    jobs = []
+    for index, (y0, y1) in enumerate(bands(height, count)):
+        filepath = os.path.join(directory, REGIONS_DIR, '%s.region%02d' % (name, index))
+        jobs.append(dict(job, filepath=filepath, output=filepath + ext,
+                         region=[index, count, y0, y1, height]))
+    return jobs
+
+
+def border(job):
+    """(min_y, max_y) render border of a region job"""
+    index, count, y0, y1, height = job['region']
+    return min(1.0, (y0 + 0.5) / height), min(1.0, (y1 + 0.5) / height)
+
+
+def border_row(value, height):
+    """Row Blender starts or ends a border of value at"""
+    return int(np.float32(value) * np.float32(height))
+
+
+def stitch(tiles, width, height):
+    """One (height, width, 4) image, bottom row first, from [(region job, pixels)]"""
+    image = np.zeros((height, width, 4), dtype=tiles[0][1].dtype)
+    for job, pixels in tiles:
+        y0 = min(border_row(border(job)[0], height), height)
+        rows = min(pixels.shape[0], height - y0)
+        image[y0:y0 + rows] = pixels[:rows, :width]
+    return image
+
+
+class Tracker:
+    """Collect the regions of split jobs until every band has landed"""
+
+    def __init__(self):
+        self.landed = {}
+
+    def add(self, job):
+        """Record a landed region, returns all regions of its job once complete"""
+        key = (job['object'], job['material'], job['camera'])
+        regions = self.landed.setdefault(key, [])
+        regions.append(job)
+        if len(regions) < job['region'][1]:
+            return None
+        del self.landed[key]
+        return sorted(regions, key=lambda j: j['region'][0])
+
+
+def parent(job):
+    """The job a region was split from"""
+    directory = os.path.dirname(os.path.dirname(job['filepath']))
+    name = os.path.basename(job['filepath']).rsplit('.region', 1)[0]
+    ext = job['output'][len(job['filepath']):]
+    filepath = os.path.join(directory, name)
+    result = dict(job, filepath=filepath, output=filepath + ext)
+    del result['region']
+    return result
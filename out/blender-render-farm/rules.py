@@ -0,0 +1,135 @@
+"""Rules which narrow the object x material x camera product to what is delivered.
+
+A rules file is a JSON object:
+
+    {
+        "groups": [
+            {"name": "coins", "objects": ["collection:Coins"], "materials": ["Gold", "Silver"],
+             "cameras": ["Front", "Back"]},
+            {"name": "bars", "objects": ["Bar_*"], "materials": ["Gold"], "cameras": ["Top"]}
+        ],
+        "include": [{"material": "Gold"}, {"object": "Coin_2022"}],
+        "exclude": [{"object": "Coin_2022", "material": "Silver"}, {"camera": "Top", "material": "Glass*"}]
+    }
+
+Each group is the product of its objects, materials and cameras, an axis left
+out takes every value of the add-on's lists (every camera of the scene).
+Names are shell patterns, "collection:Name" stands for the objects of a
+collection. Without groups the whole product is one group. When there are
+include rules a job has to match one of them, and it must not match any
+exclude rule. A rule matches a job when every axis it names matches.
+
+Objects and materials outside the add-on's lists are never rendered, values
+keep the order of the lists.
+"""
+import fnmatch
+import json
+
+try:
+    from . import planner
+except ImportError:
+    import planner
+
+AXES = planner.AXES
+COLLECTION_PREFIX = "collection:"
+
+
+class RulesError(ValueError):
+    pass
+
+
+def load(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise RulesError("Cannot read rules %s : %s" % (path, e))
+    return parse(data)
+
+
+def parse(data):
+    """Rules checked and with every pattern list normalised"""
+    if not isinstance(data, dict):
+        raise RulesError("Rules must be a JSON object")
+    unknown = sorted(set(data) - {'groups', 'include', 'exclude'})
+    if unknown:
+        raise RulesError("Unknown rules keys : %s" % ', '.join(unknown))
+
+    def patterns(value, where):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            return [value]
+        if isinstance(value, list) and all(isinstance(v, str) for v in value):
+            return value
+        raise RulesError("%s must be a name or a list of names" % where)
+
+    for key in ('groups', 'include', 'exclude'):
+        if not isinstance(data.get(key) or [], list):
+            raise RulesError("%s must be a list" % key)
+
+    rules = {'groups': [], 'include': [], 'exclude': []}
+    for i, group in enumerate(data.get('groups') or ()):
+        if not isinstance(group, dict):
+            raise RulesError("Group %d must be an object" % (i + 1))
+        unknown = sorted(set(group) - {'name'} - {axis + 's' for axis in AXES})
+        if unknown:
+            raise RulesError("Unknown group keys : %s" % ', '.join(unknown))
+        name = str(group.get('name', 'group %d' % (i + 1)))
+        rules['groups'].append(dict(
+            {axis: patterns(group.get(axis + 's'), '%s %ss' % (name, axis)) for axis in AXES}, name=name))
+    for kind in ('include', 'exclude'):
+        for rule in data.get(kind) or ():
+            if not isinstance(rule, dict) or not set(rule) <= set(AXES):
+                raise RulesError("%s rules name some of %s" % (kind, ', '.join(AXES)))
+            rules[kind].append({axis: patterns(rule[axis], kind) for axis in rule})
+    return rules
+
+
+def matches(name, patterns, collections):
+    for pattern in patterns:
+        if pattern.startswith(COLLECTION_PREFIX):
+            if name in collections.get(pattern[len(COLLECTION_PREFIX):], ()):
+                return True
+        elif fnmatch.fnmatchcase(name, pattern):
+            return True
+    return False
+
+
+def select(names, patterns, collections):
+    """Names matching patterns, all of them for None"""
+    if patterns is None:
+        return list(names)
+    return [name for name in names if matches(name, patterns, collections)]
+
+
+def collection_names(rules):
+    """Collections the rules refer to"""
+    names = set()
+    for rule in rules['groups'] + rules['include'] + rules['exclude']:
+        for axis in AXES:
+            for pattern in rule.get(axis) or ():
+                if pattern.startswith(COLLECTION_PREFIX):
+                    names.add(pattern[len(COLLECTION_PREFIX):])
+    return names
+
+
+def plan(rules, objects, materials, cameras, cost_model=None, collections=None):
+    """GroupedPlan of the jobs the rules allow, collections maps collection names to object names"""
+    collections = {name: set(members) for name, members in (collections or {}).items()}
+    values = {'object': objects, 'material': materials, 'camera': cameras}
+
+    groups = [tuple(select(values[axis], group[axis], collections) for axis in AXES)
+              for group in rules['groups']] or [(objects, materials, cameras)]
+
+    def rule_matches(rule, job):
+        return all(matches(getattr(job, axis), rule[axis], collections) for axis in rule)
+
+    def keep(job):
+        if rules['include'] and not any(rule_matches(rule, job) for rule in rules['include']):
+            return False
+        return not any(rule_matches(rule, job) for rule in rules['exclude'])
+
+    pruning = rules['include'] or rules['exclude']
+    full = len(objects) * len(materials) * len(cameras)
+    return planner.GroupedPlan(groups, keep if pruning else None, cost_model, full)
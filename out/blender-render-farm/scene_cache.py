@@ -0,0 +1,69 @@
+"""Caches of the scene's cameras and the file's materials.
+
+Panels read the camera and material lists on every redraw. Instead of walking
+every object and rebuilding the lists each time, the add-on keeps them here,
+marks them dirty from depsgraph, undo and load handlers, and re-checks the
+object count of the scene and the material names of the file to catch what
+the depsgraph does not report, a rename included. When something did change, the UI lists are
+updated with add/remove diffs instead of being cleared and rebuilt.
+
+Only names are cached, RNA references do not survive undo.
+"""
+
+
+class SceneCache:
+
+    def __init__(self):
+        self.invalidate()
+
+    def invalidate(self):
+        """Forget everything, after undo, redo or loading a file"""
+        # scene name -> (object count, camera names)
+        self.cameras = {}
+        # scene name -> camera names / material full names last synced to the UI lists
+        self.synced_cameras = {}
+        self.synced_materials = {}
+
+    def cameras_dirty(self):
+        self.cameras.clear()
+        self.synced_cameras.clear()
+
+    def materials_dirty(self):
+        self.synced_materials.clear()
+
+    def get_cameras(self, scene_name, object_count):
+        cached = self.cameras.get(scene_name)
+        if cached is not None and cached[0] == object_count:
+            return cached[1]
+        return None
+
+    def set_cameras(self, scene_name, object_count, names):
+        self.cameras[scene_name] = (object_count, names)
+
+
+def sync_collection(collection, wanted, attr):
+    """Make collection hold one item per name -> ID in wanted, with as few adds and removes as possible.
+
+    Returns (added, removed).
+    """
+    added = removed = 0
+    present = set()
+    for i in range(len(collection) - 1, -1, -1):
+        item = collection[i]
+        target = getattr(item, attr)
+        if target is None or item.name in present or wanted.get(item.name) != target:
+            collection.remove(i)
+            removed += 1
+        else:
+            present.add(item.name)
+    for name, target in wanted.items():
+        if name not in present:
+            item = collection.add()
+            item.name = name
+            setattr(item, attr, target)
+            added += 1
+    return added, removed
+
+
+# the add-on's cache
+cache = SceneCache()
@@ -0,0 +1,85 @@
+"""Job spec files for headless runs.
+
+A spec is a JSON object, every key optional except output:
+
+    {
+        "output": "/renders/coins",
+        "objects": ["Coin_2022", "Coin_2023"],
+        "materials": ["Gold", "Silver"],
+        "cameras": ["Front"],
+        "manifest": "catalogue.csv",
+        "settings": {"workers": 4, "resume": true, "order": "NESTED"},
+        "render": {"resolution_percentage": 50, "engine": "CYCLES"},
+        "cycles": {"samples": 64},
+        "shard": "1/4"
+    }
+
+objects and materials (and those of the manifest) replace the render lists of
+the .blend file, when neither is given the saved lists are rendered. cameras
+narrows the scene's cameras. settings are the add-on's render settings,
+render and cycles are set on scene.render and scene.cycles, a rules file
+(see rules.py) is given as settings.rules. shard renders one
+part of the plan (see shards.py), "i/N" is the i-th of N, counted from 1.
+
+Relative paths are relative to the spec file.
+"""
+import json
+import os
+
+KEYS = ('output', 'objects', 'materials', 'cameras', 'manifest',
+        'settings', 'render', 'cycles', 'shard')
+LISTS = ('objects', 'materials', 'cameras')
+SECTIONS = ('settings', 'render', 'cycles')
+
+
+class SpecError(ValueError):
+    pass
+
+
+def load(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise SpecError("Cannot read spec %s : %s" % (path, e))
+    return parse(data, os.path.dirname(os.path.abspath(path)))
+
+
+def parse(data, base='.'):
+    """Checked spec with defaults filled in and paths made absolute"""
+    if not isinstance(data, dict):
+        raise SpecError("Spec must be a JSON object")
+    unknown = sorted(set(data) - set(KEYS))
+    if unknown:
+        raise SpecError("Unknown spec keys : %s" % ', '.join(unknown))
+    if not data.get('output'):
+        raise SpecError("Spec has no output path")
+
+    spec = {key: data.get(key) for key in KEYS}
+    spec['output'] = os.path.join(base, spec['output'])
+    if spec['manifest']:
+        spec['manifest'] = os.path.join(base, spec['manifest'])
+    for key in LISTS:
+        if spec[key] is not None and not (isinstance(spec[key], list)
+                                          and all(isinstance(name, str) for name in spec[key])):
+            raise SpecError("%s must be a list of names" % key)
+    for key in SECTIONS:
+        spec[key] = spec[key] or {}
+        if not isinstance(spec[key], dict):
+            raise SpecError("%s must be an object" % key)
+    if spec['settings'].get('rules'):
+        spec['settings']['rules'] = os.path.join(base, spec['settings']['rules'])
+    spec['shard'] = parse_shard(spec['shard']) if spec['shard'] else None
+    return spec
+
+
+def parse_shard(text):
+    """(index, count) from "i/N", index counted from 0"""
+    try:
+        i, n = (int(part) for part in str(text).split('/'))
+    except ValueError:
+        raise SpecError("Shard must be i/N, e.g. 1/4 : %s" % text)
+    if not 1 <= i <= n:
+        raise SpecError("Shard %s out of range" % text)
+    return i - 1, n
+
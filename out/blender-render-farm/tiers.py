@@ -0,0 +1,41 @@
+"""Render tiers, a preview of the whole matrix before the final run.
+
+The preview tier renders the whole matrix at low resolution and sample count.
+
+Previews use the same plan as the final run and go to a preview/ folder next
+to the final images, with a contact sheet of all of them. Rejected variations
+are deleted from that folder (or unticked in the object and material lists),
+and the final run can then be limited to what is left.
+
+Render time grows about linearly with pixels and samples, so a preview costs
+about (scale / 100)^2 * samples / final samples of the final run.
+"""
+import os
+
+PREVIEW_DIR = "preview"
+
+
+def preview_dir(path):
+    return os.path.join(path, PREVIEW_DIR)
+
+
+def preview_samples(final, samples):
+    """Samples of the preview, never more than the final render"""
+    return max(1, min(final, samples))
+
+
+def cost_fraction(scale, final_samples, samples):
+    """Estimated preview render time as a fraction of the final render time"""
+    fraction = (scale / 100.0) ** 2
+    if final_samples:
+        fraction *= preview_samples(final_samples, samples) / final_samples
+    return fraction
+
+
+def approved(jobs, directory):
+    """Jobs whose preview is still in directory, any image format"""
+    try:
+        names = {os.path.splitext(name)[0] for name in os.listdir(directory)}
+    except OSError:
+        return []
+    return [job for job in jobs if os.path.basename(job['filepath']) in names]
@@ -0,0 +1,81 @@
+"""Encode a render plan into the timeline, one job per frame.
+
+Object visibility is keyframed (constant interpolation, a key only where it
+changes), cameras are bound to timeline markers and the material of every
+frame is applied by the add-on's frame change handler from a frame table stored
+in the scene. One call renders the whole matrix while the engine keeps its data
+warm:
+
+    blender -b render_farm_timeline.blend -a
+    blender -b render_farm_timeline.blend -s 1 -e 250 -a     (a frame range per machine)
+
+Written frames are renamed to the usual material_object_camera names as soon
+as they are written, so downstream tooling does not change.
+"""
+import json
+
+# scene custom property holding the frame table
+FRAMES_PROP = "render_farm_frames"
+TIMELINE_NAME = "render_farm_timeline.blend"
+FRAME_PREFIX = "render_farm_frame_"
+
+
+def frame_table(jobs, start=1):
+    """{frame: job} for jobs in plan order"""
+    return {start + i: job for i, job in enumerate(jobs)}
+
+
+def dumps(table):
+    return json.dumps({str(frame): [job['object'], job['material'], job['camera'], job['name']]
+                       for frame, job in table.items()})
+
+
+def loads(text):
+    table = {}
+    for frame, (obj, mat, cam, name) in json.loads(text).items():
+        table[int(frame)] = {'object': obj, 'material': mat, 'camera': cam, 'name': name}
+    return table
+
+
+def changes(table, key):
+    """[(frame, value)] for every frame where job[key] differs from the frame before"""
+    result = []
+    prev = None
+    for frame in sorted(table):
+        value = table[frame][key]
+        if value != prev:
+            result.append((frame, value))
+            prev = value
+    return result
+
+
+def visibility_keys(table, objects):
+    """{object: [(frame, hidden)]}, the keys needed to show each object only on its own frames"""
+    first = min(table)
+    keys = {name: [] for name in objects}
+    shown = None
+    for frame, obj in changes(table, 'object'):
+        if not keys[obj] and frame != first:
+            # hidden from the first frame until it is shown
+            keys[obj].append((first, True))
+        if shown is not None:
+            keys[shown].append((frame, True))
+        keys[obj].append((frame, False))
+        shown = obj
+    for name_keys in keys.values():
+        if not name_keys:
+            name_keys.append((first, True))
+    return keys
+
+
+def split_range(start, end, count):
+    """Contiguous frame ranges for count machines, so each keeps its data warm"""
+    total = end - start + 1
+    ranges = []
+    first = start
+    for i in range(count):
+        size = total // count + (1 if i < total % count else 0)
+        if size:
+            ranges.append((first, first + size - 1))
+        first += size
+    return ranges
@@ -0,0 +1,95 @@
+"""Visibility of the objects being rendered.
+
+Each object in the render list is shown together with its whole hierarchy, not
+only its direct children. The descendant sets are computed once, switching
+from one job's object to the next writes only the objects whose visibility
+changes, and only when the value actually differs, so every write is one RNA
+update less for the depsgraph.
+
+If an object's hierarchy lives in a collection of its own, the collection can
+be toggled instead, one write for the whole group.
+
+Works with any objects exposing name, children, hide_render and hide_viewport.
+"""
+
+
+def get_descendants(ob):
+    """All children of ob, grand children included"""
+    descendants = []
+    stack = list(ob.children)
+    while stack:
+        child = stack.pop()
+        descendants.append(child)
+        stack.extend(child.children)
+    return descendants
+
+
+def set_hidden(ob, hidden):
+    """Write the visibility of ob if it differs, returns the number of writes"""
+    writes = 0
+    if ob.hide_render != hidden:
+        ob.hide_render = hidden
+        writes += 1
+    if ob.hide_viewport != hidden:
+        ob.hide_viewport = hidden
+        writes += 1
+    return writes
+
+
+def own_collection(ob, group):
+    """A collection holding exactly the objects of group, if ob is in one"""
+    names = set(o.name for o in group)
+    for collection in getattr(ob, 'users_collection', ()):
+        if set(o.name for o in collection.all_objects) == names:
+            return collection
+    return None
+
+
+class VisibilityManager:
+    """Shows one render object (and its hierarchy) at a time"""
+
+    def __init__(self, objects, use_collections=False):
+        self.groups = {}
+        self.collections = {}
+        for ob in objects:
+            group = [ob] + get_descendants(ob)
+            self.groups[ob.name] = group
+            if use_collections:
+                collection = own_collection(ob, group)
+                if collection is not None:
+                    self.collections[ob.name] = collection
+        self.visible = None
+        self.ready = False
+        self.writes = 0
+
+    def _members(self, name):
+        """What is toggled for a group, its collection or its objects"""
+        if name in self.collections:
+            return [self.collections[name]]
+        return self.groups[name]
+
+    def hide_all(self):
+        """Hide every group, objects of collection groups are made visible inside their collection"""
+        for name, group in self.groups.items():
+            if name in self.collections:
+                for ob in group:
+                    self.writes += set_hidden(ob, False)
+            for member in self._members(name):
+                self.writes += set_hidden(member, True)
+        self.visible = None
+        self.ready = True
+
+    def show(self, name):
+        """Make the group of name the only one visible"""
+        if not self.ready:
+            self.hide_all()
+
+        members = self._members(name)
+        if self.visible is not None and self.visible != name:
+            shown = set(members)
+            for member in self._members(self.visible):
+                if member not in shown:
+                    self.writes += set_hidden(member, True)
+        for member in members:
+            self.writes += set_hidden(member, False)
+        self.visible = name
@@ -0,0 +1,175 @@
+"""Render job planner.
+
+Plans the order in which object x material x camera variations are rendered.
+Every change of object (visibility, BVH rebuild) or material (shader rebuild)
+between two jobs costs time, so the planner nests the axes with the most
+expensive change outermost and walks the inner axes back and forth, so that
+consecutive jobs share as much state as possible.
+
+Works on plain names, a plan can be printed, counted and benchmarked on its
+own:
+
+    >>> plan = Plan(['Cube', 'Cone'], ['Glass', 'Gold'], ['Camera'])
+    >>> len(plan)
+    4
+
+A GroupedPlan renders only part of the product: one product per group, pruned
+by a predicate, see rules.py.
+"""
+from collections import namedtuple
+
+AXES = ('object', 'material', 'camera')
+
+Job = namedtuple('Job', AXES)
+
+
+# -------------------------------------------------------------------
+#   Cost models
+# -------------------------------------------------------------------
+
+class CostModel:
+    """Relative cost of changing each axis between two consecutive jobs"""
+
+    def __init__(self, object=10.0, material=1.0, camera=0.1, serpentine=True):
+        self.costs = {'object': object, 'material': material, 'camera': camera}
+        self.serpentine = serpentine
+
+    def order(self):
+        """Axes from outermost to innermost loop"""
+        return sorted(AXES, key=lambda axis: -self.costs[axis])
+
+    def switch_cost(self, prev, job):
+        if prev is None:
+            return sum(self.costs.values())
+        return sum(self.costs[axis] for axis in AXES if getattr(prev, axis) != getattr(job, axis))
+
+
+# object > material > camera, the order the add-on always rendered in
+NESTED = CostModel(serpentine=False)
+
+DEFAULT = CostModel()
+
+COST_MODELS = {
+    'GROUPED': DEFAULT,
+    'NESTED': NESTED,
+}
+
+
+# -------------------------------------------------------------------
+#   Plan
+# -------------------------------------------------------------------
+
+class Plan:
+    """Lazy, ordered sequence of jobs"""
+
+    def __init__(self, objects, materials, cameras, cost_model=None):
+        self.values = {
+            'object': list(objects),
+            'material': list(materials),
+            'camera': list(cameras),
+        }
+        self.cost_model = cost_model or DEFAULT
+
+    def __len__(self):
+        count = 1
+        for values in self.values.values():
+            count *= len(values)
+        return count
+
+    def __iter__(self):
+        order = self.cost_model.order()
+        if not len(self):
+            return
+        yield from self._walk(order, {}, [False] * len(order))
+
+    def _walk(self, order, fixed, reverse):
+        depth = len(fixed)
+        axis = order[depth]
+        values = self.values[axis]
+        if reverse[depth]:
+            values = reversed(values)
+        for value in values:
+            fixed[axis] = value
+            if depth == len(order) - 1:
+                yield Job(**fixed)
+            else:
+                yield from self._walk(order, fixed, reverse)
+                if self.cost_model.serpentine:
+                    # walk the inner loop back the way it came, so the next
+                    # job keeps its current value
+                    reverse[depth + 1] = not reverse[depth + 1]
+        del fixed[axis]
+
+    def cost(self):
+        """Total switch cost of the plan under its cost model"""
+        total = 0.0
+        prev = None
+        for job in self:
+            total += self.cost_model.switch_cost(prev, job)
+            prev = job
+        return total
+
+    def switches(self):
+        """Number of changes per axis over the whole plan"""
+        counts = dict.fromkeys(AXES, 0)
+        prev = None
+        for job in self:
+            for axis in AXES:
+                if prev is None or getattr(prev, axis) != getattr(job, axis):
+                    counts[axis] += 1
+            prev = job
+        return counts
+
+    def __str__(self):
+        sizes = ' x '.join('%d %ss' % (len(self.values[a]), a) for a in AXES)
+        return 'Plan : %s = %d jobs, order %s' % (sizes, len(self), ' > '.join(self.cost_model.order()))
+
+    def format(self, limit=None):
+        lines = [str(self)]
+        for i, job in enumerate(self):
+            if limit is not None and i >= limit:
+                lines.append('... %d more' % (len(self) - limit))
+                break
+            lines.append('%5d  %s / %s / %s' % (i, job.object, job.material, job.camera))
+        return '\n'.join(lines)
+
+
+class GroupedPlan(Plan):
+    """Lazy sequence of the jobs of several smaller products, pruned by keep(job).
+
+    Each group is planned on its own and groups follow each other, a job
+    in more than one group is rendered once. ``full`` is the size of the
+    plain product of all values, to show what was pruned.
+    """
+
+    def __init__(self, groups, keep=None, cost_model=None, full=0):
+        self.groups = [Plan(objects, materials, cameras, cost_model) for objects, materials, cameras in groups]
+        self.keep = keep
+        self.cost_model = cost_model or DEFAULT
+        self.full = full
+        self.values = {axis: [] for axis in AXES}
+        for group in self.groups:
+            for axis in AXES:
+                self.values[axis] += [v for v in group.values[axis] if v not in self.values[axis]]
+        self._len = None
+
+    def __len__(self):
+        if self._len is None:
+            self._len = sum(1 for _ in self)
+        return self._len
+
+    def __iter__(self):
+        seen = set() if len(self.groups) > 1 else None
+        for group in self.groups:
+            for job in group:
+                if self.keep is not None and not self.keep(job):
+                    continue
+                if seen is not None:
+                    if job in seen:
+                        continue
+                    seen.add(job)
+                yield job
+
+    def __str__(self):
+        return 'Plan : %d groups, %d of %d jobs (%d pruned), order %s' % (
+            len(self.groups), len(self), self.full, self.full - len(self), ' > '.join(self.cost_model.order()))
@@ -0,0 +1,103 @@
+"""Progress of a running render queue: throughput, per job timings and ETA.
+
+The running queue operator keeps its Progress in
+``current`` so panels can draw it and the pause/cancel operators can reach it.
+"""
+import time
+
+# Progress of the render queue currently running, if any
+current = None
+
+
+def format_duration(seconds):
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return '%dh %02dm %02ds' % (hours, minutes, seconds)
+    if minutes:
+        return '%dm %02ds' % (minutes, seconds)
+    return '%ds' % seconds
+
+
+def percentile(values, p):
+    """Nearest rank percentile of values, p between 0 and 100"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+
+class Progress:
+
+    def __init__(self, total):
+        self.total = total
+        self.times = []
+        self.started = time.time()
+        self.paused = False
+        self.cancelled = False
+        self._paused_at = None
+        self._paused_total = 0.0
+
+    @property
+    def done(self):
+        return len(self.times)
+
+    @property
+    def remaining(self):
+        return self.total - self.done
+
+    def record(self, elapsed):
+        self.times.append(elapsed)
+
+    def pause(self):
+        if not self.paused:
+            self.paused = True
+            self._paused_at = time.time()
+
+    def resume(self):
+        if self.paused:
+            self.paused = False
+            self._paused_total += time.time() - self._paused_at
+            self._paused_at = None
+
+    def cancel(self):
+        self.cancelled = True
+
+    @property
+    def active(self):
+        """Wall clock seconds spent running, pauses excluded"""
+        now = self._paused_at if self.paused else time.time()
+        return now - self.started - self._paused_total
+
+    @property
+    def rate(self):
+        """Renders per minute"""
+        active = self.active
+        return 60.0 * self.done / active if active > 0 else 0.0
+
+    @property
+    def mean(self):
+        return sum(self.times) / len(self.times) if self.times else 0.0
+
+    @property
+    def p95(self):
+        return percentile(self.times, 95)
+
+    @property
+    def eta(self):
+        """Seconds until the queue is done at the current rate"""
+        if not self.done:
+            return None
+        return self.remaining * self.active / self.done
+
+    def lines(self):
+        lines = ['%d / %d rendered' % (self.done, self.total)]
+        if self.done:
+            lines.append('%.1f renders/min' % self.rate)
+            lines.append('Mean %.2fs, p95 %.2fs' % (self.mean, self.p95))
+            lines.append('ETA %s' % format_duration(self.eta))
+        if self.paused:
+            lines.append('Paused')
+        return lines
@@ -0,0 +1,204 @@
+"""Split a run across machines without a coordinator, and merge the results.
+
+Every machine opens the same .blend with the same output folder (shared or
+synced) and renders one shard:
+
+    blender -b scene.blend --python render_farm/cli.py -- --spec job.json --shard 1/3
+    blender -b scene.blend --python render_farm/cli.py -- --spec job.json --shard 2/3
+    ...
+
+Shards are contiguous runs of the plan, so each machine keeps its objects and
+materials warm, cut where the predicted cost (see history.py) is balanced, by
+count without history. The first shard to start writes the layout to
+render_farm_shards.json and the others read it, so all agree on the split even
+if the history changes while they run. The layout is recomputed when the plan
+or the shard count changes.
+
+Each shard writes render_farm_shard_<i>of<N>.json listing what it rendered.
+Merging checks that every job of the layout was rendered and is on disk,
+reports the missing ones and writes render_farm_manifest.json:
+
+    python shards.py merge /path/to/output
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+LAYOUT_NAME = "render_farm_shards.json"
+MANIFEST_NAME = "render_farm_manifest.json"
+SHARD_NAME = "render_farm_shard_%dof%d.json"
+
+
+def job_key(job):
+    return [job['object'], job['material'], job['camera']]
+
+
+def plan_key(jobs):
+    h = hashlib.sha1()
+    for job in jobs:
+        h.update(json.dumps(job_key(job)).encode('utf-8'))
+    return h.hexdigest()
+
+
+def partition(costs, count):
+    """End indexes of count contiguous parts of costs with about equal sums"""
+    total = float(sum(costs))
+    if total <= 0:
+        return [len(costs) * (i + 1) // count for i in range(count)]
+    ends = []
+    acc = 0.0
+    i = 0
+    for part in range(1, count + 1):
+        target = total * part / count
+        start = i
+        # every part takes at least one job and leaves one for every part still to come
+        limit = len(costs) - (count - part)
+        while i < limit and (i == start or acc + costs[i] / 2.0 <= target):
+            acc += costs[i]
+            i += 1
+        ends.append(i)
+    ends[-1] = len(costs)
+    return ends
+
+
+def _write_json(path, data):
+    tmp = '%s.%d.part' % (path, os.getpid())
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp, path)
+
+
+def layout(directory, jobs, count, cost=None):
+    """[[job key]] per shard, agreed on through the layout file of directory"""
+    path = os.path.join(directory, LAYOUT_NAME)
+    key = plan_key(jobs)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data['plan'] == key and len(data['shards']) == count:
+            return data['shards']
+    except (OSError, ValueError, KeyError):
+        pass
+
+    costs = [cost(job) for job in jobs] if cost else [1.0] * len(jobs)
+    ends = partition(costs, count)
+    shards = [[job_key(job) for job in jobs[start:end]] for start, end in zip([0] + ends[:-1], ends)]
+    data = {'plan': key, 'shards': shards,
+            'costs': [sum(costs[start:end]) for start, end in zip([0] + ends[:-1], ends)]}
+
+    # the first shard to get here wins, the others read what it wrote
+    tmp = '%s.%d.part' % (path, os.getpid())
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    try:
+        os.link(tmp, path)
+    except FileExistsError:
+        with open(path, 'r', encoding='utf-8') as f:
+            existing = json.load(f)
+        if existing.get('plan') == key and len(existing.get('shards', ())) == count:
+            shards = existing['shards']
+        else:
+            # a stale layout of another plan, replace it
+            os.replace(tmp, path)
+    except OSError:
+        # no hardlinks on this file system
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return shards
+
+
+def select(directory, jobs, index, count, cost=None):
+    """Jobs of shard index (from 0) of count"""
+    keys = {tuple(key) for key in layout(directory, jobs, count, cost)[index]}
+    return [job for job in jobs if tuple(job_key(job)) in keys]
+
+
+# -------------------------------------------------------------------
+#   Manifests
+# -------------------------------------------------------------------
+
+def _relative_derivatives(derived, directory):
+    if not derived:
+        return None
+    return dict(derived, files=[dict(f, path=os.path.relpath(f['path'], directory)) for f in derived['files']])
+
+
+def write_manifest(directory, index, count, records):
+    """Record what shard index rendered, records are journal records"""
+    entries = [{
+        'object': r['object'],
+        'material': r['material'],
+        'camera': r['camera'],
+        'output': os.path.relpath(r['output'], directory),
+        'size': r['size'],
+        'elapsed': r['elapsed'],
+        'derivatives': _relative_derivatives(r.get('derivatives'), directory),
+    } for r in records]
+    path = os.path.join(directory, SHARD_NAME % (index + 1, count))
+    _write_json(path, {'shard': [index + 1, count], 'jobs': entries})
+    return path
+
+
+def merge(directory):
+    """(manifest, {shard number: missing job keys}) of all shards in directory"""
+    with open(os.path.join(directory, LAYOUT_NAME), 'r', encoding='utf-8') as f:
+        shards = json.load(f)['shards']
+    count = len(shards)
+
+    rendered = {}
+    for i in range(count):
+        try:
+            with open(os.path.join(directory, SHARD_NAME % (i + 1, count)), 'r', encoding='utf-8') as f:
+                entries = json.load(f)['jobs']
+        except (OSError, ValueError, KeyError):
+            continue
+        for entry in entries:
+            if entry['size'] is None:
+                continue
+            try:
+                if os.path.getsize(os.path.join(directory, entry['output'])) != entry['size']:
+                    continue
+            except OSError:
+                continue
+            rendered[tuple(job_key(entry))] = dict(entry, shard=i + 1)
+
+    jobs = []
+    missing = {}
+    for i, keys in enumerate(shards):
+        for key in keys:
+            entry = rendered.get(tuple(key))
+            if entry is None:
+                missing.setdefault(i + 1, []).append(key)
+            else:
+                jobs.append(entry)
+    manifest = {'shards': count, 'complete': not missing, 'jobs': jobs}
+    return manifest, missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge the manifests of sharded runs")
+    parser.add_argument('command', choices=('merge',))
+    parser.add_argument('directory', help="Shared output folder of the shards")
+    args = parser.parse_args()
+
+    try:
+        manifest, missing = merge(args.directory)
+    except (OSError, ValueError, KeyError) as e:
+        print('No shard layout in %s : %s' % (args.directory, e), file=sys.stderr)
+        return 2
+    path = os.path.join(args.directory, MANIFEST_NAME)
+    _write_json(path, manifest)
+    print('%d jobs rendered, manifest ==> %s' % (len(manifest['jobs']), path))
+    for shard, keys in sorted(missing.items()):
+        print('Shard %d/%d missing %d : %s' % (shard, manifest['shards'], len(keys),
+                                               ', '.join('/'.join(k) for k in keys[:10])
+                                               + (' ...' if len(keys) > 10 else '')))
+    return 1 if missing else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,214 @@
+"""Content-addressed store of rendered images.
+
+Every finished render is hashed and kept once in .store/ under its digest, the
+usual material_object_camera name becomes a hardlink to that blob. Identical
+renders, a camera that cannot see the material change, an object whose
+material slot is hidden, then cost the disk (and a transfer tool that knows
+hardlinks) one file. Where hardlinks are not supported the named file is kept
+as is and only the entry is recorded.
+
+PNG files are hashed on their header and pixel data only, the text chunks
+Blender stamps into them (render time, date) differ between identical images.
+Other formats are hashed whole.
+
+Entries are appended to render_farm_store.jsonl, the duplicates report
+(render_farm_duplicates.txt) lists which axes made no difference:
+
+    python store.py /path/to/output
+"""
+import argparse
+import collections
+import hashlib
+import json
+import os
+import struct
+
+STORE_DIR = ".store"
+MANIFEST_NAME = "render_farm_store.jsonl"
+DUPLICATES_NAME = "render_farm_duplicates.txt"
+
+AXES = ('object', 'material', 'camera')
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# chunks which make up the image, everything else is metadata
+PNG_IMAGE_CHUNKS = (b'IHDR', b'PLTE', b'tRNS', b'IDAT')
+
+
+# -------------------------------------------------------------------
+#   Digest
+# -------------------------------------------------------------------
+
+def digest(path):
+    """sha256 of the image, of its header and pixel data for PNG files"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        signature = f.read(8)
+        if signature != PNG_SIGNATURE:
+            h.update(signature)
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+            return h.hexdigest()
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                break
+            length, kind = struct.unpack('>I4s', header)
+            if kind in PNG_IMAGE_CHUNKS:
+                h.update(kind)
+                h.update(f.read(length))
+                f.seek(4, os.SEEK_CUR)
+            else:
+                f.seek(length + 4, os.SEEK_CUR)
+            if kind == b'IEND':
+                break
+    return h.hexdigest()
+
+
+# -------------------------------------------------------------------
+#   Store
+# -------------------------------------------------------------------
+
+class Store:
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.blobs = os.path.join(directory, STORE_DIR)
+        self.path = os.path.join(directory, MANIFEST_NAME)
+        self.entries = load(self.path)
+
+    def blob_path(self, key, ext):
+        return os.path.join(self.blobs, key[:2], key + ext)
+
+    def release(self, paths):
+        """Unlink outputs shared with the store, so rendering over them cannot change the blob"""
+        released = 0
+        for path in paths:
+            try:
+                if os.stat(path).st_nlink > 1:
+                    os.remove(path)
+                    released += 1
+            except OSError:
+                pass
+        return released
+
+    def add(self, job):
+        """Move a finished output into the store and link its name back, returns the entry"""
+        output = job['output']
+        key = digest(output)
+        blob = self.blob_path(key, os.path.splitext(output)[1])
+        size = os.path.getsize(output)
+
+        linked = True
+        if not os.path.exists(blob):
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            try:
+                os.link(output, blob)
+            except OSError:
+                linked = False
+        elif not os.path.samefile(blob, output):
+            # link to a temporary name first, the output is never missing
+            tmp = output + '.link'
+            try:
+                os.link(blob, tmp)
+                os.replace(tmp, output)
+            except OSError:
+                linked = False
+
+        entry = {
+            'object': job['object'],
+            'material': job['material'],
+            'camera': job['camera'],
+            'output': os.path.basename(output),
+            'digest': key,
+            'size': size,
+            'linked': linked,
+        }
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + '\n')
+        self.entries[job_key(entry)] = entry
+        return entry
+
+    def write_report(self):
+        path = os.path.join(self.directory, DUPLICATES_NAME)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(format_report(self.entries.values()))
+        return path
+
+
+def job_key(job):
+    return (job['object'], job['material'], job['camera'])
+
+
+def load(path):
+    """Last entry of every job, keyed by (object, material, camera)"""
+    entries = {}
+    if not os.path.exists(path):
+        return entries
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            entries[job_key(entry)] = entry
+    return entries
+
+
+# -------------------------------------------------------------------
+#   Report
+# -------------------------------------------------------------------
+
+def duplicates(entries):
+    """Groups of two or more entries with the same digest"""
+    groups = collections.defaultdict(list)
+    for entry in entries:
+        groups[entry['digest']].append(entry)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def varying_axes(group):
+    """Axes whose value differs inside a group of identical renders"""
+    return tuple(a for a in AXES if len({entry[a] for entry in group}) > 1)
+
+
+def format_report(entries):
+    entries = list(entries)
+    groups = duplicates(entries)
+    unique = len({entry['digest'] for entry in entries})
+    saved = sum(group[0]['size'] * (len(group) - 1) for group in groups)
+    lines = ['%d images, %d unique, %d duplicates, %.1f MB saved' % (
+        len(entries), unique, len(entries) - unique, saved / 1e6)]
+    if not groups:
+        return lines[0] + '\n'
+
+    by_axes = collections.defaultdict(list)
+    for group in groups:
+        by_axes[varying_axes(group)].append(group)
+
+    lines.append('')
+    lines.append('Identical across')
+    for axes, axes_groups in sorted(by_axes.items(), key=lambda i: -len(i[1])):
+        count = sum(len(group) - 1 for group in axes_groups)
+        lines.append('  %-26s %6d groups %8d renders to skip' % (
+            ' x '.join(axes), len(axes_groups), count))
+
+    for axes, axes_groups in sorted(by_axes.items(), key=lambda i: -len(i[1])):
+        fixed = [a for a in AXES if a not in axes]
+        lines.append('')
+        lines.append('Same image for every %s' % ' x '.join(axes))
+        for group in sorted(axes_groups, key=lambda g: [g[0][a] for a in fixed]):
+            values = ', '.join('%s %s' % (a, group[0][a]) for a in fixed) or 'all'
+            lines.append('  %-50s %d : %s' % (
+                values, len(group), ', '.join(sorted('/'.join(e[a] for a in axes) for e in group))))
+    return '\n'.join(lines) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report identical renders in an output folder")
+    parser.add_argument('directory', help="Output folder of the run")
+    args = parser.parse_args()
+    print(format_report(load(os.path.join(args.directory, MANIFEST_NAME)).values()), end='')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import atlas
+
+
+class AtlasTest(unittest.TestCase):
+
+    def test_grid(self):
+        self.assertEqual(atlas.grid(1, 64, 64), (1, 1))
+        self.assertEqual(atlas.grid(9, 64, 64), (3, 3))
+        self.assertEqual(atlas.grid(8, 64, 64), (3, 3))
+        # wide cells stack in fewer columns
+        self.assertEqual(atlas.grid(4, 128, 32), (1, 4))
+        for count in range(1, 40):
+            columns, rows = atlas.grid(count, 100, 60)
+            self.assertGreaterEqual(columns * rows, count)
+            self.assertLess(columns * (rows - 1), count)
+
+    def test_offsets(self):
+        self.assertEqual(atlas.offsets(2, 2, 1.0, 2.0), [(-0.5, 1.0), (0.5, 1.0), (-0.5, -1.0), (0.5, -1.0)])
+        self.assertEqual(atlas.cell_extent(2.0, 'AUTO', 200, 100), (2.0, 1.0))
+        self.assertEqual(atlas.cell_extent(2.0, 'AUTO', 100, 200), (1.0, 2.0))
+
+    def test_slice_round_trip(self):
+        columns, rows, width, height = 3, 2, 5, 4
+        cells = np.random.default_rng(0).integers(0, 256, (columns * rows, height, width, 4), dtype=np.uint8)
+        # lay out the cells row by row from the top left, with a spare border the atlas rounding left
+        pixels = np.zeros((rows * height + 1, columns * width + 2, 4), dtype=np.uint8)
+        for index, cell in enumerate(cells):
+            row, column = divmod(index, columns)
+            pixels[row * height:(row + 1) * height, column * width:(column + 1) * width] = cell
+        np.testing.assert_array_equal(atlas.slice_cells(pixels, columns, rows, width, height), cells)
+
+    def test_batches(self):
+        jobs = [('a', 1), ('b', 1), ('c', None), ('d', 2), ('e', 1), ('f', 1)]
+        batches = list(atlas.batches(jobs, 2, lambda job: job[1]))
+        self.assertEqual([[job[0] for job in batch] for batch in batches], [['a', 'b'], ['c'], ['e', 'f'], ['d']])
+        self.assertEqual(len(list(atlas.batches(jobs, 1, lambda job: job[1]))), len(jobs))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import coordinator
+
+
+class CoordinatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.server = coordinator.make_server(coordinator.Coordinator(self.tmp.name), 'secret', port=0)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = 'http://127.0.0.1:%d' % self.server.server_address[1]
+        self.client = coordinator.Client(self.url, 'secret')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def test_token(self):
+        with self.assertRaises(PermissionError):
+            coordinator.Client(self.url, 'wrong').status()
+        self.assertEqual(self.client.status()['pending'], 0)
+
+    def test_malformed_requests(self):
+        for path, body in (('/renew', {}), ('/fail', {}), ('/jobs', {}), ('/jobs', {'jobs': 1}), ('/lease', [])):
+            status, reply = self.client.request('POST', path, body)
+            self.assertEqual(status, 400, path)
+            self.assertIn('error', reply)
+
+    def test_output_names(self):
+        for output in ('render_farm_journal.jsonl', '../.bashrc', 'a/b/notes.txt', 'plain'):
+            with self.assertRaises(ValueError):
+                self.client.submit([{'filepath': 'x', 'output': output}])
+        job = {'object': 'Cube', 'material': 'Red', 'camera': 'Camera', 'filepath': 'a', 'output': '/tmp/a.png'}
+        self.assertEqual(self.client.submit([job]), 1)
+        lease_id, job = self.client.lease('test')
+        self.assertEqual(job['output'], os.path.join(self.tmp.name, 'a.png'))
+
+    def test_failed_write_requeues(self):
+        job = {'object': 'Cube', 'material': 'Red', 'camera': 'Camera', 'filepath': 'a',
+               'output': '/tmp/a.png'}
+        self.client.submit([job])
+        lease_id, job = self.client.lease('test')
+        # a folder in the way of the temporary file, as unwritable as a full disk
+        os.mkdir(job['output'] + '.part')
+        status, reply = self.client.request('PUT', '/results/' + lease_id, data=b'image')
+        self.assertEqual(status, 500)
+        self.assertIn('error', reply)
+        self.assertEqual(self.client.status()['pending'], 1)
+        self.assertEqual(self.client.lease('test')[1], job)
+
+
+if __name__ == '__main__':
+    unittest.main()
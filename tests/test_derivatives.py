@@ -0,0 +1,84 @@
+import os
+import struct
+import sys
+import tempfile
+import unittest
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import derivatives
+import encoder
+
+
+def chunk(kind, body):
+    return struct.pack('>I', len(body)) + kind + body + struct.pack('>I', zlib.crc32(kind + body))
+
+
+def paeth_png(pixels):
+    """RGB PNG of pixels, every row Paeth filtered, the filter Blender's writer picks most"""
+    height, width = pixels.shape[:2]
+    data = pixels.astype(np.int16)
+    padded = np.zeros((height + 1, width + 1, 3), dtype=np.int16)
+    padded[1:, 1:] = data
+    a, b, c = padded[1:, :-1], padded[:-1, 1:], padded[:-1, :-1]
+    p = a + b - c
+    pa, pb, pc = np.abs(p - a), np.abs(p - b), np.abs(p - c)
+    predicted = np.where((pa <= pb) & (pa <= pc), a, np.where(pb <= pc, b, c))
+    rows = ((data - predicted) & 255).astype(np.uint8).reshape(height, width * 3)
+    raw = np.hstack([np.full((height, 1), 4, dtype=np.uint8), rows])
+    return (derivatives.PNG_SIGNATURE + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw.tobytes())) + chunk(b'IEND', b''))
+
+
+class DerivativesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pixels = np.random.default_rng(0).integers(0, 256, (7, 9, 4), dtype=np.uint8)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_read_png(self):
+        path = os.path.join(self.tmp.name, 'up.png')
+        encoder.write_png(path, 9, 7, (self.pixels[:3], self.pixels[3:]))
+        np.testing.assert_array_equal(derivatives.read_png(path), self.pixels)
+
+        path = os.path.join(self.tmp.name, 'paeth.png')
+        with open(path, 'wb') as f:
+            f.write(paeth_png(self.pixels[..., :3]))
+        image = derivatives.read_png(path)
+        np.testing.assert_array_equal(image[..., :3], self.pixels[..., :3])
+        self.assertTrue((image[..., 3] == 255).all())
+
+    def test_trim(self):
+        pixels = np.zeros((10, 12, 4), dtype=np.uint8)
+        pixels[3:5, 4:9, 3] = 255
+        trimmed, box = derivatives.trim(pixels)
+        self.assertEqual((trimmed.shape[:2], box), ((2, 5), [4, 3, 9, 5]))
+        trimmed, box = derivatives.trim(pixels, margin=4)
+        self.assertEqual(box, [0, 0, 12, 9])
+        empty = np.zeros((4, 4, 4), dtype=np.uint8)
+        self.assertEqual(derivatives.trim(empty)[1], [0, 0, 4, 4])
+
+    def test_resize(self):
+        self.assertIs(derivatives.resize(self.pixels, 16), self.pixels)
+        self.assertEqual(derivatives.resize(np.zeros((100, 40, 4), dtype=np.uint8), 10).shape, (10, 4, 4))
+
+        # half transparent checker edge, premultiplied so the red does not darken
+        pixels = np.zeros((2, 2, 4), dtype=np.uint8)
+        pixels[0] = (255, 0, 0, 255)
+        np.testing.assert_array_equal(derivatives.resize(pixels, 1), [[[255, 0, 0, 128]]])
+
+    def test_parse_sizes(self):
+        self.assertEqual(derivatives.parse_sizes('thumb:256, full'), [('thumb', 256), ('full', None)])
+        for text in ('', 'thumb:0', 'thumb:big', '../up:10'):
+            with self.assertRaises(ValueError):
+                derivatives.parse_sizes(text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import hashlib
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import fingerprint
+
+
+class Prop:
+
+    def __init__(self, identifier, type):
+        self.identifier = identifier
+        self.type = type
+
+
+class Struct:
+    """RNA struct with the given properties, nested Structs are POINTER properties"""
+
+    def __init__(self, **values):
+        self.__dict__.update(values)
+        self.bl_rna = Struct.__new__(Struct)
+        self.bl_rna.properties = [Prop(k, 'POINTER' if isinstance(v, Struct) else 'FLOAT')
+                                  for k, v in values.items()]
+
+
+class Items:
+    """Mesh element collection read with foreach_get"""
+
+    def __init__(self, **arrays):
+        self.arrays = arrays
+
+    def __len__(self):
+        return len(next(iter(self.arrays.values())))
+
+    def foreach_get(self, attr, array):
+        array[:] = np.ravel(self.arrays[attr])
+
+
+def digest(struct, skip=fingerprint.SKIP):
+    h = hashlib.sha1()
+    fingerprint.Fingerprinter().rna(h, struct, skip=skip)
+    return h.hexdigest()
+
+
+def mesh_digest(mesh):
+    h = hashlib.sha1()
+    fingerprint.Fingerprinter().mesh(h, mesh)
+    return h.hexdigest()
+
+
+class RnaTest(unittest.TestCase):
+
+    def test_nested_settings(self):
+        camera = Struct(lens=50.0, dof=Struct(use_dof=1.0, aperture_fstop=2.8))
+        before = digest(camera)
+        camera.dof.aperture_fstop = 1.4
+        self.assertNotEqual(digest(camera), before)
+
+    def test_modifier_width(self):
+        bevel = Struct(width=0.1, segments=1.0)
+        before = digest(bevel)
+        bevel.width = 0.2
+        self.assertNotEqual(digest(bevel), before)
+
+    def test_node_layout(self):
+        node = Struct(width=140.0, location=0.0, blend=0.5)
+        before = digest(node, fingerprint.NODE_SKIP)
+        node.width = 200.0
+        node.location = 10.0
+        self.assertEqual(digest(node, fingerprint.NODE_SKIP), before)
+        node.blend = 1.0
+        self.assertNotEqual(digest(node, fingerprint.NODE_SKIP), before)
+
+    def test_mesh_shading_and_material_slots(self):
+        mesh = Struct(auto_smooth_angle=0.5)
+        mesh.vertices = Items(co=np.zeros((4, 3)))
+        mesh.loops = Items(vertex_index=[0, 1, 2, 3])
+        mesh.polygons = Items(loop_total=[4], material_index=[0], use_smooth=[False])
+        mesh.uv_layers = []
+        before = mesh_digest(mesh)
+        mesh.polygons.arrays['use_smooth'] = [True]
+        smooth = mesh_digest(mesh)
+        mesh.polygons.arrays['material_index'] = [1]
+        self.assertEqual(len({before, smooth, mesh_digest(mesh)}), 3)
+
+    def test_depth_guard(self):
+        struct = Struct(value=1.0)
+        for _ in range(fingerprint.MAX_DEPTH + 1):
+            struct = Struct(value=1.0, nested=struct)
+        deepest = struct
+        for _ in range(fingerprint.MAX_DEPTH + 1):
+            deepest = deepest.nested
+        before = digest(struct)
+        deepest.value = 2.0
+        self.assertEqual(digest(struct), before)
+
+
+if __name__ == '__main__':
+    unittest.main()
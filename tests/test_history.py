@@ -0,0 +1,28 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import history
+
+
+def record(obj, mat, total, settings='a'):
+    return {'object': obj, 'material': mat, 'camera': 'Camera', 'total': total, 'size': 1000, 'settings': settings}
+
+
+class HistoryTest(unittest.TestCase):
+
+    def test_other_settings_do_not_predict(self):
+        records = [record('Cube', 'Gold', 10.0, settings='b')]
+        self.assertEqual(history.matching(records, 'a'), [])
+        self.assertIsNone(history.estimate([record('Cube', 'Gold', None)], history.matching(records, 'a')))
+
+    def test_additive_prediction(self):
+        records = [record('Cube', 'Gold', 1.0), record('Cube', 'Glass', 5.0), record('Cone', 'Gold', 2.0)]
+        times = history.fit(history.matching(records, 'a'))[0]
+        self.assertAlmostEqual(times.predict(record('Cone', 'Glass', None)), 6.0, places=3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import journal
+
+
+class JournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+        self.journal = journal.Journal(self.dir)
+        self.jobs = [{'object': 'Cube', 'material': mat, 'camera': 'Camera', 'inputs': 'v1',
+                      'output': os.path.join(self.dir, '%s_Cube_Camera.png' % mat)}
+                     for mat in ('Gold', 'Silver', 'Glass', 'Wood')]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def render(self, job, data=b'image'):
+        with open(job['output'], 'wb') as f:
+            f.write(data)
+        self.journal.append(job, 1.0)
+
+    def test_resumes_unfinished_jobs(self):
+        gold, silver, glass, wood = self.jobs
+        for job in (gold, silver, glass):
+            self.render(job)
+        # silver was overwritten by a half written file, glass deleted
+        with open(silver['output'], 'wb') as f:
+            f.write(b'ima')
+        os.remove(glass['output'])
+        # and the crash cut the last line
+        with open(self.journal.path, 'a', encoding='utf-8') as f:
+            f.write('{"object": "Cube", "mat')
+
+        self.assertEqual(self.journal.pending(self.jobs), [silver, glass, wood])
+
+    def test_changed_inputs_and_outputs(self):
+        gold = self.jobs[0]
+        self.render(gold)
+        self.assertEqual(self.journal.pending([gold]), [])
+        self.assertEqual(self.journal.pending([dict(gold, inputs='v2')]), [dict(gold, inputs='v2')])
+        # without a fingerprint the recorded image is kept
+        self.assertEqual(self.journal.pending([dict(gold, inputs=None)]), [])
+        moved = dict(gold, output=os.path.join(self.dir, 'other.png'))
+        self.assertEqual(self.journal.pending([moved]), [moved])
+
+    def test_last_record_wins(self):
+        gold = self.jobs[0]
+        self.render(gold)
+        self.render(dict(gold, inputs='v2'), b'new image')
+        self.assertEqual(self.journal.load()[journal.job_key(gold)]['size'], len(b'new image'))
+        self.assertEqual(self.journal.pending([dict(gold, inputs='v2')]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import manifest
+
+
+class ManifestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, text):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def test_csv(self):
+        path = self.write('catalogue.csv', 'Object, Material,camera\n'
+                                           'Coin_2022,Gold,Front\n'
+                                           'Coin_2023, Silver ,\n'
+                                           'Coin_2022,Gold,Back\n')
+        loaded = manifest.load(path)
+        self.assertEqual(loaded.objects, ['Coin_2022', 'Coin_2023'])
+        self.assertEqual(loaded.materials, ['Gold', 'Silver'])
+        self.assertEqual(loaded.cameras, ['Front', 'Back'])
+        self.assertEqual(len(loaded), 6)
+
+    def test_json(self):
+        lists = self.write('lists.json', json.dumps({'objects': ['Coin_2022', 'Coin_2022'], 'materials': ['Gold']}))
+        rows = self.write('rows.json', json.dumps([{'object': 'Coin_2022', 'material': 'Gold'},
+                                                   {'camera': 'Front'}]))
+        self.assertEqual((manifest.load(lists).objects, manifest.load(lists).cameras), (['Coin_2022'], []))
+        self.assertEqual(manifest.load(rows).cameras, ['Front'])
+
+    def test_unknown_names(self):
+        index = {'Gold': 'MA_Gold', 'Silver': 'MA_Silver'}
+        self.assertEqual(manifest.resolve(['Silver', 'Bronze', 'Gold', 'Tin'], index),
+                         (['MA_Silver', 'MA_Gold'], ['Bronze', 'Tin']))
+
+    def test_bad_file(self):
+        with self.assertRaises(ValueError):
+            manifest.load(self.write('broken.json', '{"objects": ['))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import itertools
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import planner
+
+OBJECTS = ['Cube', 'Cone', 'Torus']
+MATERIALS = ['Gold', 'Glass', 'Wood', 'Steel']
+CAMERAS = ['Front', 'Side']
+
+
+class PlanTest(unittest.TestCase):
+
+    def test_covers_product_once(self):
+        for model in planner.COST_MODELS.values():
+            jobs = list(planner.Plan(OBJECTS, MATERIALS, CAMERAS, model))
+            self.assertEqual(sorted(jobs), sorted(planner.Job(*job) for job in
+                                                  itertools.product(OBJECTS, MATERIALS, CAMERAS)))
+
+    def test_serpentine_changes_one_axis_per_job(self):
+        plan = planner.Plan(OBJECTS, MATERIALS, CAMERAS)
+        jobs = list(plan)
+        for prev, job in zip(jobs, jobs[1:]):
+            self.assertEqual(sum(getattr(prev, axis) != getattr(job, axis) for axis in planner.AXES), 1)
+        self.assertEqual(plan.switches(), {'object': 3, 'material': 3 * 3 + 1, 'camera': 3 * 4 + 1})
+        self.assertLess(plan.cost(), planner.Plan(OBJECTS, MATERIALS, CAMERAS, planner.NESTED).cost())
+
+    def test_nested_order(self):
+        jobs = list(planner.Plan(OBJECTS, MATERIALS, CAMERAS, planner.NESTED))
+        self.assertEqual(jobs[:3], [('Cube', 'Gold', 'Front'), ('Cube', 'Gold', 'Side'), ('Cube', 'Glass', 'Front')])
+
+    def test_count_and_print_without_bpy(self):
+        plan = planner.Plan(OBJECTS, MATERIALS, CAMERAS)
+        self.assertEqual(len(plan), 24)
+        self.assertNotIn('bpy', sys.modules)
+        text = plan.format(limit=2)
+        self.assertTrue(text.startswith('Plan : 3 objects x 4 materials x 2 cameras = 24 jobs'))
+        self.assertTrue(text.endswith('... 22 more'))
+        self.assertEqual(len(planner.Plan([], MATERIALS, CAMERAS)), 0)
+        self.assertEqual(list(planner.Plan([], MATERIALS, CAMERAS)), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
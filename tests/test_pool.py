@@ -0,0 +1,53 @@
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pool
+
+# renders by echoing the job back, fails the jobs naming its index, worker 0 starts first
+WORKER = '''
+import sys
+import time
+sys.path.insert(0, %r)
+import pool
+host, port, authkey, index = sys.argv[1], int(sys.argv[2]), sys.argv[3], int(sys.argv[4])
+time.sleep(index)
+conn = pool.connect(host, port, authkey, index)
+while True:
+    message = conn.recv()
+    if message['type'] == 'stop':
+        break
+    job = message['job']
+    if index in job['fail_on']:
+        conn.send({'type': 'error', 'job': job, 'message': 'failed on %%d' %% index})
+    else:
+        conn.send({'type': 'done', 'job': job, 'elapsed': 0.0, 'worker': index})
+''' % ROOT
+
+
+def command(index, host, port, authkey):
+    return [sys.executable, '-c', WORKER, host, str(port), authkey, str(index)]
+
+
+class PoolTest(unittest.TestCase):
+
+    def test_retried_on_another_worker(self):
+        jobs = [{'name': 'a', 'fail_on': [0]}, {'name': 'b', 'fail_on': []}]
+        workers = pool.WorkerPool(command, 2, max_attempts=2)
+        results = workers.run(jobs)
+        self.assertEqual(sorted(r['job']['name'] for r in results), ['a', 'b'])
+        for result in results:
+            self.assertNotIn(result['worker'], result['job']['fail_on'])
+        self.assertEqual(workers.errors, [])
+
+    def test_single_worker_retries_itself(self):
+        workers = pool.WorkerPool(command, 1, max_attempts=2)
+        workers.run([{'name': 'a', 'fail_on': [0]}])
+        self.assertEqual([e['attempts'] for e in workers.errors], [2])
+
+
+if __name__ == '__main__':
+    unittest.main()
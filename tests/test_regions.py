@@ -0,0 +1,40 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import regions
+
+HEIGHTS = (240, 480, 540, 576, 600, 720, 768, 800, 1024, 1080, 1200, 1440, 1536, 1600, 2048, 2160, 4320)
+
+
+class BorderTest(unittest.TestCase):
+
+    def test_borders_land_on_band_edges(self):
+        for height in HEIGHTS:
+            for count in range(2, 17):
+                for job in regions.split({'filepath': '/out/a'}, count, height, '/out', '.png'):
+                    y0, y1 = job['region'][2:4]
+                    min_y, max_y = regions.border(job)
+                    self.assertEqual((regions.border_row(min_y, height), regions.border_row(max_y, height)),
+                                     (y0, y1), '%d rows, %d bands' % (height, count))
+
+    def test_stitch(self):
+        height, width = 720, 4
+        image = np.arange(height, dtype=np.float32)[:, None, None] * np.ones((1, width, 4), np.float32)
+        tiles = [(job, image[job['region'][2]:job['region'][3]])
+                 for job in regions.split({'filepath': '/out/a'}, 7, height, '/out', '.png')]
+        np.testing.assert_array_equal(regions.stitch(tiles, width, height), image)
+
+    def test_stitch_short_band(self):
+        height, width = 720, 2
+        jobs = regions.split({'filepath': '/out/a'}, 7, height, '/out', '.png')
+        tiles = [(job, np.ones((job['region'][3] - job['region'][2] - 1, width, 4))) for job in jobs]
+        self.assertEqual(regions.stitch(tiles, width, height).shape, (height, width, 4))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rules
+
+OBJECTS = ['Coin_2021', 'Coin_2022', 'Bar_1', 'Bar_2']
+MATERIALS = ['Gold', 'Silver', 'Glass_Clear']
+CAMERAS = ['Front', 'Back', 'Top']
+COLLECTIONS = {'Coins': ['Coin_2021', 'Coin_2022']}
+
+EXAMPLE = {
+    'groups': [
+        {'name': 'coins', 'objects': ['collection:Coins'], 'materials': ['Gold', 'Silver'],
+         'cameras': ['Front', 'Back']},
+        {'name': 'bars', 'objects': 'Bar_*', 'materials': ['Gold', 'Glass*'], 'cameras': ['Top']},
+    ],
+    'exclude': [{'object': 'Coin_2022', 'material': 'Silver'}, {'camera': 'Top', 'material': 'Glass*'}],
+}
+
+
+def plan(data):
+    return rules.plan(rules.parse(data), OBJECTS, MATERIALS, CAMERAS, collections=COLLECTIONS)
+
+
+class ParseTest(unittest.TestCase):
+
+    def test_valid(self):
+        parsed = rules.parse(EXAMPLE)
+        self.assertEqual([g['name'] for g in parsed['groups']], ['coins', 'bars'])
+        self.assertEqual(parsed['groups'][1]['object'], ['Bar_*'])
+        self.assertIsNone(rules.parse({'groups': [{'objects': ['Bar_*']}]})['groups'][0]['camera'])
+        self.assertEqual(rules.collection_names(parsed), {'Coins'})
+
+    def test_malformed(self):
+        for data in ([], {'group': []}, {'groups': {}}, {'groups': ['coins']},
+                     {'groups': [{'objects': 'Coin*', 'lights': ['Sun']}]},
+                     {'groups': [{'materials': [1]}]}, {'include': [{'light': 'Sun'}]},
+                     {'exclude': 'Gold'}):
+            with self.assertRaises(rules.RulesError, msg=repr(data)):
+                rules.parse(data)
+
+    def test_load(self):
+        with tempfile.TemporaryDirectory() as path:
+            good = os.path.join(path, 'rules.json')
+            with open(good, 'w', encoding='utf-8') as f:
+                json.dump(EXAMPLE, f)
+            self.assertEqual(len(rules.load(good)['groups']), 2)
+            bad = os.path.join(path, 'bad.json')
+            with open(bad, 'w', encoding='utf-8') as f:
+                f.write('{"groups": [')
+            for path in (bad, os.path.join(path, 'missing.json')):
+                with self.assertRaises(rules.RulesError):
+                    rules.load(path)
+
+
+class PlanTest(unittest.TestCase):
+
+    def test_pruned_count(self):
+        result = plan(EXAMPLE)
+        # coins: 2 x 2 x 2 less Coin_2022 in Silver (2), bars: 2 x 2 x 1 less Glass from Top (2)
+        self.assertEqual(len(result), 6 + 2)
+        self.assertEqual(result.full, 4 * 3 * 3)
+        self.assertNotIn(('Coin_2022', 'Silver', 'Front'), list(result))
+
+    def test_include(self):
+        result = plan({'include': [{'material': 'Gold'}, {'object': 'Bar_1'}]})
+        self.assertEqual(len(result), 4 * 3 + 2 * 3)
+
+    def test_overlapping_groups_render_once(self):
+        result = plan({'groups': [{'objects': 'Coin_*'}, {'materials': 'Gold'}]})
+        jobs = list(result)
+        self.assertEqual(len(jobs), len(set(jobs)))
+        self.assertEqual(len(result), 2 * 3 * 3 + 2 * 3)
+
+    def test_without_rules(self):
+        self.assertEqual(len(plan({})), 4 * 3 * 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import itertools
+import os
+import random
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import shards
+
+
+def make_jobs(directory, objects=5, materials=4, cameras=3):
+    return [{'object': 'OB%d' % o, 'material': 'MA%d' % m, 'camera': 'CA%d' % c,
+             'output': os.path.join(directory, 'MA%d_OB%d_CA%d.png' % (m, o, c))}
+            for o, m, c in itertools.product(range(objects), range(materials), range(cameras))]
+
+
+def render(job):
+    with open(job['output'], 'wb') as f:
+        f.write(b'x' * 10)
+    return {'object': job['object'], 'material': job['material'], 'camera': job['camera'],
+            'output': job['output'], 'size': 10, 'elapsed': 1.0}
+
+
+class PartitionTest(unittest.TestCase):
+
+    def test_contiguous_and_balanced(self):
+        rng = random.Random(1)
+        for length in (1, 2, 7, 60):
+            costs = [rng.uniform(0.1, 10.0) for _ in range(length)]
+            for count in range(1, min(length, 8) + 1):
+                ends = shards.partition(costs, count)
+                self.assertEqual(len(ends), count)
+                self.assertEqual(ends[-1], length)
+                self.assertTrue(all(a < b for a, b in zip([0] + ends, ends)), ends)
+        self.assertEqual(shards.partition([1.0, 1.0, 1.0, 1.0, 4.0], 2), [4, 5])
+        self.assertEqual(shards.partition([0.0] * 6, 3), [2, 4, 6])
+
+
+class LayoutTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+        self.jobs = make_jobs(self.dir)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_shards_cover_plan_once(self):
+        for count in (1, 2, 3, 7):
+            selected = [shards.select(self.dir, self.jobs, i, count, cost=lambda job: len(job['material']))
+                        for i in range(count)]
+            keys = [shards.job_key(job) for part in selected for job in part]
+            self.assertEqual(sorted(keys), sorted(shards.job_key(job) for job in self.jobs), count)
+            self.assertEqual(len(keys), len(set(map(tuple, keys))))
+
+    def test_layout_agreed_on(self):
+        first = shards.layout(self.dir, self.jobs, 3)
+        # a later shard with other costs reads the layout the first one wrote
+        self.assertEqual(shards.layout(self.dir, self.jobs, 3, cost=lambda job: 5.0), first)
+        # and a changed plan is laid out again
+        self.assertEqual(sum(map(len, shards.layout(self.dir, self.jobs[:-1], 3))), len(self.jobs) - 1)
+
+    def test_merge_partial(self):
+        count = 3
+        for i in range(count):
+            part = shards.select(self.dir, self.jobs, i, count)
+            if i == 1:
+                # shard 2 rendered all but its last job
+                part = part[:-1]
+            shards.write_manifest(self.dir, i, count, [render(job) for job in part])
+        manifest, missing = shards.merge(self.dir)
+
+        self.assertFalse(manifest['complete'])
+        self.assertEqual(list(missing), [2])
+        self.assertEqual(len(missing[2]), 1)
+        self.assertEqual(len(manifest['jobs']), len(self.jobs) - 1)
+        # in plan order, whatever order the shards finished in
+        done = [shards.job_key(job) for job in self.jobs if shards.job_key(job) != missing[2][0]]
+        self.assertEqual([shards.job_key(entry) for entry in manifest['jobs']], done)
+        self.assertEqual([entry['shard'] for entry in manifest['jobs']],
+                         sorted(entry['shard'] for entry in manifest['jobs']))
+
+    def test_merge_skips_missing_files(self):
+        part = shards.select(self.dir, self.jobs, 0, 1)
+        shards.write_manifest(self.dir, 0, 1, [render(job) for job in part])
+        os.remove(part[0]['output'])
+        manifest, missing = shards.merge(self.dir)
+        self.assertEqual(missing, {1: [shards.job_key(part[0])]})
+
+
+if __name__ == '__main__':
+    unittest.main()
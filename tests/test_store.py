@@ -0,0 +1,76 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import encoder
+import store
+
+
+def add_text(path, text):
+    """Insert a tEXt chunk after the header, like Blender's render stamp"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    header_end = 8 + 25
+    with open(path, 'wb') as f:
+        f.write(data[:header_end])
+        encoder._chunk(f, b'tEXt', text)
+        f.write(data[header_end:])
+
+
+class StoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+        self.pixels = np.zeros((4, 4, 4), dtype=np.uint8)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def render(self, material, obj='Coin', camera='Front', pixels=None, stamp=b''):
+        path = os.path.join(self.dir, '%s_%s_%s.png' % (material, obj, camera))
+        encoder.write_png(path, 4, 4, (self.pixels if pixels is None else pixels,))
+        if stamp:
+            add_text(path, stamp)
+        return {'object': obj, 'material': material, 'camera': camera, 'output': path}
+
+    def test_digest_ignores_metadata(self):
+        plain = self.render('Gold')
+        stamped = self.render('Silver', stamp=b'Date\x002026-10-18')
+        other = self.render('Glass', pixels=np.full((4, 4, 4), 255, dtype=np.uint8))
+        self.assertEqual(store.digest(plain['output']), store.digest(stamped['output']))
+        self.assertNotEqual(store.digest(plain['output']), store.digest(other['output']))
+
+    def test_dedup(self):
+        renders = store.Store(self.dir)
+        gold = renders.add(self.render('Gold'))
+        silver = renders.add(self.render('Silver', stamp=b'Time\x0012.5'))
+        self.assertEqual(gold['digest'], silver['digest'])
+        if gold['linked'] and silver['linked']:
+            self.assertTrue(os.path.samefile(os.path.join(self.dir, gold['output']),
+                                             os.path.join(self.dir, silver['output'])))
+        self.assertEqual(len(store.load(renders.path)), 2)
+
+    def test_report(self):
+        renders = store.Store(self.dir)
+        red = np.zeros((4, 4, 4), dtype=np.uint8)
+        red[..., 0] = red[..., 3] = 255
+        for camera in ('Front', 'Back'):
+            renders.add(self.render('Gold', camera=camera))
+            renders.add(self.render('Silver', camera=camera))
+        renders.add(self.render('Ruby', pixels=red))
+        report = store.format_report(renders.entries.values())
+        lines = report.splitlines()
+        self.assertTrue(lines[0].startswith('5 images, 2 unique, 3 duplicates'))
+        self.assertIn('Same image for every material x camera', report)
+        self.assertEqual(store.varying_axes(store.duplicates(renders.entries.values())[0]), ('material', 'camera'))
+        self.assertEqual(store.format_report([]), '0 images, 0 unique, 0 duplicates, 0.0 MB saved\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+"""Headless render worker.
+
+Started by pool.WorkerPool on this machine:
+
+    blender -b scene.blend --python worker.py -- --address HOST PORT --authkey KEY --index N
+
+or by hand on any render node, taking jobs from a coordinator:
+
+    blender -b scene.blend --python worker.py -- --coordinator http://host:8765 --token SECRET
+
+The .blend file is loaded once, then jobs are rendered one at a time until
+there are none left. Orphan data is purged after every job. The pool restarts
+its workers itself, a coordinator worker can be told to exit after --max-jobs
+jobs or above --max-rss MB so a service manager or a shell loop restarts it.
+"""
+import argparse
+import importlib
+import os
+import socket
+import sys
+import tempfile
+import threading
+
+import bpy
+
+
+def parse_args():
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    parser = argparse.ArgumentParser(prog='worker.py')
+    parser.add_argument('--address', nargs=2, metavar=('HOST', 'PORT'))
+    parser.add_argument('--authkey')
+    parser.add_argument('--coordinator', help="URL of the coordinator to lease jobs from")
+    parser.add_argument('--token', help="Token of the coordinator, default $RENDER_FARM_TOKEN")
+    parser.add_argument('--retries', type=int, default=10,
+                        help="Times an unreachable coordinator is tried again, waiting longer each time")
+    parser.add_argument('--name', default=socket.gethostname(), help="Worker name shown by the coordinator")
+    parser.add_argument('--index', type=int, default=0)
+    parser.add_argument('--max-jobs', type=int, default=0, help="Exit after this many jobs")
+    parser.add_argument('--max-rss', type=int, default=0, help="Exit once resident memory is above this many MB")
+    return parser.parse_args(argv)
+
+
+def import_addon():
+    addon_dir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, os.path.dirname(addon_dir))
+    return importlib.import_module(os.path.basename(addon_dir))
+
+
+def purge_orphans():
+    """Remove data left without users by the last job, it piles up over thousands of renders"""
+    try:
+        bpy.data.orphans_purge(do_recursive=True)
+    except (AttributeError, TypeError):
+        # before Blender 3.2
+        try:
+            bpy.ops.outliner.orphans_purge()
+        except RuntimeError:
+            pass
+
+
+def serve_pool(farm, args):
+    conn = farm.pool.connect(args.address[0], int(args.address[1]), args.authkey, args.index)
+    renderer = farm.SceneRenderer()
+
+    while True:
+        message = conn.recv()
+        if message['type'] == 'stop':
+            break
+
+        job = message['job']
+        try:
+            elapsed = renderer.render(job)
+        except Exception as e:
+            conn.send({'type': 'error', 'job': job, 'message': str(e)})
+            continue
+        finally:
+            # a failed job leaves as much behind as a finished one
+            purge_orphans()
+
+        conn.send({'type': 'done', 'job': job, 'elapsed': elapsed,
+                   'phases': renderer.phases, 'worker': args.index,
+                   'rss': farm.pool.current_rss()})
+
+    conn.close()
+
+
+def serve_coordinator(farm, args):
+    client = farm.coordinator.Client(args.coordinator, args.token, retries=args.retries)
+    # renewals are not retried, the next one is ten seconds away
+    beat = farm.coordinator.Client(args.coordinator, args.token)
+    renderer = farm.SceneRenderer()
+    ext = bpy.context.scene.render.file_extension
+    name = '%s-%d' % (args.name, os.getpid())
+    max_rss = args.max_rss * 2 ** 20
+    jobs = 0
+
+    with tempfile.TemporaryDirectory(prefix="render_farm_") as tmp_dir:
+        while not args.max_jobs or jobs < args.max_jobs:
+            leased = client.lease(name)
+            if leased is None:
+                break
+            lease_id, job = leased
+
+            # keep the lease alive while rendering
+            rendering = threading.Event()
+            def heartbeat():
+                while not rendering.wait(10.0):
+                    try:
+                        beat.renew(lease_id)
+                    except OSError:
+                        pass
+            thread = threading.Thread(target=heartbeat, daemon=True)
+            thread.start()
+
+            filepath = os.path.join(tmp_dir, os.path.basename(job['filepath']))
+            output = filepath + ext
+            try:
+                elapsed = renderer.render(dict(job, filepath=filepath, output=output))
+            except Exception as e:
+                client.fail(lease_id, str(e))
+                continue
+            finally:
+                rendering.set()
+                thread.join()
+                purge_orphans()
+
+            client.complete(lease_id, output, elapsed)
+            os.remove(output)
+
+            jobs += 1
+            rss = farm.pool.current_rss()
+            if max_rss and rss and rss > max_rss:
+                print('Exiting at %d MB after %d jobs' % (rss // 2 ** 20, jobs))
+                break
+
+
+def main():
+    args = parse_args()
+    farm = import_addon()
+
+    bpy.context.scene.render.image_settings.color_mode = 'RGBA'
+
+    if args.coordinator:
+        try:
+            serve_coordinator(farm, args)
+        except OSError as e:
+            print('Coordinator unreachable : %s' % e, file=sys.stderr)
+            sys.exit(1)
+    else:
+        serve_pool(farm, args)
+
+
+main()